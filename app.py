@@ -9,35 +9,167 @@ App main — cleaned & organized
 """
 
 from __future__ import annotations
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
 from functools import wraps
 from io import BytesIO
 from pathlib import Path
-from threading import Lock
+from threading import Lock, Thread
 from datetime import datetime, timedelta, timezone, date
 from zoneinfo import ZoneInfo
 from dateutil.relativedelta import relativedelta
+import atexit
+import base64
+import csv
 import hashlib
 import hmac
+import io
+import itertools
 import json
 import math
+import multiprocessing
 import os
 import secrets
+import shutil
 import time
 import sqlite3
-from contextlib import contextmanager
-from typing import Iterator
-from flask import has_request_context
+import threading
+import zipfile
+import zlib
+from contextlib import closing, contextmanager
+from typing import Iterator, NamedTuple
+from urllib.parse import urlsplit
+from bisect import bisect_left
+from flask import g, has_request_context
 
 import numpy as np
-from PIL import Image, ImageDraw, ImageColor
+from PIL import Image, ImageColor, ImageOps, features
 from flask import (
     Flask, render_template, request, send_file, jsonify,
     url_for, redirect, abort, session
 )
 from qrcode import QRCode, constants
-from qrcode.image.svg import SvgPathImage
+from qrcode.exceptions import DataOverflowError
+try:
+    import fitz  # pymupdf — ใช้ทำพรีวิวหน้าแรกของ PDF (ไม่มีก็ปิดฟีเจอร์นี้)
+except ImportError:  # pragma: no cover
+    fitz = None
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.formparser import FormDataParser
 from werkzeug.utils import secure_filename, safe_join
 
+# ------------------------------------------------------------------------------
+# Stage timing — Server-Timing ต่อ request + histogram (Prometheus) ต่อขั้นตอน
+# ------------------------------------------------------------------------------
+
+TIMING_ENABLED = os.getenv("TIMING_ENABLED", "1") == "1"
+# header Server-Timing: 0 = ไม่ส่ง (ค่าเริ่มต้น) / admin = เฉพาะแอดมิน / 1 = ทุก client (ไว้ดีบัก)
+SERVER_TIMING_HEADER = os.getenv("SERVER_TIMING_HEADER", "0").strip().lower()
+TIMING_BUCKETS_S = tuple(sorted(float(x) for x in os.getenv(
+    "TIMING_BUCKETS_S", "0.0001,0.00025,0.0005,0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5"
+).split(",")))
+
+class LatencyHistograms:
+    """
+    histogram เวลา (วินาที) แยกตาม label เดียว เช่น stage / endpoint — เก็บในหน่วยความจำของโปรเซส
+    - bucket ตาม TIMING_BUCKETS_S + ช่อง +Inf, มี sum/count (รูปแบบเดียวกับ Prometheus histogram)
+    - หลาย worker = แต่ละโปรเซสมีค่าของตัวเอง (scrape ได้ทีละ worker)
+    """
+
+    def __init__(self, name: str, help_text: str, label: str, buckets: tuple[float, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self._data: dict[str, list] = {}  # label -> [จำนวนต่อ bucket (ไม่สะสม), sum]
+        self._lock = Lock()
+
+    def observe(self, key: str, seconds: float) -> None:
+        i = bisect_left(self.buckets, seconds)
+        with self._lock:
+            row = self._data.get(key)
+            if row is None:
+                row = self._data[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            row[0][i] += 1
+            row[1] += seconds
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            items = [(k, list(counts), total) for k, (counts, total) in self._data.items()]
+        out = {}
+        for key, counts, total in sorted(items):
+            n = sum(counts)
+            out[key] = {"count": n, "avg_ms": round(total / n * 1000, 3) if n else 0.0}
+        return out
+
+    def prometheus(self) -> list[str]:
+        with self._lock:
+            items = [(k, list(counts), total) for k, (counts, total) in self._data.items()]
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key, counts, total in sorted(items):
+            label = f'{self.label}="{_prom_escape(key)}"'
+            acc = 0
+            for le, c in zip(self.buckets, counts):
+                acc += c
+                lines.append(f'{self.name}_bucket{{{label},le="{le:g}"}} {acc}')
+            acc += counts[-1]
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {acc}')
+            lines.append(f"{self.name}_sum{{{label}}} {total:.6f}")
+            lines.append(f"{self.name}_count{{{label}}} {acc}")
+        return lines
+
+def _prom_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+PROCESS_STARTED_AT = time.time()
+STAGE_TIMES = LatencyHistograms(
+    "qr_stage_duration_seconds", "Time spent in instrumented hot-path stages.", "stage", TIMING_BUCKETS_S
+)
+REQUEST_TIMES = LatencyHistograms(
+    "qr_request_duration_seconds", "Request handling time by Flask endpoint.", "endpoint", TIMING_BUCKETS_S
+)
+
+def record_stage(stage: str, seconds: float) -> None:
+    """ลง histogram ของขั้นตอน และถ้าอยู่ใน request ให้สะสมไว้ส่งเป็น Server-Timing"""
+    if not TIMING_ENABLED:
+        return
+    STAGE_TIMES.observe(stage, seconds)
+    if has_request_context():
+        timings = g.get("stage_timings")
+        if timings is None:
+            timings = g.stage_timings = {}
+        acc = timings.get(stage)
+        if acc is None:
+            timings[stage] = [seconds, 1]
+        else:
+            acc[0] += seconds
+            acc[1] += 1
+
+class timed_stage:
+    """
+    จับเวลาหนึ่งขั้นตอน:
+        with timed_stage("logo"):
+            ...
+    (คลาสแทน @contextmanager — ถูกเรียกบน hot path หลายครั้งต่อ request)
+    """
+    __slots__ = ("stage", "t0")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        record_stage(self.stage, time.perf_counter() - self.t0)
+        return False
+
 # ---------------------------------------------------------
 # Database configuration
 # ---------------------------------------------------------
@@ -45,6 +177,11 @@ from werkzeug.utils import secure_filename, safe_join
 DB_PATH = Path(os.environ.get("APP_DB_PATH", "data/app.db"))
 DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))                 # idle connection สูงสุดที่เก็บไว้
+DB_CACHED_STATEMENTS = int(os.getenv("DB_CACHED_STATEMENTS", "256"))  # prepared statement cache ต่อ connection
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "8192"))        # page cache ต่อ connection
+DB_MMAP_SIZE_MB = int(os.getenv("DB_MMAP_SIZE_MB", "64"))            # 0 = ปิด mmap
+
 def _connect_db() -> sqlite3.Connection:
     """
     เปิดการเชื่อมต่อ SQLite พร้อมตั้งค่าเหมาะกับเว็บแอป
@@ -53,6 +190,7 @@ def _connect_db() -> sqlite3.Connection:
         DB_PATH,
         detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
         check_same_thread=False,  # ให้ Flask threaded server ใช้งานได้
+        cached_statements=DB_CACHED_STATEMENTS,
     )
     # อ่านผลลัพธ์แบบ dict-like: row['column_name']
     conn.row_factory = sqlite3.Row
@@ -61,9 +199,69 @@ def _connect_db() -> sqlite3.Connection:
     conn.execute("PRAGMA foreign_keys = ON;")
     conn.execute("PRAGMA journal_mode = WAL;")     # เขียนพร้อมอ่านได้ดีขึ้น
     conn.execute("PRAGMA synchronous = NORMAL;")   # สมดุลความเร็ว/ความปลอดภัย
+    conn.execute(f"PRAGMA cache_size = {-DB_CACHE_SIZE_KB};")          # ค่าลบ = KiB
+    conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE_MB * 1024 * 1024};")
     return conn
 
 
+class ConnectionPool:
+    """
+    pool ของ connection ที่ว่าง (LIFO) — ตั้ง PRAGMA ครั้งเดียวต่อ connection แล้วใช้ซ้ำ
+    - เก็บ idle ไว้ไม่เกิน max_idle ที่เหลือปิดทิ้ง
+    - หลัง fork (gunicorn preload) จะไม่ใช้ connection ของโปรเซสแม่
+    """
+
+    def __init__(self, max_idle: int):
+        self.max_idle = max_idle
+        self.local = threading.local()  # connection ที่ thread นี้ถืออยู่ (รองรับ get_db ซ้อน)
+        self._idle: list[sqlite3.Connection] = []
+        self._lock = Lock()
+        self._pid = os.getpid()
+        self.created = 0
+        self.reused = 0
+        self.closed = 0
+        self.in_use = 0
+
+    def acquire(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._pid != os.getpid():
+                self._idle.clear()
+                self._pid = os.getpid()
+                self.in_use = 0
+            conn = self._idle.pop() if self._idle else None
+            if conn is not None:
+                self.reused += 1
+            else:
+                self.created += 1
+            self.in_use += 1
+        return conn if conn is not None else _connect_db()
+
+    def release(self, conn: sqlite3.Connection, broken: bool = False) -> None:
+        with self._lock:
+            self.in_use = max(0, self.in_use - 1)
+            if not broken and self._pid == os.getpid() and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+            self.closed += 1
+        conn.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "idle": len(self._idle),
+                "in_use": self.in_use,
+                "max_idle": self.max_idle,
+                "created": self.created,
+                "reused": self.reused,
+                "closed": self.closed,
+                "cached_statements": DB_CACHED_STATEMENTS,
+                "cache_size_kb": DB_CACHE_SIZE_KB,
+                "mmap_size_mb": DB_MMAP_SIZE_MB,
+            }
+
+DB_POOL = ConnectionPool(DB_POOL_SIZE)
+
+
 @contextmanager
 def get_db() -> Iterator[sqlite3.Connection]:
     """
@@ -73,17 +271,32 @@ def get_db() -> Iterator[sqlite3.Connection]:
 
     - commit ให้อัตโนมัติถ้าไม่เกิดข้อผิดพลาด
     - rollback ให้อัตโนมัติถ้าเกิดข้อผิดพลาด
-    - ปิด connection ให้อัตโนมัติเมื่อออกจากบล็อก
+    - คืน connection เข้า DB_POOL อัตโนมัติเมื่อออกจากบล็อก
+    - เรียกซ้อนใน thread เดียวกันจะได้ connection เดิม (commit/rollback ที่บล็อกนอกสุด)
+    - เวลาของบล็อกนอกสุดลง stage "db" (Server-Timing / /admin/metrics)
     """
-    conn = _connect_db()
+    local = DB_POOL.local
+    if getattr(local, "conn", None) is not None and local.pid == os.getpid():
+        yield local.conn
+        return
+
+    t0 = time.perf_counter()
+    conn = DB_POOL.acquire()
+    local.conn, local.pid = conn, os.getpid()
+    broken = False
     try:
         yield conn
         conn.commit()
     except Exception:
-        conn.rollback()
+        try:
+            conn.rollback()
+        except sqlite3.Error:
+            broken = True
         raise
     finally:
-        conn.close()
+        local.conn = None
+        DB_POOL.release(conn, broken)
+        record_stage("db", time.perf_counter() - t0)  # เฉพาะบล็อกนอกสุด (รวม acquire + commit)
 
 
 def ensure_schema() -> None:
@@ -91,6 +304,15 @@ def ensure_schema() -> None:
     สร้างตารางที่จำเป็น (ถ้ายังไม่มี)
     - analytics: เก็บสถิติการใช้งาน เช่น visit/download/upload
       ฟิลด์ ts ใช้เวลาปัจจุบัน (UTC) เป็นค่าเริ่มต้น
+    - analytics_daily: ยอดรวมรายวัน (rollup) ที่ analytics writer อัปเดตให้ — แดชบอร์ดอ่านจากตารางนี้
+    - shortlinks: ลิงก์สั้น code -> url (unique ทั้งสองฝั่ง)
+    - short_clicks_daily: จำนวนสแกน/คลิกลิงก์สั้น รายโค้ดรายวัน
+    - app_meta: ค่าสถานะภายใน เช่น migration ที่ทำไปแล้ว
+    - jobs: งานเรนเดอร์แบบ async (สถานะ + เวลา + path ผลลัพธ์)
+    - upload_sessions: อัปโหลดไฟล์ใหญ่แบบแบ่งชิ้น/ต่อได้ (resumable)
+    - asset_blobs: ไฟล์ asset ตาม SHA-256 (เก็บเนื้อหาเดียวกันครั้งเดียว + นับ reference)
+    - assets: แคตตาล็อกไฟล์ทั้งหมด (logo + pdf/mp3/image) สำหรับหน้าแอดมิน แทนการสแกนโฟลเดอร์
+    - asset_stats: จำนวนไฟล์/ขนาดรวมต่อชนิด (trigger บน assets ดูแลให้)
     """
     with get_db() as db:
         db.execute("""
@@ -105,6 +327,151 @@ def ensure_schema() -> None:
         """)
         db.execute("CREATE INDEX IF NOT EXISTS idx_analytics_ts    ON analytics(ts);")
         db.execute("CREATE INDEX IF NOT EXISTS idx_analytics_event ON analytics(event);")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS analytics_daily (
+                day       TEXT PRIMARY KEY,              -- YYYY-MM-DD ตามเขตเวลาแดชบอร์ด (Asia/Bangkok)
+                visits    INTEGER NOT NULL DEFAULT 0,
+                downloads INTEGER NOT NULL DEFAULT 0,
+                uploads   INTEGER NOT NULL DEFAULT 0,
+                uniques   INTEGER NOT NULL DEFAULT 0,    -- ค่าประมาณจาก sketch
+                sketch    BLOB                           -- HyperLogLog registers ของ ip ที่ hash แล้ว
+            );
+        """)
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS shortlinks (
+                code TEXT    PRIMARY KEY,
+                url  TEXT    NOT NULL UNIQUE,
+                ts   INTEGER NOT NULL                    -- epoch seconds ตอนสร้าง
+            );
+        """)
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS short_clicks_daily (
+                code    TEXT    NOT NULL,
+                day     TEXT    NOT NULL,                -- YYYY-MM-DD (Asia/Bangkok)
+                clicks  INTEGER NOT NULL DEFAULT 0,
+                uniques INTEGER NOT NULL DEFAULT 0,      -- ค่าประมาณจาก sketch ของวันนั้น
+                sketch  BLOB,                            -- HyperLogLog ของ ip ที่ hash แล้ว
+                PRIMARY KEY (code, day)
+            ) WITHOUT ROWID;
+        """)
+        db.execute("CREATE INDEX IF NOT EXISTS idx_short_clicks_day ON short_clicks_daily(day);")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS app_meta (
+                key   TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+        db.execute(
+            "INSERT OR IGNORE INTO app_meta (key, value) VALUES ('shortlinks_version', '0'), ('shortlinks_epoch', '0')"
+        )
+        # version: เปลี่ยนทุกครั้งที่ตาราง shortlinks เปลี่ยน / epoch: เฉพาะแก้ไข-ลบ (ใช้ล้าง cache ข้าม worker)
+        db.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_shortlinks_ins AFTER INSERT ON shortlinks BEGIN
+                UPDATE app_meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'shortlinks_version';
+            END;
+        """)
+        for op in ("UPDATE", "DELETE"):
+            db.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_shortlinks_{op.lower()[:3]} AFTER {op} ON shortlinks BEGIN
+                    UPDATE app_meta SET value = CAST(value AS INTEGER) + 1
+                    WHERE key IN ('shortlinks_version', 'shortlinks_epoch');
+                END;
+            """)
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id          TEXT PRIMARY KEY,
+                kind        TEXT    NOT NULL,            -- 'render' / 'batch'
+                status      TEXT    NOT NULL,            -- queued / running / done / failed
+                owner_pid   INTEGER,                     -- โปรเซสที่รับงาน (ข้อมูลประกอบเท่านั้น — pid ถูกใช้ซ้ำได้)
+                owner_boot  TEXT,                        -- id สุ่มต่อโปรเซส (ไม่ซ้ำข้ามการ restart)
+                heartbeat_at REAL,                       -- lease: เจ้าของงานต่ออายุเป็นระยะ
+                artifact    TEXT,                        -- path ไฟล์ผลลัพธ์
+                mimetype    TEXT,
+                filename    TEXT,
+                error       TEXT,
+                total       INTEGER,
+                done        INTEGER,
+                created_at  REAL    NOT NULL,            -- epoch seconds
+                started_at  REAL,
+                finished_at REAL
+            );
+        """)
+        job_cols = {r["name"] for r in db.execute("PRAGMA table_info(jobs)")}
+        for col, decl in (("owner_boot", "TEXT"), ("heartbeat_at", "REAL")):
+            if col not in job_cols:  # DB เดิมก่อนมี lease
+                db.execute(f"ALTER TABLE jobs ADD COLUMN {col} {decl}")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status   ON jobs(status);")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs(finished_at);")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS asset_blobs (
+                atype      TEXT    NOT NULL,             -- pdf / mp3 / image
+                sha256     TEXT    NOT NULL,
+                name       TEXT    NOT NULL,             -- ชื่อไฟล์จริงใน static/files/<atype>/
+                size       INTEGER NOT NULL,
+                refs       INTEGER NOT NULL DEFAULT 1,   -- จำนวนครั้งที่อัปโหลดเนื้อหานี้ (ยังไม่ถูกลบ)
+                created_at REAL    NOT NULL,
+                PRIMARY KEY (atype, sha256)
+            );
+        """)
+        db.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_asset_blobs_name ON asset_blobs(atype, name);")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS assets (
+                atype      TEXT    NOT NULL,             -- logo / pdf / mp3 / image
+                name       TEXT    NOT NULL,             -- ชื่อไฟล์ในโฟลเดอร์ของชนิดนั้น
+                size       INTEGER NOT NULL,
+                mtime      REAL    NOT NULL,
+                sha256     TEXT,
+                short_code TEXT,                         -- code ใน shortlinks (ถ้ามี)
+                PRIMARY KEY (atype, name)
+            );
+        """)
+        # index ครอบลำดับ (คอลัมน์เรียง, atype, name) ให้ keyset pagination ไม่ต้อง sort ชั่วคราว
+        for old in ("idx_assets_mtime", "idx_assets_type_mtime", "idx_assets_size", "idx_assets_name"):
+            db.execute(f"DROP INDEX IF EXISTS {old};")
+        for col in ("mtime", "size", "name"):
+            db.execute(f"CREATE INDEX IF NOT EXISTS idx_assets_by_{col} ON assets({col}, atype, name);")
+            db.execute(f"CREATE INDEX IF NOT EXISTS idx_assets_type_by_{col} ON assets(atype, {col}, name);")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS asset_stats (
+                atype TEXT PRIMARY KEY,
+                files INTEGER NOT NULL DEFAULT 0,
+                bytes INTEGER NOT NULL DEFAULT 0
+            );
+        """)
+        # ยอดรวมต่อชนิดอัปเดตด้วย trigger — หน้าแอดมินไม่ต้อง COUNT/SUM ทั้งตาราง
+        db.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_assets_ins AFTER INSERT ON assets BEGIN
+                INSERT INTO asset_stats (atype, files, bytes) VALUES (NEW.atype, 1, NEW.size)
+                ON CONFLICT(atype) DO UPDATE SET files = files + 1, bytes = bytes + NEW.size;
+            END;
+        """)
+        db.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_assets_del AFTER DELETE ON assets BEGIN
+                UPDATE asset_stats SET files = files - 1, bytes = bytes - OLD.size WHERE atype = OLD.atype;
+            END;
+        """)
+        db.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_assets_upd AFTER UPDATE OF size ON assets BEGIN
+                UPDATE asset_stats SET bytes = bytes - OLD.size + NEW.size WHERE atype = NEW.atype;
+            END;
+        """)
+        if not db.execute("SELECT 1 FROM app_meta WHERE key = 'asset_stats_built'").fetchone():
+            db.execute("DELETE FROM asset_stats;")
+            db.execute("INSERT INTO asset_stats (atype, files, bytes) "
+                       "SELECT atype, COUNT(*), SUM(size) FROM assets GROUP BY atype;")
+            db.execute("INSERT INTO app_meta (key, value) VALUES ('asset_stats_built', '1');")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS upload_sessions (
+                id         TEXT PRIMARY KEY,
+                atype      TEXT    NOT NULL,             -- pdf / mp3 / image
+                stem       TEXT    NOT NULL,             -- ชื่อไฟล์ที่ secure แล้ว (ไม่มีนามสกุล)
+                ext        TEXT    NOT NULL,
+                size       INTEGER NOT NULL,             -- ขนาดทั้งไฟล์ที่ประกาศตอนเริ่ม
+                received   INTEGER NOT NULL DEFAULT 0,   -- ไบต์ที่รับแล้ว (offset ถัดไป)
+                created_at REAL    NOT NULL,
+                updated_at REAL    NOT NULL
+            );
+        """)
 
 # ------------------------------------------------------------------------------
 # App & Config
@@ -136,6 +503,30 @@ REQUIRED_DIRS = [
 for d in REQUIRED_DIRS:
     os.makedirs(d, exist_ok=True)
 
+@app.before_request
+def _timing_start():
+    g.request_t0 = time.perf_counter()
+
+@app.after_request
+def _timing_finish(resp):
+    """
+    เวลา request ลง REQUEST_TIMES + ส่งเวลาแต่ละขั้นตอนเป็น Server-Timing (response แบบ stream นับถึงตอนส่ง header)
+    header เปิดเผยเวลาภายใน (db/analytics) จึงส่งตาม SERVER_TIMING_HEADER เท่านั้น
+    """
+    t0 = g.get("request_t0")
+    if t0 is None or not TIMING_ENABLED:
+        return resp
+    total = time.perf_counter() - t0
+    REQUEST_TIMES.observe(request.endpoint or "unmatched", total)
+    if SERVER_TIMING_HEADER == "1" or (SERVER_TIMING_HEADER == "admin" and is_admin_logged_in()):
+        parts = [
+            f"{stage};dur={sec * 1000:.2f}" + (f';desc="x{n}"' if n > 1 else "")
+            for stage, (sec, n) in (g.get("stage_timings") or {}).items()
+        ]
+        parts.append(f"total;dur={total * 1000:.2f}")
+        resp.headers["Server-Timing"] = ", ".join(parts)
+    return resp
+
 # ------------------------------------------------------------------------------
 # Helpers: Admin auth (HTML & API)
 # ------------------------------------------------------------------------------
@@ -197,14 +588,14 @@ def admin_api_required(fn):
 
 # ---------- Helper : ดึงเดือนที่มีข้อมูล ----------
 def get_available_months():
-    """คืน [{'year':YYYY,'month':M}, ...] ตามจริงจากตาราง analytics; ถ้าไม่มีข้อมูลจะ fallback 24 เดือนย้อนหลัง"""
+    """คืน [{'year':YYYY,'month':M}, ...] ตามจริงจากตาราง analytics_daily; ถ้าไม่มีข้อมูลจะ fallback 24 เดือนย้อนหลัง"""
     try:
         with get_db() as db:
             rows = db.execute("""
                 SELECT
-                    CAST(strftime('%Y', ts) AS INT) AS y,
-                    CAST(strftime('%m', ts) AS INT) AS m
-                FROM analytics
+                    CAST(substr(day, 1, 4) AS INT) AS y,
+                    CAST(substr(day, 6, 2) AS INT) AS m
+                FROM analytics_daily
                 GROUP BY y, m
                 ORDER BY y DESC, m DESC
             """).fetchall()
@@ -220,24 +611,27 @@ def get_available_months():
             cur = (cur - relativedelta(months=1)).replace(day=1)
     return months
 
+# ---------- Helper : ผู้เยี่ยมชมไม่ซ้ำตลอดช่วง [start_dt, end_dt) ----------
+def window_uniques(start_dt: datetime, end_dt: datetime) -> int:
+    """merge sketch รายวันทั้งช่วง แล้วประมาณจำนวน unique จริง (คนเดิมหลายวันนับครั้งเดียว)"""
+    hll = HyperLogLog()
+    with get_db() as db:
+        for r in db.execute(
+            "SELECT sketch FROM analytics_daily WHERE day >= ? AND day < ? AND sketch IS NOT NULL",
+            (start_dt.date().isoformat(), end_dt.date().isoformat()),
+        ):
+            hll.merge(HyperLogLog.from_bytes(r["sketch"]))
+    return hll.count()
+
 # ---------- Helper : สร้างซีรีส์รายวันในช่วง [start_dt, end_dt) ----------
 def build_daily_series(start_dt: datetime, end_dt: datetime, tz: ZoneInfo):
-    """รวมสถิติรายวันในช่วง [start_dt, end_dt) จากตาราง analytics"""
-    utc_start = start_dt.astimezone(ZoneInfo("UTC")).isoformat()
-    utc_end   = end_dt.astimezone(ZoneInfo("UTC")).isoformat()
-
+    """รวมสถิติรายวันในช่วง [start_dt, end_dt) จากตาราง rollup analytics_daily"""
     with get_db() as db:
         rows = db.execute("""
-            SELECT
-                DATE(ts) AS d,
-                SUM(CASE WHEN event='visit'    THEN 1 ELSE 0 END) AS visits,
-                COUNT(DISTINCT CASE WHEN event='visit' THEN ip END) AS uniques,
-                SUM(CASE WHEN event='download' THEN 1 ELSE 0 END) AS downloads,
-                SUM(CASE WHEN event='upload'   THEN 1 ELSE 0 END) AS uploads
-            FROM analytics
-            WHERE ts >= ? AND ts < ?
-            GROUP BY d
-        """, (utc_start, utc_end)).fetchall()
+            SELECT day AS d, visits, uniques, downloads, uploads
+            FROM analytics_daily
+            WHERE day >= ? AND day < ?
+        """, (start_dt.date().isoformat(), end_dt.date().isoformat())).fetchall()
 
     # แปลงเป็น dict ธรรมดาพร้อมตัวเลข (เผื่อค่าเป็น None)
     bydate: dict[str, dict[str, int]] = {}
@@ -308,9 +702,296 @@ def _write_json(path: str, obj):
         json.dump(obj, f, ensure_ascii=False)
     os.replace(tmp, path)
 
+ANALYTICS_FLUSH_COUNT = int(os.getenv("ANALYTICS_FLUSH_COUNT", "200"))
+ANALYTICS_FLUSH_INTERVAL = float(os.getenv("ANALYTICS_FLUSH_INTERVAL", "2"))  # วินาที
+ANALYTICS_QUEUE_MAX = int(os.getenv("ANALYTICS_QUEUE_MAX", "10000"))
+
+def _utc_now_sql() -> str:
+    """เวลา UTC รูปแบบเดียวกับ CURRENT_TIMESTAMP ของ SQLite"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+# ---- daily rollup (analytics_daily) ----
+class HyperLogLog:
+    """
+    sketch นับจำนวนค่าไม่ซ้ำแบบประมาณ (HyperLogLog, p=12 -> 4096 registers, คลาดเคลื่อน ~1.6%)
+    - merge ได้ (max ราย register) จึงรวมหลายวันเป็นช่วงเวลาเดียวได้โดยไม่นับซ้ำ
+    - to_bytes(): แบบ sparse (ตำแหน่ง+ค่า) ตอนข้อมูลน้อย, ไม่งั้น dense บีบอัด zlib
+    """
+    P = 12
+    M = 1 << P
+
+    def __init__(self, registers: np.ndarray | None = None):
+        self.registers = registers if registers is not None else np.zeros(self.M, dtype=np.uint8)
+
+    @classmethod
+    def from_bytes(cls, blob: bytes | None) -> "HyperLogLog":
+        if not blob:
+            return cls()
+        blob = bytes(blob)
+        kind, body = blob[:1], blob[1:]
+        if kind == b"S":
+            pairs = np.frombuffer(body, dtype=[("idx", "<u2"), ("val", "u1")])
+            hll = cls()
+            hll.registers[pairs["idx"]] = pairs["val"]
+            return hll
+        if kind == b"Z":
+            body = zlib.decompress(body)
+        elif len(blob) == cls.M:  # registers ดิบ (ไม่มี header)
+            body = blob
+        return cls(np.frombuffer(body, dtype=np.uint8).copy())
+
+    def add(self, value: str) -> None:
+        h = int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+        idx = h >> (64 - self.P)
+        w = h & ((1 << (64 - self.P)) - 1)
+        rank = (64 - self.P) - w.bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self) -> int:
+        m = self.M
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int32))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # linear counting ช่วงค่าน้อย
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        idx = np.flatnonzero(self.registers)
+        if len(idx) * 3 < self.M // 2:
+            pairs = np.empty(len(idx), dtype=[("idx", "<u2"), ("val", "u1")])
+            pairs["idx"] = idx
+            pairs["val"] = self.registers[idx]
+            return b"S" + pairs.tobytes()
+        return b"Z" + zlib.compress(self.registers.tobytes(), 6)
+
+def _local_day(ts_utc: str) -> str:
+    """'YYYY-MM-DD HH:MM:SS' (UTC) -> วันที่ตามเขตเวลาของแดชบอร์ด"""
+    dt = datetime.strptime(str(ts_utc)[:19], "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+    return dt.astimezone(BKK_TZ).date().isoformat()
+
+def _apply_daily_rollup(db: sqlite3.Connection, rows) -> None:
+    """
+    รวม event (ts, event, ip) เข้า analytics_daily — เรียกในทรานแซกชันเดียวกับการ insert ดิบ
+    - visits/downloads/uploads บวกเพิ่ม, uniques คำนวณใหม่จาก sketch ที่ merge แล้ว
+    """
+    days: dict[str, dict] = {}
+    for ts, event, ip in rows:
+        d = days.setdefault(_local_day(ts), {"visit": 0, "download": 0, "upload": 0, "ips": set()})
+        if event in d:
+            d[event] += 1
+        if event == "visit" and ip:
+            d["ips"].add(ip)
+
+    for day, d in days.items():
+        row = db.execute("SELECT sketch FROM analytics_daily WHERE day = ?", (day,)).fetchone()
+        hll = HyperLogLog.from_bytes(row["sketch"] if row else None)
+        for ip in d["ips"]:
+            hll.add(ip)
+        db.execute(
+            """
+            INSERT INTO analytics_daily (day, visits, downloads, uploads, uniques, sketch)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(day) DO UPDATE SET
+                visits    = visits    + excluded.visits,
+                downloads = downloads + excluded.downloads,
+                uploads   = uploads   + excluded.uploads,
+                uniques   = excluded.uniques,
+                sketch    = excluded.sketch
+            """,
+            (day, d["visit"], d["download"], d["upload"], hll.count(), hll.to_bytes()),
+        )
+
+def backfill_analytics_daily(chunk: int = 50_000) -> int:
+    """สร้าง analytics_daily ใหม่ทั้งหมดจากตาราง analytics ดิบ คืนจำนวนแถวที่อ่าน"""
+    total = 0
+    with get_db() as db:
+        db.execute("BEGIN IMMEDIATE")
+        db.execute("DELETE FROM analytics_daily")
+        last_id = 0
+        while True:
+            rows = db.execute(
+                "SELECT id, ts, event, ip FROM analytics WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, chunk),
+            ).fetchall()
+            if not rows:
+                break
+            _apply_daily_rollup(db, [(r["ts"], r["event"], r["ip"]) for r in rows])
+            last_id = rows[-1]["id"]
+            total += len(rows)
+    return total
+
+def _ensure_daily_rollup() -> None:
+    """ครั้งแรกหลังอัปเกรด: rollup ยังว่างแต่มีข้อมูลดิบ -> backfill อัตโนมัติ"""
+    with get_db() as db:
+        has_rollup = db.execute("SELECT 1 FROM analytics_daily LIMIT 1").fetchone()
+        has_raw = db.execute("SELECT 1 FROM analytics LIMIT 1").fetchone()
+    if has_raw and not has_rollup:
+        backfill_analytics_daily()
+
+@app.cli.command("analytics-backfill")
+def analytics_backfill_command():
+    """สร้างตาราง analytics_daily ใหม่จากข้อมูลดิบ:  flask --app app analytics-backfill"""
+    n = backfill_analytics_daily()
+    print(f"analytics_daily rebuilt from {n} rows")
+
+class BackgroundWorker(ABC):
+    """
+    ฐานของงานเบื้องหลังแบบ thread เดียวต่อโปรเซส (AnalyticsWriter / ClickCounter / AssetReconciler)
+    - ensure_started(): เริ่ม thread แบบ lazy และเริ่มใหม่หลัง fork (gunicorn preload) หรือเมื่อ thread ตาย
+    - เรียก tick() ทุก interval วินาที หรือทันทีเมื่อ wake(); exception นับใน errors แล้ววนต่อ
+    - close(): หยุด loop แล้ว tick() รอบสุดท้ายใน thread ที่เรียก (ใช้กับ atexit)
+    """
+    thread_name = "background"
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.errors = 0
+        self._wake = threading.Event()
+        self._start_lock = Lock()
+        self._thread: Thread | None = None
+        self._pid: int | None = None
+        self._closed = False
+
+    def _alive(self) -> bool:
+        return self._thread is not None and self._pid == os.getpid() and self._thread.is_alive()
+
+    def ensure_started(self) -> None:
+        if self._alive():
+            return
+        with self._start_lock:
+            if not self._alive():
+                self._pid = os.getpid()
+                self._thread = Thread(target=self._run, name=self.thread_name, daemon=True)
+                self._thread.start()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._closed:
+                return
+            try:
+                self.tick()
+            except Exception:
+                self.errors += 1
+
+    @abstractmethod
+    def tick(self) -> None:
+        """งาน 1 รอบ (ลูกคลาสต้องกำหนด)"""
+
+    def close(self) -> None:
+        self._closed = True
+        self._wake.set()
+        self.tick()
+
+class AnalyticsWriter(BackgroundWorker):
+    """
+    บัฟเฟอร์ event ของ analytics ในหน่วยความจำ แล้วเขียนลง DB เป็นชุด (executemany)
+    บน background thread — request ไม่ต้องรอ commit/fsync
+    - flush เมื่อครบ flush_count รายการ หรือทุก flush_interval วินาที
+    - คิวเต็ม (max_pending) = ทิ้ง event และนับใน dropped
+    - เรียก close() ตอนปิดโปรเซส (atexit) เพื่อ flush ที่ค้าง
+    """
+
+    thread_name = "analytics-writer"
+
+    def __init__(self, flush_count: int, flush_interval: float, max_pending: int):
+        super().__init__(flush_interval)
+        self.flush_count = max(1, flush_count)
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: deque[tuple] = deque()
+        self._queue_lock = Lock()  # กันคิว _pending
+        self._flush_lock = Lock()
+        self.enqueued = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.batches = 0
+        self.last_flush_ms = 0.0
+
+    def enqueue(self, event: str, ip: str | None = None, ua: str | None = None,
+                item_id: str | None = None) -> bool:
+        row = (_utc_now_sql(), event, item_id, ip, ua)
+        with self._queue_lock:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._pending.append(row)
+            self.enqueued += 1
+            full = len(self._pending) >= self.flush_count
+        self.ensure_started()
+        if full:
+            self.wake()
+        return True
+
+    def tick(self) -> None:
+        self.flush()
+
+    def _write(self, rows: list[tuple]) -> None:
+        with timed_stage("analytics_flush"), get_db() as db:
+            db.execute("BEGIN IMMEDIATE")  # rollup อ่าน-แก้-เขียน sketch: กันชนกันข้าม worker
+            db.executemany(
+                "INSERT INTO analytics (ts, event, item_id, ip, user_agent) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            _apply_daily_rollup(db, [(ts, event, ip) for ts, event, _, ip, _ in rows])
+
+    def flush(self) -> int:
+        """เขียนทุกอย่างที่ค้างในคิวลง DB ในทรานแซกชันเดียว คืนจำนวนที่เขียน"""
+        with self._flush_lock:
+            with self._queue_lock:
+                rows = list(self._pending)
+                self._pending.clear()
+            if not rows:
+                return 0
+            t0 = time.perf_counter()
+            try:
+                self._write(rows)
+            except Exception:
+                self.errors += 1
+                # คืนเข้าคิว (เท่าที่ที่ว่างพอ) ให้ลองใหม่รอบหน้า เช่นตอน DB ถูกล็อก
+                with self._queue_lock:
+                    room = max(0, self.max_pending - len(self._pending))
+                    keep = rows[-room:] if room else []
+                    self._pending.extendleft(reversed(keep))
+                    self.dropped += len(rows) - len(keep)
+                return 0
+            self.last_flush_ms = round((time.perf_counter() - t0) * 1000, 2)
+            self.flushed += len(rows)
+            self.batches += 1
+            return len(rows)
+
+    def stats(self) -> dict:
+        with self._queue_lock:
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "enqueued": self.enqueued,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "errors": self.errors,
+            "last_flush_ms": self.last_flush_ms,
+            "flush_count": self.flush_count,
+            "flush_interval": self.flush_interval,
+        }
+
+ANALYTICS_WRITER = AnalyticsWriter(ANALYTICS_FLUSH_COUNT, ANALYTICS_FLUSH_INTERVAL, ANALYTICS_QUEUE_MAX)
+atexit.register(ANALYTICS_WRITER.close)
+_ensure_daily_rollup()
+
 def track_visit(ip: str | None = None, ua: str | None = None) -> None:
     """
-    บันทึก visit ลงตาราง analytics
+    บันทึก visit ลงตาราง analytics (ผ่าน ANALYTICS_WRITER — เขียนจริงแบบเป็นชุดเบื้องหลัง)
     - ถ้าเรียกภายใน request context จะอ่าน IP และ User-Agent อัตโนมัติ
     - สามารถส่ง ip/ua มาเองได้ (จะใช้ค่าที่ส่งมาแทน)
     """
@@ -325,28 +1006,18 @@ def track_visit(ip: str | None = None, ua: str | None = None) -> None:
             getattr(request.user_agent, "string", "") if hasattr(request, "user_agent") else ""
         )
 
-    ip_hashed = _hash_ip(ip or "unknown")
-    ua = (ua or "")[:255]  # กันยาวเกินคอลัมน์
-
-    with get_db() as db:
-        db.execute(
-            "INSERT INTO analytics (ts, event, ip, user_agent) VALUES (CURRENT_TIMESTAMP, ?, ?, ?)",
-            ("visit", ip_hashed, ua),
-        )
+    with timed_stage("analytics"):
+        ip_hashed = _hash_ip(ip or "unknown")
+        ua = (ua or "")[:255]  # กันยาวเกินคอลัมน์
+        ANALYTICS_WRITER.enqueue("visit", ip=ip_hashed, ua=ua)
 
 def track_download():
-    with get_db() as db:
-        db.execute(
-            "INSERT INTO analytics (ts, event) VALUES (CURRENT_TIMESTAMP, ?)",
-            ("download",),
-        )
+    with timed_stage("analytics"):
+        ANALYTICS_WRITER.enqueue("download")
 
 def track_upload():
-    with get_db() as db:
-        db.execute(
-            "INSERT INTO analytics (ts, event) VALUES (CURRENT_TIMESTAMP, ?)",
-            ("upload",),
-        )
+    with timed_stage("analytics"):
+        ANALYTICS_WRITER.enqueue("upload")
 
 def analytics_series(days: int = 30):
     db = _read_json(ANALYTICS_DB_PATH, {})
@@ -396,6 +1067,87 @@ def analytics_totals(days: int = 30):
         },
     }
 
+# ------------------------------------------------------------------------------
+# In-process caches
+# ------------------------------------------------------------------------------
+
+class BoundedLRUCache:
+    """
+    LRU cache แบบ thread-safe จำกัดขนาดรวมเป็นไบต์ + TTL
+    - sizeof: ฟังก์ชันคำนวณขนาดของ value (ค่าเริ่มต้น len สำหรับ bytes)
+    - value ที่ใหญ่เกิน budget ทั้งก้อนจะไม่ถูกเก็บ
+    """
+
+    def __init__(self, max_bytes: int, ttl: float = 0, sizeof=len):
+        self.max_bytes = max(0, int(max_bytes))
+        self.ttl = float(ttl or 0)
+        self._sizeof = sizeof
+        self._items: OrderedDict[str, tuple[object, int, float]] = OrderedDict()
+        self._bytes = 0
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, size, ts = item
+            if self.ttl and time.monotonic() - ts > self.ttl:
+                del self._items[key]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value) -> None:
+        size = int(self._sizeof(value))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._items[key] = (value, size, time.monotonic())
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._items:
+                _, (_, s, _) = self._items.popitem(last=False)
+                self._bytes -= s
+                self.evictions += 1
+
+    def discard(self, predicate) -> int:
+        """ลบทุก key ที่ predicate(key) เป็นจริง คืนจำนวนที่ลบ"""
+        with self._lock:
+            keys = [k for k in self._items if predicate(k)]
+            for k in keys:
+                self._bytes -= self._items.pop(k)[1]
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._items),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
 # ------------------------------------------------------------------------------
 # QR Code utilities (PNG/Gradient/Logo + SVG)
 # ------------------------------------------------------------------------------
@@ -410,13 +1162,71 @@ ECC_MAP = {
 def parse_ecc(val: str):
     return ECC_MAP.get((val or "H").upper(), constants.ERROR_CORRECT_H)
 
+# ---- stage 1: matrix (เข้ารหัส + เลือก mask pattern — ส่วนที่แพงที่สุด) ----
+QR_BORDER = 4  # quiet zone (โมดูล)
+MATRIX_CACHE_MAX_MB = int(os.getenv("MATRIX_CACHE_MAX_MB", "16"))
+
+class QRMatrix(NamedTuple):
+    """bitmap โมดูลของ QR (ไม่รวม quiet zone) เก็บแบบ np.packbits"""
+    packed: np.ndarray  # uint8
+    count: int          # จำนวนโมดูลต่อด้าน
+    version: int
+
+    def modules(self, border: int = 0) -> np.ndarray:
+        """คืน bool array (count+2*border)^2 — True = โมดูลสีเข้ม"""
+        bits = np.unpackbits(self.packed, count=self.count * self.count)
+        m = bits.reshape(self.count, self.count).astype(bool)
+        return np.pad(m, border) if border else m
+
+MATRIX_CACHE = BoundedLRUCache(
+    MATRIX_CACHE_MAX_MB * 1024 * 1024, sizeof=lambda m: m.packed.nbytes + 64
+)
+
+def qr_matrix(data, ecc="H") -> QRMatrix:
+    """เข้ารหัส (data, ecc) เป็น QRMatrix พร้อม cache — ใช้ร่วมกันทั้ง PNG/SVG"""
+    level = parse_ecc(ecc)
+    key = hashlib.sha256(f"{level}|{data}".encode("utf-8")).hexdigest()
+    m = MATRIX_CACHE.get(key)
+    if m is None:
+        qr = QRCode(version=5, error_correction=level, box_size=10, border=QR_BORDER)
+        qr.add_data(data)
+        qr.make(fit=True)
+        bits = np.array(qr.modules, dtype=bool)
+        m = QRMatrix(np.packbits(bits), qr.modules_count, qr.version)
+        MATRIX_CACHE.put(key, m)
+    return m
+
+# ---- stage 2: render ----
 def trim_transparent(img: Image.Image) -> Image.Image:
     bbox = img.getbbox()
     return img.crop(bbox) if bbox else img
 
+LOGO_CACHE_MAX_MB = int(os.getenv("LOGO_CACHE_MAX_MB", "32"))
+LOGO_CACHE = BoundedLRUCache(LOGO_CACHE_MAX_MB * 1024 * 1024, sizeof=lambda im: im.width * im.height * 4)
+LOGO_PAD_RATIO = 0.13
+LOGO_PREWARM_SIZES = (256, 512, 1024, 2048)  # ขนาด QR ที่ UI มีให้เลือก
+
+def _logo_key(logo_path: str, *extra) -> str:
+    """key ของ LOGO_CACHE ขึ้นต้นด้วย path เสมอ (ใช้ลบทั้งชุดตอนไฟล์ถูกลบ/แทนที่)"""
+    ident = _logo_identity(logo_path) or [os.path.abspath(logo_path), 0, 0]
+    return "|".join(str(p) for p in (*ident, *extra))
+
+def _logo_source(logo_path: str) -> Image.Image:
+    """โลโก้ที่ decode + trim ขอบโปร่งใสแล้ว (cache ตามตัวตนไฟล์)"""
+    key = _logo_key(logo_path, "src")
+    logo = LOGO_CACHE.get(key)
+    if logo is None:
+        logo = trim_transparent(Image.open(logo_path).convert("RGBA"))
+        LOGO_CACHE.put(key, logo)
+    return logo
+
 def resize_logo_keep_ratio_with_padding(logo_path: str, box_size: int, pad_ratio: float = 0.1):
-    logo = Image.open(logo_path).convert("RGBA")
-    logo = trim_transparent(logo)
+    key = _logo_key(logo_path, box_size, pad_ratio)
+    cached = LOGO_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    logo = _logo_source(logo_path)
     w, h = logo.size
     pad = int(box_size * pad_ratio)
     max_logo_size = box_size - 2 * pad
@@ -431,84 +1241,307 @@ def resize_logo_keep_ratio_with_padding(logo_path: str, box_size: int, pad_ratio
     paste_x = (box_size - new_w) // 2
     paste_y = (box_size - new_h) // 2
     logo_square.paste(logo_resized, (paste_x, paste_y), mask=logo_resized)
+    LOGO_CACHE.put(key, logo_square)
     return logo_square
 
-def _linear_gradient(size, c1, c2):
-    w, h = size
-    x = np.linspace(0.0, 1.0, w, dtype=np.float32)
-    y = np.linspace(0.0, 1.0, h, dtype=np.float32)
-    t = (x + y[:, None]) * 0.5
-    c1 = np.array(c1, dtype=np.float32)
-    c2 = np.array(c2, dtype=np.float32)
-    rgb = (c1 + (c2 - c1) * t[..., None]).clip(0, 255).astype(np.uint8)
-    a = np.full((h, w, 1), 255, dtype=np.uint8)
-    return Image.fromarray(np.concatenate([rgb, a], axis=2), "RGBA")
-
-def _radial_gradient(size, c1, c2):
-    w, h = size
-    cx, cy = (w - 1) / 2.0, (h - 1) / 2.0
-    yy, xx = np.ogrid[0:h, 0:w]
-    r = np.sqrt((xx - cx) ** 2 + (yy - cy) ** 2)
-    r = (r / r.max()).astype(np.float32)
+def warm_logo_cache(logo_path: str) -> None:
+    """เตรียม tile โลโก้สำหรับขนาด QR มาตรฐานไว้ล่วงหน้า (เรียกตอนอัปโหลด)"""
+    for size_px in LOGO_PREWARM_SIZES:
+        resize_logo_keep_ratio_with_padding(logo_path, size_px // 4, pad_ratio=LOGO_PAD_RATIO)
+
+def invalidate_logo_cache(logo_path: str) -> int:
+    """ลบทุก entry ของไฟล์โลโก้นี้ออกจาก LOGO_CACHE"""
+    prefix = os.path.abspath(logo_path) + "|"
+    return LOGO_CACHE.discard(lambda k: k.startswith(prefix))
+
+GRADIENT_CACHE_MAX_MB = int(os.getenv("GRADIENT_CACHE_MAX_MB", "64"))
+GRADIENT_CACHE = BoundedLRUCache(GRADIENT_CACHE_MAX_MB * 1024 * 1024, sizeof=lambda a: a.nbytes)
+
+def _gradient_field(style: str, size: int) -> np.ndarray:
+    """
+    ค่า t ของการไล่สี (0..255) ต่อพิกเซล เป็น uint8 (size, size) — cache ตาม (style, size)
+    - linear: แนวทแยง ซ้ายบน -> ขวาล่าง
+    - radial: วงกลมจากกึ่งกลางออกไปมุมภาพ
+    """
+    key = f"{style}:{size}"
+    field = GRADIENT_CACHE.get(key)
+    if field is None:
+        axis = np.linspace(0.0, 1.0, size, dtype=np.float32)
+        if style == "radial":
+            d = (np.arange(size, dtype=np.float32) - (size - 1) / 2.0) ** 2
+            t = np.sqrt(d + d[:, None])
+            t /= t.max() or 1.0
+        else:
+            t = (axis + axis[:, None]) * 0.5
+        field = np.rint(t * 255).astype(np.uint8)
+        field.setflags(write=False)  # ใช้ร่วมกันหลาย request ห้ามแก้
+        GRADIENT_CACHE.put(key, field)
+    return field
+
+def _gradient_lut(c1, c2) -> np.ndarray:
+    """ตารางสี 256 ช่องของคู่สี c1 -> c2 (RGBA ทึบ แพ็กเป็น uint32 ต่อช่อง)"""
+    steps = np.arange(256, dtype=np.float32)[:, None] / 255.0
     c1 = np.array(c1, dtype=np.float32)
     c2 = np.array(c2, dtype=np.float32)
-    rgb = (c1 + (c2 - c1) * r[..., None]).clip(0, 255).astype(np.uint8)
-    a = np.full((h, w, 1), 255, dtype=np.uint8)
-    return Image.fromarray(np.concatenate([rgb, a], axis=2), "RGBA")
+    rgba = np.empty((256, 4), dtype=np.uint8)
+    rgba[:, :3] = (c1 + (c2 - c1) * steps).round().clip(0, 255)
+    rgba[:, 3] = 255
+    return rgba.view(np.uint32)[:, 0]
 
 def generate_qr_code_png(
     data, logo_path=None, fill_color="#000", back_color="#fff", transparent=False,
     size_px: int | None = None, ecc="H", fill_style="solid", fill_color2="#000000"
 ) -> Image.Image:
-    qr = QRCode(version=5, error_correction=parse_ecc(ecc), box_size=10, border=4)
-    qr.add_data(data)
-    qr.make(fit=True)
-
-    if size_px:
-        modules = qr.modules_count + qr.border * 2
-        qr.box_size = max(1, math.ceil(size_px / modules))
-
-    mask_gray = qr.make_image(fill_color="#000", back_color="#fff").convert("L")
-    w, h = mask_gray.size
-    mask = mask_gray.point(lambda p: 255 - p)  # invert
-
-    base = Image.new("RGBA", (w, h), (0, 0, 0, 0) if transparent else (*ImageColor.getrgb(back_color), 255))
-
-    c1 = ImageColor.getrgb(fill_color)
-    if fill_style == "linear":
-        c2 = ImageColor.getrgb(fill_color2 or fill_color)
-        color_img = _linear_gradient((w, h), c1, c2)
-    elif fill_style == "radial":
-        c2 = ImageColor.getrgb(fill_color2 or fill_color)
-        color_img = _radial_gradient((w, h), c1, c2)
-    else:
-        color_img = Image.new("RGBA", (w, h), (*c1, 255))
-
-    base.paste(color_img, (0, 0), mask)
+    with timed_stage("matrix"):
+        bits = qr_matrix(data, ecc).modules(border=QR_BORDER)
+    n = bits.shape[0]
+    # อย่างน้อย 1 px ต่อโมดูล — เล็กกว่านี้บางโมดูลได้ 0 px หายไป (สแกนไม่ได้)
+    size = max(int(size_px), n) if size_px else n * 10
+    counts = np.diff((np.arange(n + 1) * size) // n)  # พิกเซลต่อโมดูล (floor/ceil)
+    has_logo = bool(logo_path and os.path.exists(logo_path))
+    gradient = fill_style in ("linear", "radial")
+
+    if not gradient and not has_logo:
+        # สองสีล้วน -> ภาพโหมด P (index 0/1, 1 ไบต์ต่อพิกเซล) — PNG จะเขียนเป็น 1-bit palette
+        with timed_stage("raster"):
+            idx = np.repeat(np.repeat(bits.view(np.uint8), counts, axis=0), counts, axis=1)
+            img = Image.fromarray(idx, "L")
+            bg_rgb = (0, 0, 0) if transparent else ImageColor.getrgb(back_color)[:3]
+            img.putpalette([*bg_rgb, *ImageColor.getrgb(fill_color)[:3]])
+            if transparent:
+                img.info["transparency"] = 0
+        return img
+
+    # เรนเดอร์ลงบัฟเฟอร์ RGBA ขนาดเป้าหมายโดยตรง: palette[โมดูล] แล้วขยายด้วย np.repeat
+    with timed_stage("raster"):
+        bg = (0, 0, 0, 0) if transparent else (*ImageColor.getrgb(back_color), 255)
+        fg = (*ImageColor.getrgb(fill_color), 255)
+        palette = np.array([bg, fg], dtype=np.uint8)
+        out = np.repeat(np.repeat(palette[bits.view(np.uint8)], counts, axis=0), counts, axis=1)
+
+    if gradient:
+        with timed_stage("gradient"):
+            c2 = ImageColor.getrgb(fill_color2 or fill_color)
+            fill = np.take(_gradient_lut(fg[:3], c2), _gradient_field(fill_style, size))
+            # ลงสีเฉพาะพิกเซลของโมดูลเข้ม (มองเป็น uint32 ต่อพิกเซล)
+            mask = np.repeat(np.repeat(bits, counts, axis=0), counts, axis=1)
+            np.copyto(out.view(np.uint32)[..., 0], fill, where=mask)
+        if not has_logo and not transparent and all(len(set(c[:3])) == 1 for c in (bg, fg, c2)):
+            # ทุกสีเป็นเทา -> เก็บแค่ช่องเดียว (โหมด L)
+            return Image.fromarray(np.ascontiguousarray(out[..., 0]), "L")
+
+    if has_logo:
+        with timed_stage("logo"):
+            logo_size = size // 4
+            x = y = (size - logo_size) // 2
+            if not transparent:
+                out[y:y + logo_size + 1, x:x + logo_size + 1] = (255, 255, 255, 255)
+            base = Image.fromarray(out, "RGBA")
+            logo = resize_logo_keep_ratio_with_padding(logo_path, logo_size, pad_ratio=LOGO_PAD_RATIO)
+            base.paste(logo, (x, y), mask=logo)
+        return base
+
+    return Image.fromarray(out, "RGBA")
+
+def _svg_color(value: str) -> str:
+    """สีจากผู้ใช้ -> #rrggbb (ตรวจด้วย ImageColor เหมือนฝั่ง PNG; กันข้อความแปลกหลุดเข้า attribute)"""
+    return "#%02x%02x%02x" % ImageColor.getrgb(value)[:3]
+
+def _invalid_color(*values: str) -> str | None:
+    """คืนสีแรกที่ ImageColor อ่านไม่ได้ (None = ใช้ได้ทั้งหมด) — ตรวจก่อนเริ่มเรนเดอร์/stream"""
+    for v in values:
+        try:
+            ImageColor.getrgb(v)
+        except ValueError:
+            return v
+    return None
 
+def _module_rects(bits: np.ndarray) -> Iterator[tuple[int, int, int, int]]:
+    """
+    แปลง bitmap โมดูลเป็นสี่เหลี่ยม (x, y, w, h)
+    - ต่อโมดูลเข้มที่ติดกันในแถวเป็น run แนวนอน
+    - run ที่ตำแหน่ง/ความยาวเดียวกันในแถวถัดไปต่อเป็นสี่เหลี่ยมแนวตั้ง
+    """
+    open_runs: dict[tuple[int, int], int] = {}  # (x, w) -> y เริ่ม
+    edges = np.diff(np.pad(bits.view(np.int8), ((0, 0), (1, 1))), axis=1)
+    for y in range(bits.shape[0] + 1):
+        runs = set()
+        if y < bits.shape[0]:
+            starts = np.flatnonzero(edges[y] == 1)
+            ends = np.flatnonzero(edges[y] == -1)
+            runs = {(int(x0), int(x1 - x0)) for x0, x1 in zip(starts, ends)}
+        for run in [r for r in open_runs if r not in runs]:
+            y0 = open_runs.pop(run)
+            yield run[0], y0, run[1], y - y0
+        for run in runs:
+            open_runs.setdefault(run, y)
+
+def iter_qr_code_svg(
+    data, logo_path=None, fill_color="#000", back_color="#fff", transparent=False,
+    size_px: int | None = None, ecc="H", fill_style="solid", fill_color2="#000000"
+) -> Iterator[str]:
+    """
+    เขียน SVG ทีละชิ้น (ไม่สร้าง DOM) จาก QRMatrix
+    - พิกัดเป็นหน่วยโมดูล (viewBox) — โมดูลติดกันรวมเป็น path เดียวแบบสี่เหลี่ยมที่ merge แล้ว
+    - linear/radial ใช้ <linearGradient>/<radialGradient> ให้ตรงกับฝั่ง PNG
+    - โลโก้ฝังเป็น PNG base64 (ขนาด 1/4 ของภาพ + พื้นขาวใต้โลโก้เหมือน PNG)
+    """
+    m = qr_matrix(data, ecc)
+    bits = m.modules(border=QR_BORDER)
+    n = bits.shape[0]
+    size = max(int(size_px), n) if size_px else n * 10  # อย่างน้อย 1 px ต่อโมดูล เหมือนฝั่ง PNG
+    fg = _svg_color(fill_color)
+    # เตรียมโลโก้ก่อน yield ชิ้นแรก — ผิดพลาดตรงนี้ผู้เรียกยังตอบ 400 ได้ (header ยังไม่ออก)
+    logo_png = None
     if logo_path and os.path.exists(logo_path):
-        logo_size = w // 4
-        logo = resize_logo_keep_ratio_with_padding(logo_path, logo_size, pad_ratio=0.13)
-        x = (w - logo_size) // 2
-        y = (h - logo_size) // 2
-        box_layer = Image.new("RGBA", (w, h), (0, 0, 0, 0))
-        ImageDraw.Draw(box_layer).rectangle([x, y, x + logo_size, y + logo_size],
-                                            fill=(255, 255, 255, 255) if not transparent else (255, 255, 255, 0))
-        base = Image.alpha_composite(base, box_layer)
-        base.paste(logo, (x, y), mask=logo)
-
-    if size_px and (base.width != size_px or base.height != size_px):
-        base = base.resize((size_px, size_px), Image.NEAREST)
-
-    return base
-
-def generate_qr_code_svg(data, fill_color="#000", back_color="#fff", transparent=False, ecc="H") -> bytes:
-    qr = QRCode(version=5, error_correction=parse_ecc(ecc), box_size=10, border=4)
-    qr.add_data(data)
-    qr.make(fit=True)
-    bg = None if transparent else back_color
-    img = qr.make_image(image_factory=SvgPathImage, fill_color=fill_color, back_color=bg)
-    return img.to_string()
+        logo = resize_logo_keep_ratio_with_padding(logo_path, size // 4, pad_ratio=LOGO_PAD_RATIO)
+        logo_png = base64.b64encode(_encode_png(logo)).decode("ascii")
+
+    yield ('<?xml version="1.0" encoding="UTF-8"?>\n'
+           f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+           f'width="{size}" height="{size}" viewBox="0 0 {n} {n}" shape-rendering="crispEdges">')
+    fill = fg
+    if fill_style in ("linear", "radial"):
+        c2 = _svg_color(fill_color2 or fill_color)
+        stops = f'<stop offset="0" stop-color="{fg}"/><stop offset="1" stop-color="{c2}"/>'
+        if fill_style == "radial":
+            r = n / 2 * math.sqrt(2)
+            yield (f'<defs><radialGradient id="g" gradientUnits="userSpaceOnUse" '
+                   f'cx="{n / 2:g}" cy="{n / 2:g}" r="{r:.4f}">{stops}</radialGradient></defs>')
+        else:
+            yield (f'<defs><linearGradient id="g" gradientUnits="userSpaceOnUse" '
+                   f'x1="0" y1="0" x2="{n}" y2="{n}">{stops}</linearGradient></defs>')
+        fill = "url(#g)"
+    if not transparent:
+        yield f'<rect width="{n}" height="{n}" fill="{_svg_color(back_color)}"/>'
+
+    yield f'<path fill="{fill}" d="'
+    buf = []
+    for x, y, w, h in _module_rects(bits):
+        buf.append(f"M{x} {y}h{w}v{h}h-{w}z")
+        if len(buf) >= 512:
+            yield "".join(buf)
+            buf.clear()
+    yield "".join(buf) + '"/>'
+
+    if logo_png is not None:
+        lw = n / 4
+        lx = (n - lw) / 2
+        if not transparent:
+            yield f'<rect x="{lx:g}" y="{lx:g}" width="{lw:g}" height="{lw:g}" fill="#ffffff"/>'
+        yield (f'<image x="{lx:g}" y="{lx:g}" width="{lw:g}" height="{lw:g}" '
+               f'xlink:href="data:image/png;base64,{logo_png}"/>')
+    yield "</svg>\n"
+
+def generate_qr_code_svg(
+    data, logo_path=None, fill_color="#000", back_color="#fff", transparent=False,
+    size_px: int | None = None, ecc="H", fill_style="solid", fill_color2="#000000"
+) -> bytes:
+    return "".join(iter_qr_code_svg(
+        data, logo_path, fill_color, back_color, transparent,
+        size_px=size_px, ecc=ecc, fill_style=fill_style, fill_color2=fill_color2,
+    )).encode("utf-8")
+
+# ------------------------------------------------------------------------------
+# Render cache (PNG/SVG bytes) — LRU + byte budget + TTL
+# ------------------------------------------------------------------------------
+
+RENDER_CACHE_MAX_MB = int(os.getenv("RENDER_CACHE_MAX_MB", "64"))
+RENDER_CACHE_TTL = int(os.getenv("RENDER_CACHE_TTL", "600"))  # วินาที (0 = ไม่หมดอายุ)
+
+RENDER_CACHE = BoundedLRUCache(RENDER_CACHE_MAX_MB * 1024 * 1024, ttl=RENDER_CACHE_TTL)
+RENDER_REV = 4  # เพิ่มเมื่อผลเรนเดอร์เปลี่ยน เพื่อไม่ให้ ETag เก่าตอบ 304 ผิด
+
+def _logo_identity(logo_path: str | None):
+    """ตัวระบุไฟล์โลโก้ (path, mtime, size) — ไฟล์เปลี่ยนแล้ว key เปลี่ยนตาม"""
+    if not logo_path:
+        return None
+    try:
+        st = os.stat(logo_path)
+    except OSError:
+        return None
+    return [os.path.abspath(logo_path), st.st_mtime_ns, st.st_size]
+
+def qr_render_key(
+    fmt: str, data, logo_path=None, fill_color="#000", back_color="#fff", transparent=False,
+    size_px: int | None = None, ecc="H", fill_style="solid", fill_color2="#000000"
+) -> str:
+    """
+    key แบบ canonical ของผลเรนเดอร์ (ใช้เป็น ETag ด้วย)
+    - ตัดพารามิเตอร์ที่ไม่มีผลต่อภาพออก เช่น สีที่สองตอน solid, สีพื้นตอนโปร่งใส
+    """
+    fill_style = (fill_style or "solid").lower()
+    gradient = fill_style in ("linear", "radial")
+    params = {
+        "rev": RENDER_REV,
+        "fmt": fmt,
+        "data": data,
+        "ecc": (ecc or "H").upper(),
+        "style": fill_style if gradient else "solid",
+        "fill": (fill_color or "").strip().lower(),
+        "fill2": (fill_color2 or fill_color or "").strip().lower() if gradient else None,
+        "back": None if transparent else (back_color or "").strip().lower(),
+        "transparent": bool(transparent),
+        "size": size_px,
+        "logo": _logo_identity(logo_path),
+    }
+    blob = json.dumps(params, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:32]
+
+def cached_render(key: str, render) -> bytes:
+    """คืนไบต์จาก RENDER_CACHE หรือเรียก render() แล้วเก็บไว้"""
+    body = RENDER_CACHE.get(key)
+    if body is None:
+        body = render()
+        RENDER_CACHE.put(key, body)
+    return body
+
+def cached_render_stream(key: str, chunks: Iterator[str]) -> Iterator[bytes]:
+    """ส่งต่อชิ้นข้อความที่ render ออกมาทันที และเก็บไบต์ทั้งหมดเข้า RENDER_CACHE เมื่อครบ"""
+    parts = []
+    for chunk in chunks:
+        b = chunk.encode("utf-8")
+        parts.append(b)
+        yield b
+    RENDER_CACHE.put(key, b"".join(parts))
+
+# preset การบีบอัด (ตัวเลขดู python -m benchmarks.encode)
+# - ภาพสองสี (P 1-bit) PNG default เล็กพอ ๆ กับ WebP และเร็วกว่าหลายเท่า -> พรีวิวสองสีใช้ PNG เสมอ
+# - ภาพไล่สี WebP default เล็กกว่า PNG default ~25-80% แลกเวลา encode -> พรีวิวไล่สีใช้ WebP ถ้า client รับ
+PNG_PRESETS = {
+    "fast": {"compress_level": 1},
+    "default": {"compress_level": 6},
+    "small": {"optimize": True},
+}
+WEBP_PRESETS = {  # lossless เสมอ — ขอบโมดูลต้องคม
+    "fast": {"lossless": True, "quality": 0, "method": 0},
+    "default": {"lossless": True, "quality": 10, "method": 1},
+    "small": {"lossless": True, "quality": 50, "method": 3},
+}
+PREVIEW_PNG_PRESET = os.getenv("PREVIEW_PNG_PRESET", "default")
+PREVIEW_WEBP_PRESET = os.getenv("PREVIEW_WEBP_PRESET", "default")
+DOWNLOAD_ENCODE_PRESET = os.getenv("DOWNLOAD_ENCODE_PRESET", "small")
+WEBP_ENABLED = features.check("webp")
+
+def _encode_png(img: Image.Image, preset: str = "default") -> bytes:
+    buf = BytesIO()
+    with timed_stage("png_encode"):
+        img.save(buf, format="PNG", **PNG_PRESETS[preset])
+    return buf.getvalue()
+
+def _encode_webp(img: Image.Image, preset: str = "default") -> bytes:
+    buf = BytesIO()
+    with timed_stage("webp_encode"):
+        img.save(buf, format="WEBP", **WEBP_PRESETS[preset])
+    return buf.getvalue()
+
+def _not_modified(etag: str):
+    """ตอบ 304 ถ้า If-None-Match ตรงกับ etag (ไม่ต้องเรนเดอร์ใหม่)"""
+    if request.if_none_match.contains(etag):
+        resp = app.response_class(status=304)
+        resp.set_etag(etag)
+        return resp
+    return None
 
 # ------------------------------------------------------------------------------
 # Routes: Home / QR / Uploads
@@ -543,27 +1576,56 @@ def index():
         logo_name = request.form.get("logo")
         logo_path = os.path.join(UPLOAD_FOLDER, logo_name) if logo_name else None
         ecc = (request.form.get("ecc") or "H").upper()
+        bad = _invalid_color(fill_color, back_color, fill_color2 or fill_color)
+        if bad is not None:
+            return f"Invalid color: {bad}", 400
 
         if out_format == "svg":
-            if logo_path:
-                return "SVG download does not support logo in this version.", 400
-            svg_bytes = generate_qr_code_svg(data, fill_color, back_color, transparent, ecc)
-            buf = BytesIO(svg_bytes)
-            buf.seek(0)
+            key = qr_render_key(
+                "svg", data, logo_path, fill_color, back_color, transparent,
+                size_px=size_px, ecc=ecc, fill_style=fill_style, fill_color2=fill_color2
+            )
+            resp = _not_modified(key)
+            if resp is not None:
+                return resp
+            body = RENDER_CACHE.get(key)
+            if body is None:
+                chunks = iter_qr_code_svg(
+                    data, logo_path, fill_color, back_color, transparent,
+                    size_px=size_px, ecc=ecc, fill_style=fill_style, fill_color2=fill_color2
+                )
+                # ดึงชิ้นแรก (สร้าง matrix + เตรียมโลโก้) ก่อนส่ง header 200 — ผิดพลาดจะได้ตอบ 400 ไม่ใช่ไฟล์ขาด
+                try:
+                    first = next(chunks)
+                except (DataOverflowError, ValueError):
+                    return "Data too long for a QR code", 400
+                except OSError:  # ไฟล์โลโก้เสีย/อ่านไม่ได้
+                    return "Invalid logo", 400
+                # stream ทีละชิ้นแล้วเก็บเข้า cache เมื่อเขียนครบ
+                body = cached_render_stream(key, itertools.chain([first], chunks))
             track_download()
-            return send_file(buf, mimetype="image/svg+xml",
-                             as_attachment=True, download_name="qr_code.svg")
+            resp = app.response_class(body, mimetype="image/svg+xml")
+            resp.headers["Content-Disposition"] = "attachment; filename=qr_code.svg"
+            resp.set_etag(key)
+            return resp
 
-        img = generate_qr_code_png(
-            data, logo_path, fill_color, back_color, transparent,
+        key = qr_render_key(
+            f"png/{DOWNLOAD_ENCODE_PRESET}", data, logo_path, fill_color, back_color, transparent,
             size_px=size_px, ecc=ecc, fill_style=fill_style, fill_color2=fill_color2
         )
-        buf = BytesIO()
-        img.save(buf, format="PNG")
-        buf.seek(0)
+        resp = _not_modified(key)  # send_file ตอบ 304 เองเฉพาะ GET/HEAD — ฟอร์มนี้เป็น POST
+        if resp is not None:
+            return resp
+        try:
+            png = cached_render(key, lambda: _encode_png(generate_qr_code_png(
+                data, logo_path, fill_color, back_color, transparent,
+                size_px=size_px, ecc=ecc, fill_style=fill_style, fill_color2=fill_color2
+            ), DOWNLOAD_ENCODE_PRESET))
+        except (DataOverflowError, ValueError):  # qrcode บางรุ่นโยน ValueError (version > 40)
+            return "Data too long for a QR code", 400
         track_download()
-        return send_file(buf, mimetype="image/png",
-                         as_attachment=True, download_name="qr_code.png")
+        return send_file(BytesIO(png), mimetype="image/png",
+                         as_attachment=True, download_name="qr_code.png", etag=key)
 
     return render_template("index.html", logos=logos)
 
@@ -582,50 +1644,327 @@ ASSET_MAX_MB = {"pdf": 10, "mp3": 15, "image": 5}
 for d in ASSET_FOLDERS.values():
     os.makedirs(d, exist_ok=True)
 
+ASSET_MIME_EXT = {
+    "application/pdf": "pdf",
+    "audio/mpeg": "mp3",
+    "image/jpeg": "jpg",
+    "image/png": "png",
+}
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(256 * 1024)))
+UPLOAD_SESSION_TTL_S = int(os.getenv("UPLOAD_SESSION_TTL_S", "86400"))
+MULTIPART_OVERHEAD = 64 * 1024  # เผื่อ header/boundary ของ multipart ตอนเช็ค Content-Length
+
+class UploadTooLarge(Exception):
+    pass
+
+def _asset_limit(atype: str) -> int:
+    return ASSET_MAX_MB[atype] * 1024 * 1024
+
+def _asset_ext(filename: str, mimetype: str | None = None) -> str:
+    ext = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    return ext or ASSET_MIME_EXT.get((mimetype or "").lower(), "")
+
+def _copy_stream(src, dst, limit: int) -> int:
+    """
+    คัดลอก src -> dst ทีละ UPLOAD_CHUNK_SIZE
+    - เกิน limit เมื่อไหร่ raise UploadTooLarge ทันที (ไม่อ่านส่วนที่เหลือ)
+    """
+    total = 0
+    while True:
+        chunk = src.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return total
+        total += len(chunk)
+        if total > limit:
+            raise UploadTooLarge()
+        dst.write(chunk)
+
+class _SpoolPart(io.FileIO):
+    """ไฟล์ชั่วคราวของ part หนึ่งใน multipart — hash ระหว่างเขียน และหักโควตารวมของ _UploadSpool"""
+
+    def __init__(self, spool: "_UploadSpool", path: str):
+        super().__init__(path, "w+")
+        self.spool, self.hasher, self.size = spool, hashlib.sha256(), 0
+
+    def write(self, data) -> int:
+        self.spool.remaining -= len(data)
+        if self.spool.remaining < 0:
+            raise UploadTooLarge()
+        self.hasher.update(data)
+        self.size += len(data)
+        return super().write(data)
+
+class _UploadSpool:
+    """
+    stream_factory ของ werkzeug multipart parser
+    - ไฟล์ทุก part เขียนลงโฟลเดอร์ปลายทางตรง ๆ ระหว่าง parse (ไม่ spool ซ้ำ ไม่ copy อีกรอบ)
+    - ขนาดรวมทุก part เกิน limit -> UploadTooLarge ทันที ใช้ได้กับ body แบบ chunked ที่ไม่มี Content-Length
+    """
+
+    def __init__(self, folder: str, limit: int):
+        self.folder, self.remaining = folder, limit
+        self.parts: list[_SpoolPart] = []
+
+    def __call__(self, total_content_length=None, content_type=None, filename=None, content_length=None):
+        part = _SpoolPart(self, os.path.join(self.folder, f".upload-{secrets.token_hex(8)}.part"))
+        self.parts.append(part)
+        return part
+
+    def cleanup(self) -> None:
+        for part in self.parts:
+            part.close()
+            if os.path.exists(part.name):
+                os.remove(part.name)
+
+def _sha256_file(path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(UPLOAD_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _unique_asset_name(atype: str, stem: str, ext: str) -> str:
+    base = f"{stem}_{int(time.time())}"
+    name, n = f"{base}.{ext}", 1
+    while os.path.exists(os.path.join(ASSET_FOLDERS[atype], name)):
+        n += 1
+        name = f"{base}_{n}.{ext}"
+    return name
+
+def _finalize_asset(atype: str, stem: str, ext: str, tmp_path, size: int, sha256: str) -> dict:
+    """
+    เก็บไฟล์ชั่วคราวเข้าที่แบบ content-addressed แล้วสร้าง/คืนลิงก์สั้น
+    - เนื้อหา (SHA-256) ซ้ำกับที่มีอยู่ -> ไม่เขียนไฟล์ใหม่ เพิ่ม refs แล้วคืน URL/ลิงก์สั้นเดิม
+    - เนื้อหาใหม่ -> rename แบบ atomic เข้า static/files/<atype>/
+    (ไฟล์ชั่วคราวที่ไม่ถูกใช้ ผู้เรียกเป็นคนลบ)
+    """
+    folder = ASSET_FOLDERS[atype]
+    with get_db() as db:
+        db.execute("BEGIN IMMEDIATE")
+        row = db.execute(
+            "SELECT name FROM asset_blobs WHERE atype = ? AND sha256 = ?", (atype, sha256)
+        ).fetchone()
+        if row and os.path.isfile(os.path.join(folder, row["name"])):
+            db.execute("UPDATE asset_blobs SET refs = refs + 1 WHERE atype = ? AND sha256 = ?", (atype, sha256))
+            final_name, deduplicated = row["name"], True
+        else:
+            final_name, deduplicated = _unique_asset_name(atype, stem, ext), False
+            os.replace(tmp_path, os.path.join(folder, final_name))
+            db.execute(
+                """
+                INSERT INTO asset_blobs (atype, sha256, name, size, refs, created_at) VALUES (?, ?, ?, ?, 1, ?)
+                ON CONFLICT(atype, sha256) DO UPDATE SET
+                    name = excluded.name, size = excluded.size, refs = 1, created_at = excluded.created_at
+                """,
+                (atype, sha256, final_name, size, time.time()),
+            )
+    long_url = url_for("static", filename=f"files/{atype}/{final_name}", _external=True)
+    code, _ = get_or_create_code(long_url)
+    short_url = url_for("short_redirect", code=code, _external=True)
+    catalog_upsert(atype, final_name, sha256=sha256, short_code=code)
+    if not deduplicated:
+        queue_thumbnail(atype, final_name)
+    track_upload()
+    return dict(success=True, url=long_url, short_url=short_url, filename=final_name,
+                size=size, sha256=sha256, deduplicated=deduplicated)
+
+def _too_large(atype: str):
+    return jsonify(error=f"file too large (>{ASSET_MAX_MB[atype]} MB)"), 413
+
 @app.post("/upload_asset/<atype>")
 def upload_asset(atype):
+    """
+    อัปโหลดไฟล์ครั้งเดียว รองรับ 2 แบบ
+    - multipart/form-data (field "file") — แบบเดิมของหน้าเว็บ
+      parse เองด้วย FormDataParser + _UploadSpool (ไม่ใช้ request.files ที่ spool ทั้ง body ก่อน)
+    - raw body (เช่น application/octet-stream) + ?filename= หรือ header X-Filename
+      อ่านจาก request.stream ตรง ๆ
+    ทั้งสองแบบเขียนลงไฟล์ชั่วคราวทีละชิ้น คำนวณ SHA-256 ระหว่างรับ
+    และตัดทิ้งทันทีที่เกินขนาดของชนิดนั้น (Content-Length เกินตั้งแต่แรก = ไม่อ่าน body เลย)
+    """
     atype = (atype or "").lower()
     if atype not in ASSET_FOLDERS:
         return jsonify(error="unsupported asset type"), 400
 
-    f = request.files.get("file")
-    if not f or not f.filename:
-        return jsonify(error="no file"), 400
-
-    orig_name = f.filename
-    orig_ext = os.path.splitext(orig_name)[1].lower().lstrip(".")
-    if not orig_ext:
-        mime = (f.mimetype or "").lower()
-        mime_map = {
-            "application/pdf": "pdf",
-            "audio/mpeg": "mp3",
-            "image/jpeg": "jpg",
-            "image/png": "png",
-        }
-        orig_ext = mime_map.get(mime, "")
+    limit = _asset_limit(atype)
+    multipart = request.mimetype == "multipart/form-data"
+    declared = request.content_length
+    if declared is not None and declared > limit + (MULTIPART_OVERHEAD if multipart else 0):
+        return _too_large(atype)
 
-    if orig_ext not in ASSET_EXTS.get(atype, set()):
-        return jsonify(error="invalid extension"), 400
+    # ไฟล์ชั่วคราวอยู่ในโฟลเดอร์ปลายทาง (filesystem เดียวกัน -> rename ได้)
+    spool = _UploadSpool(ASSET_FOLDERS[atype], limit)
+    try:
+        if multipart:
+            parser = FormDataParser(stream_factory=spool, max_form_memory_size=request.max_form_memory_size,
+                                    max_form_parts=request.max_form_parts)
+            _, _, files = parser.parse(request.stream, request.mimetype, declared, request.mimetype_params)
+            f = files.get("file")
+            if not f or not f.filename:
+                return jsonify(error="no file"), 400
+            orig_name, part = f.filename, f.stream
+            orig_ext = _asset_ext(orig_name, f.mimetype)
+        else:
+            orig_name = request.args.get("filename") or request.headers.get("X-Filename") or ""
+            if not orig_name:
+                return jsonify(error="no file"), 400
+            orig_ext = _asset_ext(orig_name, request.mimetype)
+            if orig_ext in ASSET_EXTS.get(atype, set()):
+                part = spool()
+                _copy_stream(request.stream, part, limit)
+
+        if orig_ext not in ASSET_EXTS.get(atype, set()):
+            return jsonify(error="invalid extension"), 400
+
+        part.close()
+        base_stem = secure_filename(os.path.splitext(orig_name)[0]) or "file"
+        return jsonify(_finalize_asset(atype, base_stem, orig_ext, part.name, part.size, part.hasher.hexdigest()))
+    except (UploadTooLarge, RequestEntityTooLarge):
+        return _too_large(atype)
+    finally:
+        spool.cleanup()
 
-    base_stem = secure_filename(os.path.splitext(orig_name)[0]) or "file"
+# ---- resumable (chunked) upload ----
+def _upload_session(upload_id: str):
+    with get_db() as db:
+        return db.execute("SELECT * FROM upload_sessions WHERE id = ?", (upload_id,)).fetchone()
+
+def _upload_part_path(atype: str, upload_id: str) -> Path:
+    """
+    ไฟล์ .part อยู่ในโฟลเดอร์ปลายทางของชนิดนั้นเลย (ชื่อขึ้นต้นด้วย . = ไม่โผล่ในแคตตาล็อก)
+    ตอนปิดงานจึง os.replace ได้เสมอ — ถ้าไว้ใต้ data/ ซึ่งอาจอยู่คนละ filesystem จะเจอ EXDEV
+    """
+    return Path(ASSET_FOLDERS[atype]) / f".session-{upload_id}.part"
+
+def _purge_upload_sessions() -> None:
+    """ลบ session ที่ไม่ขยับเกิน UPLOAD_SESSION_TTL_S พร้อมไฟล์ .part"""
+    cutoff = time.time() - UPLOAD_SESSION_TTL_S
+    with get_db() as db:
+        stale = [(r["atype"], r["id"]) for r in
+                 db.execute("SELECT id, atype FROM upload_sessions WHERE updated_at < ?", (cutoff,))]
+        db.executemany("DELETE FROM upload_sessions WHERE id = ?", [(i,) for _, i in stale])
+    for atype, i in stale:
+        _upload_part_path(atype, i).unlink(missing_ok=True)
+
+def _upload_state(sess) -> dict:
+    return dict(success=True, upload_id=sess["id"], offset=sess["received"], size=sess["size"],
+                chunk_size=UPLOAD_CHUNK_SIZE)
+
+@app.post("/upload_asset/<atype>/sessions")
+def upload_session_create(atype):
+    """
+    เริ่มอัปโหลดแบบแบ่งชิ้น: JSON {"filename": "...", "size": <bytes>}
+    - ตรวจชนิด/ขนาดที่ประกาศก่อนรับข้อมูลจริง
+    - ได้ upload_id ไว้ PUT ชิ้นข้อมูล และ GET เพื่อถาม offset ตอนกลับมาอัปต่อ
+    """
+    atype = (atype or "").lower()
+    if atype not in ASSET_FOLDERS:
+        return jsonify(error="unsupported asset type"), 400
+    payload = request.get_json(silent=True) or {}
+    filename = str(payload.get("filename") or "")
+    try:
+        size = int(payload.get("size"))
+    except (TypeError, ValueError):
+        return jsonify(error="size is required"), 400
+    ext = _asset_ext(filename, payload.get("mimetype"))
+    if not filename or ext not in ASSET_EXTS[atype]:
+        return jsonify(error="invalid extension"), 400
+    if size <= 0:
+        return jsonify(error="empty file"), 400
+    if size > _asset_limit(atype):
+        return _too_large(atype)
+
+    _purge_upload_sessions()
+    upload_id = secrets.token_urlsafe(16)
+    stem = secure_filename(os.path.splitext(filename)[0]) or "file"
+    now = time.time()
+    _upload_part_path(atype, upload_id).touch()
+    with get_db() as db:
+        db.execute(
+            "INSERT INTO upload_sessions (id, atype, stem, ext, size, received, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, 0, ?, ?)",
+            (upload_id, atype, stem, ext, size, now, now),
+        )
+    return jsonify(_upload_state(_upload_session(upload_id))), 201
+
+@app.get("/upload_asset/sessions/<upload_id>")
+def upload_session_status(upload_id):
+    sess = _upload_session(upload_id)
+    if sess is None:
+        return jsonify(success=False, error="upload not found"), 404
+    return jsonify(_upload_state(sess))
+
+@app.delete("/upload_asset/sessions/<upload_id>")
+def upload_session_cancel(upload_id):
+    sess = _upload_session(upload_id)
+    if sess is None:
+        return jsonify(success=True)
+    with get_db() as db:
+        db.execute("DELETE FROM upload_sessions WHERE id = ?", (upload_id,))
+    _upload_part_path(sess["atype"], upload_id).unlink(missing_ok=True)
+    return jsonify(success=True)
 
-    # size check
-    pos = f.stream.tell()
-    f.stream.seek(0, os.SEEK_END)
-    size = f.stream.tell()
-    f.stream.seek(pos)
-    if size > ASSET_MAX_MB[atype] * 1024 * 1024:
-        return jsonify(error=f"file too large (>{ASSET_MAX_MB[atype]} MB)"), 400
+@app.put("/upload_asset/sessions/<upload_id>")
+def upload_session_chunk(upload_id):
+    """
+    ส่งชิ้นข้อมูลต่อท้าย: body = ไบต์ดิบ, ?offset= (หรือ X-Upload-Offset) ต้องตรงกับที่รับแล้ว
+    - offset ไม่ตรง -> 409 พร้อม offset ปัจจุบัน (client เริ่มใหม่จากตรงนั้น)
+    - ชิ้นล้นขนาดที่ประกาศ -> 413 (.part ไม่ถูกแตะ)
+    - ครบขนาดแล้ว -> ย้ายเข้าที่ + ลิงก์สั้น (ผลลัพธ์เหมือน upload_asset)
+    """
+    sess = _upload_session(upload_id)
+    if sess is None:
+        return jsonify(success=False, error="upload not found"), 404
+    offset = request.args.get("offset", type=int)
+    if offset is None:  # ค่า default ของ args.get ไม่ผ่าน type= จึงแปลง header แยก
+        offset = request.headers.get("X-Upload-Offset", type=int)
+    if offset != sess["received"]:
+        return jsonify(success=False, error="offset mismatch", offset=sess["received"]), 409
+
+    remaining = sess["size"] - offset
+    if request.content_length is not None and request.content_length > remaining:
+        return jsonify(success=False, error="chunk exceeds declared size", offset=offset), 413
+
+    # รับชิ้นลงไฟล์ชั่วคราวของคำขอนี้ก่อน — ยังไม่แตะ .part จนกว่าจะจอง offset ได้
+    part = _upload_part_path(sess["atype"], upload_id)
+    chunk = part.with_name(f"{part.name}.{secrets.token_hex(6)}.chunk")
+    try:
+        try:
+            with open(chunk, "wb") as out:
+                n = _copy_stream(request.stream, out, remaining)
+        except UploadTooLarge:
+            return jsonify(success=False, error="chunk exceeds declared size", offset=offset), 413
 
-    final_name = f"{base_stem}_{int(time.time())}.{orig_ext}"
-    save_path = os.path.join(ASSET_FOLDERS[atype], final_name)
-    f.save(save_path)
+        received = offset + n
+        with get_db() as db:
+            # write lock ของ SQLite คุมทั้งการเช็ค offset + ต่อไฟล์ + อัปเดต — คำขอพร้อมกัน (ข้าม worker ได้)
+            # ที่ offset เดียวกันมีแค่อันเดียวได้เขียน .part อีกอันได้ 409 โดยไม่ทับข้อมูล
+            db.execute("BEGIN IMMEDIATE")
+            cur = db.execute("SELECT received FROM upload_sessions WHERE id = ?", (upload_id,)).fetchone()
+            if cur is None:
+                return jsonify(success=False, error="upload not found"), 404
+            if cur["received"] != offset:
+                return jsonify(success=False, error="offset mismatch", offset=cur["received"]), 409
+            with open(part, "r+b") as out, open(chunk, "rb") as src:
+                out.seek(offset)
+                shutil.copyfileobj(src, out, UPLOAD_CHUNK_SIZE)
+                out.truncate(received)
+            if received < sess["size"]:
+                db.execute("UPDATE upload_sessions SET received = ?, updated_at = ? WHERE id = ?",
+                           (received, time.time(), upload_id))
+            else:  # ชิ้นสุดท้าย — ปิด session ใน transaction เดียวกัน คำขออื่นจะไม่ finalize ซ้ำ
+                db.execute("DELETE FROM upload_sessions WHERE id = ?", (upload_id,))
+    finally:
+        chunk.unlink(missing_ok=True)
+    if received < sess["size"]:
+        return jsonify(_upload_state(_upload_session(upload_id)))
 
-    long_url = url_for("static", filename=f"files/{atype}/{final_name}", _external=True)
-    short_url = get_or_create_short(long_url)
-    track_upload()
-    return jsonify(success=True, url=long_url, short_url=short_url,
-                   filename=final_name, size=size)
+    # ครบแล้ว — hash ทั้งไฟล์ตอนปิดงาน (สถานะ hasher ข้ามคำขอเก็บลง DB ไม่ได้)
+    try:
+        return jsonify(_finalize_asset(sess["atype"], sess["stem"], sess["ext"], part,
+                                       received, _sha256_file(part)))
+    finally:
+        part.unlink(missing_ok=True)
 
 @app.route("/upload_logo", methods=["POST"])
 def upload_logo():
@@ -646,6 +1985,10 @@ def upload_logo():
         return "Corrupted or unsupported image file", 400
 
     file.save(save_path)
+    invalidate_logo_cache(save_path)  # กรณีอัปโหลดทับชื่อเดิม
+    warm_logo_cache(save_path)
+    catalog_upsert("logo", fname, sha256=_sha256_file(save_path))
+    queue_thumbnail("logo", fname)
     return "OK"
 
 @app.route("/preview_qr", methods=["POST"])
@@ -667,59 +2010,1251 @@ def preview_qr():
     logo_path = os.path.join(UPLOAD_FOLDER, logo_name) if logo_name else None
     if logo_path and not os.path.exists(logo_path):
         logo_path = None
-
-    img = generate_qr_code_png(
-        data, logo_path, fill_color, back_color, transparent,
+    bad = _invalid_color(fill_color, back_color, fill_color2 or fill_color)
+    if bad is not None:
+        return f"Invalid color: {bad}", 400
+
+    # WebP เมื่อ client ขอชัดเจนใน Accept (เช่น "image/webp,image/png;q=0.9"; */* ได้ PNG)
+    # และภาพไม่ใช่สองสีล้วน — แบบนั้น PNG 1-bit palette เล็กกว่า WebP อยู่แล้ว
+    fmt, preset, encode = "png", PREVIEW_PNG_PRESET, _encode_png
+    two_color = fill_style not in ("linear", "radial") and not logo_path
+    if (WEBP_ENABLED and not two_color
+            and request.accept_mimetypes.best_match(["image/png", "image/webp"]) == "image/webp"):
+        fmt, preset, encode = "webp", PREVIEW_WEBP_PRESET, _encode_webp
+
+    key = qr_render_key(
+        f"{fmt}/{preset}", data, logo_path, fill_color, back_color, transparent,
         size_px=size_px, ecc=ecc, fill_style=fill_style, fill_color2=fill_color2
     )
-    buf = BytesIO(); img.save(buf, format="PNG"); buf.seek(0)
-    return send_file(buf, mimetype="image/png")
+    resp = _not_modified(key)
+    if resp is None:
+        try:
+            body = cached_render(key, lambda: encode(generate_qr_code_png(
+                data, logo_path, fill_color, back_color, transparent,
+                size_px=size_px, ecc=ecc, fill_style=fill_style, fill_color2=fill_color2
+            ), preset))
+        except (DataOverflowError, ValueError):  # qrcode บางรุ่นโยน ValueError (version > 40)
+            return "Data too long for a QR code", 400
+        resp = send_file(BytesIO(body), mimetype=f"image/{fmt}", etag=key)
+    resp.vary.add("Accept")
+    return resp
+
+MATRIX_MAX_AGE = int(os.getenv("MATRIX_MAX_AGE", "86400"))
+
+@app.route("/api/qr/matrix", methods=["GET", "POST"])
+def api_qr_matrix():
+    """
+    matrix ของ QR สำหรับวาดฝั่ง client (สี/ไล่สี/ขนาด/โลโก้ เปลี่ยนได้โดยไม่ต้องถามเซิร์ฟเวอร์)
+    - รับ data, ecc จาก query (GET — ให้ browser cache ได้) หรือ form (POST สำหรับข้อมูลยาว)
+    - bits = np.packbits ของ count*count โมดูลเรียงทีละแถว (MSB ก่อน, 1 = โมดูลเข้ม) แบบ base64
+      ไม่รวม quiet zone (border โมดูลรอบนอก)
+    - ETag ขึ้นกับ (ecc, data) เท่านั้น
+    """
+    data = request.values.get("data", "")
+    ecc = (request.values.get("ecc") or "H").upper()
+    if ecc not in ECC_MAP:
+        ecc = "H"
+    etag = hashlib.sha256(f"matrix|{ecc}|{data}".encode("utf-8")).hexdigest()[:32]
+    resp = _not_modified(etag)
+    if resp is None:
+        try:
+            m = qr_matrix(data, ecc)
+        except (DataOverflowError, ValueError):  # qrcode บางรุ่นโยน ValueError (version > 40)
+            return jsonify(success=False, error="data too long for a QR code"), 400
+        resp = jsonify(
+            success=True, version=m.version, count=m.count, border=QR_BORDER, ecc=ecc,
+            bits=base64.b64encode(m.packed.tobytes()).decode("ascii"),
+        )
+        resp.set_etag(etag)
+    if request.method == "GET":
+        resp.cache_control.public = True
+        resp.cache_control.max_age = MATRIX_MAX_AGE
+    return resp
 
 # ------------------------------------------------------------------------------
-# Short-links (UNIFIED)
+# Batch generation (CSV / JSON lines -> ZIP แบบ streaming)
+# ------------------------------------------------------------------------------
+
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "0")) or (os.cpu_count() or 1)
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "5000"))
+BATCH_MAX_SIZE_PX = int(os.getenv("BATCH_MAX_SIZE_PX", "4096"))
+BATCH_STYLE_KEYS = (
+    "fill_color", "back_color", "transparent", "size_px", "ecc",
+    "fill_style", "fill_color2", "format", "logo",
+)
+_TRUTHY = {"1", "true", "yes", "on"}
+
+# โปรเซสลูก (batch pool / พรีวิว PDF) ห้ามใช้ fork: โปรเซสนี้มี thread เบื้องหลัง (AnalyticsWriter,
+# ClickCounter, AssetReconciler) และ lock ของ DB pool — fork ตอน lock ถูกถืออยู่ = ลูกค้างตลอดไป
+MP_START_METHOD = os.getenv("MP_START_METHOD") or (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+MP_CONTEXT = multiprocessing.get_context(MP_START_METHOD)
+if MP_START_METHOD == "forkserver" and __name__ != "__main__":
+    MP_CONTEXT.set_forkserver_preload([__name__])  # import แอปครั้งเดียวในเซิร์ฟเวอร์ แล้ว fork ลูกจากตรงนั้น
+
+_BATCH_POOL: ProcessPoolExecutor | None = None
+_BATCH_POOL_LOCK = Lock()
+_BATCH_PROGRESS: OrderedDict[str, dict] = OrderedDict()  # batch_id -> progress (ภายในโปรเซส)
+_BATCH_PROGRESS_KEEP = 100
+
+def _batch_pool() -> ProcessPoolExecutor:
+    global _BATCH_POOL
+    with _BATCH_POOL_LOCK:
+        if _BATCH_POOL is None:
+            _BATCH_POOL = ProcessPoolExecutor(max_workers=BATCH_WORKERS, mp_context=MP_CONTEXT)
+        return _BATCH_POOL
+
+def _parse_batch_rows(text: str, kind: str) -> list[dict]:
+    """แปลง body เป็นลิสต์ของ dict — kind: 'csv' หรือ 'jsonl' (บรรทัดที่พังจะได้ {'_error': ...})"""
+    if kind == "csv":
+        return [dict(r) for r in csv.DictReader(io.StringIO(text))]
+    rows = []
+    for n, line in enumerate(text.splitlines(), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            obj = json.loads(line)
+            rows.append(obj if isinstance(obj, dict) else {"_error": f"line {n}: not an object"})
+        except ValueError as e:
+            rows.append({"_error": f"line {n}: {e}"})
+    return rows
+
+def _normalize_batch_item(row: dict, defaults: dict, index: int, used_names: set[str]) -> dict:
+    """รวมค่า default ของ batch กับ override รายแถว + ตรวจค่า; ถ้าไม่ผ่านจะมีคีย์ 'error'"""
+    merged = {**defaults, **{k: v for k, v in row.items() if v not in (None, "")}}
+    fmt = str(merged.get("format") or "png").lower()
+    item = {
+        "index": index,
+        "data": str(merged.get("data") or ""),
+        "format": fmt,
+        "fill_color": str(merged.get("fill_color") or "#000"),
+        "back_color": str(merged.get("back_color") or "#fff"),
+        "transparent": str(merged.get("transparent") or "").lower() in _TRUTHY,
+        "ecc": str(merged.get("ecc") or "H").upper(),
+        "fill_style": str(merged.get("fill_style") or "solid").lower(),
+        "fill_color2": str(merged.get("fill_color2") or "#000000"),
+        "logo_path": None,
+    }
+
+    stem = secure_filename(os.path.splitext(str(merged.get("filename") or ""))[0]) or f"qr_{index + 1:05d}"
+    name = f"{stem}.{fmt}"
+    n = 1
+    while name in used_names:
+        n += 1
+        name = f"{stem}_{n}.{fmt}"
+    used_names.add(name)
+    item["filename"] = name
+
+    bad_color = _invalid_color(item["fill_color"], item["back_color"], item["fill_color2"])
+    if row.get("_error"):
+        item["error"] = row["_error"]
+    elif not item["data"]:
+        item["error"] = "missing data"
+    elif fmt not in ("png", "svg"):
+        item["error"] = "format must be png or svg"
+    elif bad_color is not None:
+        item["error"] = f"invalid color: {bad_color}"
+    else:
+        try:
+            item["size_px"] = int(merged.get("size_px") or 1024)
+            if not 16 <= item["size_px"] <= BATCH_MAX_SIZE_PX:
+                raise ValueError
+        except (TypeError, ValueError):
+            item["error"] = f"size_px must be 16..{BATCH_MAX_SIZE_PX}"
+        logo_name = secure_filename(str(merged.get("logo") or ""))
+        if logo_name and "error" not in item:
+            logo_path = os.path.join(UPLOAD_FOLDER, logo_name)
+            if not os.path.isfile(logo_path):
+                item["error"] = f"logo not found: {logo_name}"
+            else:
+                item["logo_path"] = logo_path
+    return item
+
+def render_batch_item(item: dict) -> bytes:
+    """เรนเดอร์ 1 รายการของ batch (รันใน process pool)"""
+    render = generate_qr_code_svg if item["format"] == "svg" else generate_qr_code_png
+    out = render(
+        item["data"], item["logo_path"], item["fill_color"], item["back_color"], item["transparent"],
+        size_px=item["size_px"], ecc=item["ecc"],
+        fill_style=item["fill_style"], fill_color2=item["fill_color2"],
+    )
+    return out if isinstance(out, bytes) else _encode_png(out)
+
+class _ZipSink(io.RawIOBase):
+    """ปลายทางแบบเขียนอย่างเดียว (seek ไม่ได้) ให้ zipfile เขียนลง แล้วดึงออกเป็นชิ้นๆ"""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _stream_batch_zip(progress: dict, items: list[dict]) -> Iterator[bytes]:
+    """
+    ส่ง ZIP ออกทีละชิ้นตามลำดับที่งานเสร็จ (ไม่สร้าง archive ทั้งก้อนในหน่วยความจำ)
+    - ส่งงานเข้า pool ทีละหน้าต่าง (BATCH_WORKERS * 4) เพื่อคุมหน่วยความจำ
+    - ปิดท้ายด้วย manifest.json: สถานะรายรายการ + error
+    - progress: dict จาก _start_batch_progress (ส่งมาตรงๆ — entry ใน _BATCH_PROGRESS อาจถูกไล่ออกก่อน stream เริ่ม)
+    """
+    sink = _ZipSink()
+    manifest: list[dict] = []
+    pending: dict = {}
+    queue = iter(items)
+
+    def record(item: dict, error: str | None) -> None:
+        manifest.append({"index": item["index"], "filename": item["filename"],
+                         "ok": error is None, **({"error": error} if error else {})})
+        progress["done"] += 1
+        if error:
+            progress["failed"] += 1
+
+    try:
+        with zipfile.ZipFile(sink, "w") as zf:
+            while True:
+                while len(pending) < BATCH_WORKERS * 4:
+                    item = next(queue, None)
+                    if item is None:
+                        break
+                    if "error" in item:
+                        record(item, item["error"])
+                        continue
+                    pending[_batch_pool().submit(render_batch_item, item)] = item
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    item = pending.pop(fut)
+                    try:
+                        body = fut.result()
+                    except Exception as e:
+                        record(item, str(e) or e.__class__.__name__)
+                        continue
+                    # PNG บีบอัดมาแล้ว เก็บแบบ STORED; SVG เป็นข้อความ ใช้ DEFLATED
+                    ctype = zipfile.ZIP_DEFLATED if item["format"] == "svg" else zipfile.ZIP_STORED
+                    zf.writestr(item["filename"], body, compress_type=ctype)
+                    record(item, None)
+
+                chunk = sink.drain()
+                if chunk:
+                    yield chunk
+
+            manifest.sort(key=lambda m: m["index"])
+            zf.writestr("manifest.json", json.dumps(
+                {"batch_id": progress["id"], "total": len(items), "failed": progress["failed"], "items": manifest},
+                ensure_ascii=False, indent=1,
+            ), compress_type=zipfile.ZIP_DEFLATED)
+        yield sink.drain()
+        progress["status"] = "done"
+    finally:
+        for fut in pending:
+            fut.cancel()
+        if progress["status"] != "done":
+            progress["status"] = "aborted"
+        progress["finished"] = time.time()
+
+def _batch_items_from_request() -> list[dict]:
+    """อ่าน CSV/JSON lines จาก request ปัจจุบันเป็นรายการที่ normalize แล้ว (ValueError ถ้าใช้ไม่ได้)"""
+    upload = request.files.get("file")
+    raw = upload.read() if upload else request.get_data()
+    text = raw.decode("utf-8-sig", errors="replace")
+
+    kind = (request.args.get("input") or "").lower()
+    if kind not in ("csv", "jsonl"):
+        ctype = (upload.mimetype if upload else request.mimetype) or ""
+        if "json" in ctype:
+            kind = "jsonl"
+        elif "csv" in ctype:
+            kind = "csv"
+        else:
+            kind = "jsonl" if text.lstrip().startswith("{") else "csv"
+
+    rows = _parse_batch_rows(text, kind)
+    if not rows:
+        raise ValueError("no items")
+    if len(rows) > BATCH_MAX_ITEMS:
+        raise ValueError(f"too many items (>{BATCH_MAX_ITEMS})")
+
+    defaults = {k: request.args[k] for k in BATCH_STYLE_KEYS if k in request.args}
+    used_names: set[str] = set()
+    return [_normalize_batch_item(r, defaults, i, used_names) for i, r in enumerate(rows)]
+
+def _start_batch_progress(batch_id: str, total: int) -> dict:
+    progress = _BATCH_PROGRESS[batch_id] = {
+        "id": batch_id, "total": total, "done": 0, "failed": 0,
+        "status": "running", "started": time.time(), "finished": None,
+    }
+    while len(_BATCH_PROGRESS) > _BATCH_PROGRESS_KEEP:
+        _BATCH_PROGRESS.popitem(last=False)
+    return progress
+
+@app.post("/api/qr/batch")
+@admin_api_required
+def api_qr_batch():
+    """
+    สร้าง QR หลายรายการ แล้วตอบกลับเป็น ZIP แบบ streaming
+    - body: CSV (header: data,filename,...) หรือ JSON lines; หรือแนบไฟล์ field 'file'
+    - รูปแบบ: ?input=csv|jsonl (ไม่ระบุ = เดาจาก Content-Type/เนื้อหา)
+    - query string อื่นๆ (fill_color, size_px, ...) ใช้เป็นค่า default ของทุกแถว
+    - ติดตามความคืบหน้า: GET /api/qr/batch/<batch_id> (batch_id อยู่ใน header X-Batch-Id)
+    """
+    try:
+        items = _batch_items_from_request()
+    except ValueError as e:
+        return jsonify(success=False, error=str(e)), 400
+
+    batch_id = secrets.token_hex(8)
+    progress = _start_batch_progress(batch_id, len(items))
+    resp = app.response_class(_stream_batch_zip(progress, items), mimetype="application/zip")
+    resp.headers["Content-Disposition"] = f'attachment; filename="qr_batch_{batch_id}.zip"'
+    resp.headers["X-Batch-Id"] = batch_id
+    resp.headers["X-Batch-Total"] = str(len(items))
+    return resp
+
+@app.get("/api/qr/batch/<batch_id>")
+@admin_api_required
+def api_qr_batch_progress(batch_id: str):
+    """ความคืบหน้าของ batch (เฉพาะ worker process ที่กำลังส่ง ZIP อยู่)"""
+    progress = _BATCH_PROGRESS.get(batch_id)
+    if progress is None:
+        return jsonify(success=False, error="not found"), 404
+    return jsonify(success=True, batch_id=batch_id, **progress)
+
+# ------------------------------------------------------------------------------
+# Render jobs (async) — ตาราง jobs ใน data/app.db + worker pool + long-poll
 # ------------------------------------------------------------------------------
 
-SHORT_DB_PATH = os.path.join("static", "shortlinks.json")
-_SHORT_DB_LOCK = Lock()
-os.makedirs(os.path.dirname(SHORT_DB_PATH), exist_ok=True)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "32"))      # queued+running ทั้งระบบ
+JOB_TIMEOUT_S = int(os.getenv("JOB_TIMEOUT_S", "300"))
+JOB_TTL_HOURS = int(os.getenv("JOB_TTL_HOURS", "24"))      # เก็บผลลัพธ์กี่ชั่วโมง
+JOB_LONGPOLL_MAX_S = 30
+JOB_HEARTBEAT_S = float(os.getenv("JOB_HEARTBEAT_S", "5"))  # ต่อ lease ของงานทุกกี่วินาที
+JOB_LEASE_S = float(os.getenv("JOB_LEASE_S", "30"))         # ไม่ต่อ lease นานกว่านี้ = เจ้าของตายแล้ว
+JOB_ARTIFACT_DIR = DB_PATH.parent / "jobs"
+JOB_ARTIFACT_DIR.mkdir(parents=True, exist_ok=True)
+_JOB_TERMINAL = ("done", "failed")
+
+_JOB_EXECUTOR: ThreadPoolExecutor | None = None
+_JOB_EXECUTOR_LOCK = Lock()
+
+def _job_executor() -> ThreadPoolExecutor:
+    global _JOB_EXECUTOR
+    with _JOB_EXECUTOR_LOCK:
+        if _JOB_EXECUTOR is None:
+            _JOB_EXECUTOR = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="qr-job")
+        return _JOB_EXECUTOR
+
+def _job_update(job_id: str, **fields) -> None:
+    cols = ", ".join(f"{k} = ?" for k in fields)
+    with get_db() as db:
+        db.execute(f"UPDATE jobs SET {cols} WHERE id = ?", (*fields.values(), job_id))
 
-def _load_short_db() -> dict:
-    return _read_json(SHORT_DB_PATH, {})
+def _job_get(job_id: str):
+    with get_db() as db:
+        return db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
 
-def _save_short_db(db: dict) -> None:
-    _write_json(SHORT_DB_PATH, db)
+_JOB_BOOT = {"pid": None, "id": None}
 
-def _find_code_by_url(db: dict, url: str):
-    for c, item in db.items():
-        if (item.get("url") if isinstance(item, dict) else item) == url:
-            return c
-    return None
+def _job_boot_id() -> str:
+    """id สุ่มของโปรเซสนี้ — สร้างใหม่หลัง fork (gunicorn preload) ต่างจาก pid ที่ container ใช้ซ้ำได้"""
+    if _JOB_BOOT["pid"] != os.getpid():
+        _JOB_BOOT.update(pid=os.getpid(), id=secrets.token_hex(8))
+    return _JOB_BOOT["id"]
 
-def _gen_code(n=6) -> str:
+def _job_heartbeat() -> None:
+    """ต่อ lease ให้งานที่ยังไม่จบทั้งหมดของโปรเซสนี้ (งานที่รอคิวใน executor ด้วย)"""
+    with get_db() as db:
+        db.execute(
+            "UPDATE jobs SET heartbeat_at = ? WHERE owner_boot = ? AND status IN ('queued', 'running')",
+            (time.time(), _job_boot_id()),
+        )
+
+def _recover_jobs() -> None:
+    """
+    งานค้าง -> failed
+    - lease หมดอายุ (เจ้าของตาย/ถูก restart — ไม่ต่อ heartbeat เกิน JOB_LEASE_S)
+    - running นานเกิน JOB_TIMEOUT_S (เผื่อ lease อีกหนึ่งช่วง)
+    """
+    now = time.time()
+    with get_db() as db:
+        db.execute(
+            """UPDATE jobs SET status = 'failed', error = 'interrupted', finished_at = ?
+               WHERE status IN ('queued', 'running') AND COALESCE(heartbeat_at, created_at) < ?""",
+            (now, now - JOB_LEASE_S),
+        )
+        db.execute(
+            """UPDATE jobs SET status = 'failed', error = 'timed out', finished_at = ?
+               WHERE status = 'running' AND started_at < ?""",
+            (now, now - JOB_TIMEOUT_S - JOB_LEASE_S),
+        )
+
+def _purge_expired_jobs() -> None:
+    cutoff = time.time() - JOB_TTL_HOURS * 3600
+    with get_db() as db:
+        rows = db.execute(
+            "SELECT id, artifact FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (cutoff,)
+        ).fetchall()
+        for r in rows:
+            if r["artifact"]:
+                Path(r["artifact"]).unlink(missing_ok=True)
+        db.executemany("DELETE FROM jobs WHERE id = ?", [(r["id"],) for r in rows])
+
+def _run_job(job_id: str, kind: str, payload) -> None:
+    """รันใน thread ของ _job_executor — งานหนักจริงไปทำใน process pool ของ batch"""
+    started = time.time()
+    _job_update(job_id, status="running", started_at=started, heartbeat_at=started)
+    ext = "zip" if kind == "batch" else payload["format"]
+    path = JOB_ARTIFACT_DIR / f"{job_id}.{ext}"
+    try:
+        if kind == "render":
+            fut = _batch_pool().submit(render_batch_item, payload)
+            while True:
+                try:
+                    body = fut.result(timeout=JOB_HEARTBEAT_S)
+                    break
+                except TimeoutError:
+                    if time.time() - started > JOB_TIMEOUT_S:
+                        fut.cancel()
+                        raise TimeoutError(f"job exceeded {JOB_TIMEOUT_S}s")
+                    _job_heartbeat()
+            path.write_bytes(body)
+            _job_update(job_id, done=1)
+        else:
+            progress = _start_batch_progress(job_id, len(payload))
+            last_sync = started
+            with open(path, "wb") as f, closing(_stream_batch_zip(progress, payload)) as chunks:
+                for chunk in chunks:
+                    f.write(chunk)
+                    now = time.time()
+                    if now - started > JOB_TIMEOUT_S:
+                        raise TimeoutError(f"job exceeded {JOB_TIMEOUT_S}s")
+                    if now - last_sync >= 1.0:  # อัปเดตความคืบหน้าลง DB ไม่เกินวินาทีละครั้ง
+                        _job_update(job_id, done=progress["done"])
+                        _job_heartbeat()
+                        last_sync = now
+            _job_update(job_id, done=progress["done"])
+        _job_update(job_id, status="done", artifact=str(path), finished_at=time.time())
+    except Exception as e:
+        path.unlink(missing_ok=True)
+        _job_update(job_id, status="failed", error=str(e) or e.__class__.__name__,
+                    finished_at=time.time())
+
+def submit_job(kind: str, payload, filename: str, mimetype: str, total: int = 1) -> str | None:
+    """ลงทะเบียนงานแล้วส่งเข้า worker pool; คืน None ถ้าคิวเต็ม (backpressure)"""
+    _purge_expired_jobs()
+    _recover_jobs()  # งานค้างของโปรเซสที่ตายแล้วไม่ควรนับเป็นคิวเต็มไปตลอด
+    job_id = secrets.token_urlsafe(12)
+    with get_db() as db:
+        db.execute("BEGIN IMMEDIATE")  # นับคิว + insert แบบอะตอมมิกข้าม worker
+        depth = db.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')"
+        ).fetchone()[0]
+        if depth >= JOB_QUEUE_MAX:
+            return None
+        db.execute(
+            """INSERT INTO jobs (id, kind, status, owner_pid, owner_boot, heartbeat_at,
+                                 mimetype, filename, total, done, created_at)
+               VALUES (?, ?, 'queued', ?, ?, ?, ?, ?, ?, 0, ?)""",
+            (job_id, kind, os.getpid(), _job_boot_id(), time.time(), mimetype, filename, total, time.time()),
+        )
+    _job_executor().submit(_run_job, job_id, kind, payload)
+    return job_id
+
+def _job_json(row) -> dict:
+    def ms(a, b):
+        return round((b - a) * 1000, 1) if a and b else None
+    out = {
+        "job_id": row["id"],
+        "kind": row["kind"],
+        "status": row["status"],
+        "error": row["error"],
+        "total": row["total"],
+        "done": row["done"],
+        "timing": {
+            "queue_ms": ms(row["created_at"], row["started_at"]),
+            "run_ms": ms(row["started_at"], row["finished_at"]),
+            "total_ms": ms(row["created_at"], row["finished_at"]),
+        },
+        "status_url": url_for("api_job_status", job_id=row["id"]),
+    }
+    if row["status"] == "done":
+        out["artifact_url"] = url_for("api_job_artifact", job_id=row["id"])
+    return out
+
+def _queue_full():
+    resp = jsonify(success=False, error="job queue is full, retry later")
+    resp.status_code = 429
+    resp.headers["Retry-After"] = "5"
+    return resp
+
+def _job_accepted(job_id: str):
+    return jsonify(success=True, **_job_json(_job_get(job_id))), 202
+
+@app.post("/api/jobs/render")
+@admin_api_required  # ใช้คิว/process pool ร่วมกับ batch — เปิดสาธารณะจะโดนคนเดียวจองคิวจนเต็มได้
+def api_job_render():
+    """เรนเดอร์ QR 1 ภาพแบบ async (พารามิเตอร์เดียวกับฟอร์มดาวน์โหลด, รับ form หรือ JSON)"""
+    params = request.get_json(silent=True) if request.is_json else request.form.to_dict()
+    if not isinstance(params, dict):
+        return jsonify(success=False, error="body must be a JSON object"), 400
+    params.setdefault("filename", "qr_code")
+    params.setdefault("format", params.get("out_format") or "png")
+    item = _normalize_batch_item(params, {}, 0, set())
+    if "error" in item:
+        return jsonify(success=False, error=item["error"]), 400
+    mimetype = "image/svg+xml" if item["format"] == "svg" else "image/png"
+    job_id = submit_job("render", item, item["filename"], mimetype)
+    return _job_accepted(job_id) if job_id else _queue_full()
+
+@app.post("/api/jobs/batch")
+@admin_api_required
+def api_job_batch():
+    """เหมือน /api/qr/batch แต่ทำเบื้องหลัง แล้วดึง ZIP ทีหลังจาก artifact_url"""
+    try:
+        items = _batch_items_from_request()
+    except ValueError as e:
+        return jsonify(success=False, error=str(e)), 400
+    job_id = submit_job("batch", items, "qr_batch.zip", "application/zip", total=len(items))
+    return _job_accepted(job_id) if job_id else _queue_full()
+
+@app.get("/api/jobs/<job_id>")
+def api_job_status(job_id: str):
+    """สถานะงาน — ?wait=N (วินาที, สูงสุด 30) รอจนงานจบแบบ long-poll"""
+    wait_s = min(max(request.args.get("wait", 0, type=float), 0), JOB_LONGPOLL_MAX_S)
+    deadline = time.monotonic() + wait_s
+    row = _job_get(job_id)
+    while row is not None and row["status"] not in _JOB_TERMINAL and time.monotonic() < deadline:
+        time.sleep(0.2)
+        row = _job_get(job_id)
+    if row is None:
+        return jsonify(success=False, error="not found"), 404
+    return jsonify(success=True, **_job_json(row))
+
+@app.get("/api/jobs/<job_id>/artifact")
+def api_job_artifact(job_id: str):
+    row = _job_get(job_id)
+    if row is None:
+        return jsonify(success=False, error="not found"), 404
+    if row["status"] != "done" or not row["artifact"] or not os.path.isfile(row["artifact"]):
+        return jsonify(success=False, error=f"not ready ({row['status']})"), 409
+    if row["kind"] == "render":
+        track_download()
+    return send_file(row["artifact"], mimetype=row["mimetype"],
+                     as_attachment=True, download_name=row["filename"])
+
+@app.get("/admin/jobs/stats")
+@admin_api_required
+def admin_job_stats():
+    """จำนวนงานตามสถานะ + เวลาเข้าคิว/รัน (p50/p95/max) ของงานล่าสุด"""
+    with get_db() as db:
+        by_status = {r["status"]: r["n"] for r in db.execute(
+            "SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"
+        )}
+        recent = db.execute(
+            """SELECT kind, created_at, started_at, finished_at FROM jobs
+               WHERE status = 'done' ORDER BY finished_at DESC LIMIT 500"""
+        ).fetchall()
+
+    def summary(values: list[float]) -> dict:
+        if not values:
+            return {"count": 0}
+        values = sorted(values)
+        pick = lambda q: round(values[min(len(values) - 1, int(q * len(values)))], 1)
+        return {"count": len(values), "p50": pick(0.5), "p95": pick(0.95), "max": round(values[-1], 1)}
+
+    timing = {}
+    for kind in sorted({r["kind"] for r in recent}):
+        rows = [r for r in recent if r["kind"] == kind]
+        timing[kind] = {
+            "queue_ms": summary([(r["started_at"] - r["created_at"]) * 1000 for r in rows]),
+            "run_ms": summary([(r["finished_at"] - r["started_at"]) * 1000 for r in rows]),
+        }
+    return jsonify(success=True, by_status=by_status, queue_max=JOB_QUEUE_MAX,
+                   workers=JOB_WORKERS, timing=timing)
+
+_recover_jobs()
+
+# ------------------------------------------------------------------------------
+# Short-links (UNIFIED)
+# ------------------------------------------------------------------------------
+
+SHORT_JSON_PATH = os.path.join("static", "shortlinks.json")  # ระบบเดิม (ย้ายเข้า DB แล้ว)
+SHORT_CODE_LEN = 6
+
+def _gen_code(n=SHORT_CODE_LEN) -> str:
     alphabet = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
     return "".join(secrets.choice(alphabet) for _ in range(n))
 
+def _migrate_short_json() -> None:
+    """ย้ายลิงก์จาก static/shortlinks.json เข้าตาราง shortlinks ครั้งเดียว (ไฟล์เดิมเก็บไว้เป็น backup)"""
+    if not os.path.exists(SHORT_JSON_PATH):
+        return
+    with get_db() as db:
+        db.execute("BEGIN IMMEDIATE")
+        if db.execute("SELECT 1 FROM app_meta WHERE key = 'shortlinks_json_migrated'").fetchone():
+            return
+        rows = []
+        for code, item in _read_json(SHORT_JSON_PATH, {}).items():
+            url = item.get("url") if isinstance(item, dict) else item
+            ts = item.get("ts") if isinstance(item, dict) else None
+            if code and url:
+                rows.append((code, url, int(ts or time.time())))
+        db.executemany("INSERT OR IGNORE INTO shortlinks (code, url, ts) VALUES (?, ?, ?)", rows)
+        db.execute(
+            "INSERT INTO app_meta (key, value) VALUES ('shortlinks_json_migrated', ?)", (str(len(rows)),)
+        )
+
+def get_or_create_code(url: str) -> tuple[str, bool]:
+    """
+    คืน (code, created) ของ url — สร้างใหม่ถ้ายังไม่มี
+    - unique index บน url ทำให้หลาย worker สร้างพร้อมกันก็ได้ code เดียว
+    - code ชน (PRIMARY KEY) จะสุ่มใหม่
+    """
+    with get_db() as db:
+        row = db.execute("SELECT code FROM shortlinks WHERE url = ?", (url,)).fetchone()
+        if row:
+            return row["code"], False
+        while True:
+            code = _gen_code()
+            try:
+                cur = db.execute(
+                    "INSERT INTO shortlinks (code, url, ts) VALUES (?, ?, ?) ON CONFLICT(url) DO NOTHING",
+                    (code, url, int(time.time())),
+                )
+            except sqlite3.IntegrityError:
+                continue  # code ซ้ำ
+            if cur.rowcount:
+                return code, True
+            # worker อื่นเพิ่งสร้าง url นี้
+            return db.execute("SELECT code FROM shortlinks WHERE url = ?", (url,)).fetchone()["code"], False
+
 def get_or_create_short(url: str) -> str:
     """คืนลิงก์สั้นเต็ม (เช่น http://host/s/Ab12C) สร้างใหม่ถ้ายังไม่มี"""
-    with _SHORT_DB_LOCK:
-        db = _load_short_db()
-        code = _find_code_by_url(db, url)
-        if not code:
-            code = _gen_code(6)
-            while code in db:
-                code = _gen_code(6)
-            db[code] = {"url": url, "ts": int(time.time())}
-            _save_short_db(db)
+    code, _ = get_or_create_code(url)
     return url_for("short_redirect", code=code, _external=True)
 
+SHORT_CACHE_MAX_MB = int(os.getenv("SHORT_CACHE_MAX_MB", "32"))
+SHORT_NEGATIVE_TTL = int(os.getenv("SHORT_NEGATIVE_TTL", "30"))          # วินาที
+SHORT_VERSION_CHECK_S = float(os.getenv("SHORT_VERSION_CHECK_S", "0.5"))  # ตรวจการเปลี่ยนแปลงข้าม worker
+# Cache-Control ของ 302: 0 = private, no-cache (ทุกสแกนถึงเซิร์ฟเวอร์ ClickCounter นับครบ)
+# > 0 = public max-age — เร็วขึ้นแต่สแกนซ้ำที่เบราว์เซอร์/proxy ตอบเองจะไม่ถูกนับ (ยอดต่ำกว่าจริง)
+SHORT_REDIRECT_MAX_AGE = int(os.getenv("SHORT_REDIRECT_MAX_AGE", "0"))
+
+class ShortLinkCache:
+    """
+    cache code -> url แบบ read-through ในหน่วยความจำ
+    - negative cache (code ที่ไม่มี) มี TTL และถูกล้างเมื่อมีลิงก์ใหม่
+    - ตรวจ shortlinks_version/epoch ใน app_meta ไม่เกินทุก SHORT_VERSION_CHECK_S
+      (trigger เป็นคนเพิ่มค่า จึงเห็นการเปลี่ยนแปลงจาก worker อื่นด้วย)
+    """
+    _MISSING = ""
+
+    def __init__(self):
+        self.positive = BoundedLRUCache(SHORT_CACHE_MAX_MB * 1024 * 1024, sizeof=lambda u: len(u) + 64)
+        self.negative = BoundedLRUCache(4 * 1024 * 1024, ttl=SHORT_NEGATIVE_TTL, sizeof=lambda _: 64)
+        self._lock = Lock()
+        self._next_check = 0.0
+        self._version: tuple[str, str] | None = None
+
+    def _sync(self) -> None:
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        with self._lock:
+            if now < self._next_check:
+                return
+            self._next_check = now + SHORT_VERSION_CHECK_S
+            with get_db() as db:
+                meta = dict(db.execute(
+                    "SELECT key, value FROM app_meta WHERE key IN ('shortlinks_version', 'shortlinks_epoch')"
+                ).fetchall())
+            version = (meta.get("shortlinks_version"), meta.get("shortlinks_epoch"))
+            if self._version is not None and version != self._version:
+                self.negative.clear()
+                if version[1] != self._version[1]:
+                    self.positive.clear()
+            self._version = version
+
+    def get(self, code: str) -> str | None:
+        self._sync()
+        url = self.positive.get(code)
+        if url is not None:
+            return url
+        if self.negative.get(code) is not None:
+            return None
+        with get_db() as db:
+            row = db.execute("SELECT url FROM shortlinks WHERE code = ?", (code,)).fetchone()
+        if row:
+            self.positive.put(code, row["url"])
+            return row["url"]
+        self.negative.put(code, self._MISSING)
+        return None
+
+SHORT_CACHE = ShortLinkCache()
+
+def lookup_short(code: str) -> str | None:
+    return SHORT_CACHE.get(code)
+
+def codes_for_urls(urls) -> dict[str, str]:
+    """{url: code} เฉพาะ url ที่มีลิงก์สั้น (ค้นผ่าน index ทีละชุด)"""
+    urls = list(urls)
+    out: dict[str, str] = {}
+    with get_db() as db:
+        for i in range(0, len(urls), 500):
+            chunk = urls[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            for r in db.execute(f"SELECT code, url FROM shortlinks WHERE url IN ({marks})", chunk):
+                out[r["url"]] = r["code"]
+    return out
+
+# ---- click analytics ----
+SHORT_CLICK_FLUSH_S = float(os.getenv("SHORT_CLICK_FLUSH_S", "5"))
+SHORT_CLICK_MAX_KEYS = int(os.getenv("SHORT_CLICK_MAX_KEYS", "50000"))
+
+class ClickCounter(BackgroundWorker):
+    """
+    นับคลิกลิงก์สั้นในหน่วยความจำ (ไม่แตะ DB ระหว่าง redirect)
+    แล้ว merge ลง short_clicks_daily ทุก SHORT_CLICK_FLUSH_S วินาทีบน background thread
+    - key = (code, วัน) เก็บจำนวนคลิก + ชุด ip ดิบ (hash ตอน flush)
+    - key เกิน max_keys ระหว่างรอบ = ทิ้งและนับใน dropped
+    - เขียน DB ไม่สำเร็จ = คืนยอดเข้าบัฟเฟอร์ ลองใหม่รอบหน้า
+    """
+    thread_name = "short-clicks"
+
+    def __init__(self, interval: float, max_keys: int):
+        super().__init__(interval)
+        self.max_keys = max_keys
+        self._counts: dict[tuple[str, str], list] = {}
+        self._lock = Lock()
+        self._flush_lock = Lock()
+        self.recorded = 0
+        self.flushed = 0
+        self.dropped = 0
+
+    def record(self, code: str, ip: str | None) -> None:
+        key = (code, _today_key())
+        with self._lock:
+            entry = self._counts.get(key)
+            if entry is None:
+                if len(self._counts) >= self.max_keys:
+                    self.dropped += 1
+                    return
+                entry = self._counts[key] = [0, set()]
+            entry[0] += 1
+            if ip:
+                entry[1].add(ip)
+            self.recorded += 1
+        self.ensure_started()
+
+    def tick(self) -> None:
+        self.flush()
+
+    def _requeue(self, counts: dict) -> None:
+        """คืนยอดที่เขียนไม่สำเร็จ (รวมกับที่เข้ามาใหม่ระหว่างนั้น) — key ใหม่เกิน max_keys ทิ้ง"""
+        with self._lock:
+            for key, (clicks, ips) in counts.items():
+                entry = self._counts.get(key)
+                if entry is None:
+                    if len(self._counts) >= self.max_keys:
+                        self.dropped += clicks
+                        continue
+                    entry = self._counts[key] = [0, set()]
+                entry[0] += clicks
+                entry[1] |= ips
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                counts, self._counts = self._counts, {}
+            if not counts:
+                return 0
+            try:
+                with get_db() as db:
+                    db.execute("BEGIN IMMEDIATE")
+                    for (code, day), (clicks, ips) in counts.items():
+                        row = db.execute(
+                            "SELECT sketch FROM short_clicks_daily WHERE code = ? AND day = ?", (code, day)
+                        ).fetchone()
+                        hll = HyperLogLog.from_bytes(row["sketch"] if row else None)
+                        for ip in ips:
+                            hll.add(_hash_ip(ip))
+                        db.execute(
+                            """
+                            INSERT INTO short_clicks_daily (code, day, clicks, uniques, sketch)
+                            VALUES (?, ?, ?, ?, ?)
+                            ON CONFLICT(code, day) DO UPDATE SET
+                                clicks  = clicks + excluded.clicks,
+                                uniques = excluded.uniques,
+                                sketch  = excluded.sketch
+                            """,
+                            (code, day, clicks, hll.count(), hll.to_bytes()),
+                        )
+            except Exception:
+                self.errors += 1
+                self._requeue(counts)  # เช่น DB ถูกล็อก — ลองใหม่รอบหน้า
+                return 0
+            n = sum(c for c, _ in counts.values())
+            self.flushed += n
+            return n
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = sum(c for c, _ in self._counts.values())
+        return {"pending": pending, "recorded": self.recorded, "flushed": self.flushed,
+                "dropped": self.dropped, "errors": self.errors, "interval": self.interval}
+
+SHORT_CLICKS = ClickCounter(SHORT_CLICK_FLUSH_S, SHORT_CLICK_MAX_KEYS)
+atexit.register(SHORT_CLICKS.close)
+
+def _client_ip() -> str | None:
+    ip = request.headers.get("X-Forwarded-For", request.remote_addr)
+    return ip.split(",")[0].strip() if ip else None
+
+_migrate_short_json()
+
 @app.get("/s/<code>")
 def short_redirect(code: str):
-    db = _load_short_db()
-    item = db.get(code)
-    if not item:
+    long_url = lookup_short(code)
+    if not long_url:
+        abort(404)
+    SHORT_CLICKS.record(code, _client_ip())
+    resp = redirect(long_url, code=302)
+    if SHORT_REDIRECT_MAX_AGE > 0:
+        resp.cache_control.public = True
+        resp.cache_control.max_age = SHORT_REDIRECT_MAX_AGE
+    else:
+        resp.cache_control.private = True
+        resp.cache_control.no_cache = True
+    return resp
+
+# ------------------------------------------------------------------------------
+# Thumbnails — รูปย่อสำหรับหน้าแอดมิน (logo + image) แทนการโหลดไฟล์ต้นฉบับ
+# ------------------------------------------------------------------------------
+
+THUMB_PX = int(os.getenv("THUMB_PX", "96"))              # ด้านละ (2x ของ .thumb 48px)
+THUMB_MAX_AGE = int(os.getenv("THUMB_MAX_AGE", str(365 * 24 * 3600)))
+THUMB_DIR = DB_PATH.parent / "thumbs"                   # ไม่อยู่ใต้ static — เสิร์ฟผ่าน asset_thumb เท่านั้น
+THUMB_FORMAT = "WEBP" if features.check("webp") else "PNG"
+THUMB_EXT = THUMB_FORMAT.lower()
+THUMB_TYPES = ("logo", "image", "pdf") if fitz is not None else ("logo", "image")
+
+# PDF: เรนเดอร์หน้าแรกในโปรเซสลูก (pymupdf ขัดจังหวะจาก thread ไม่ได้ — เกินเวลาก็ kill ทิ้ง)
+PDF_PREVIEW_MAX_MB = int(os.getenv("PDF_PREVIEW_MAX_MB", "20"))
+PDF_PREVIEW_MAX_PAGES = int(os.getenv("PDF_PREVIEW_MAX_PAGES", "2000"))
+PDF_PREVIEW_TIMEOUT_S = float(os.getenv("PDF_PREVIEW_TIMEOUT_S", "10"))
+PDF_PREVIEW_MAX_ZOOM = 4.0                               # กันหน้าเล็กจิ๋วถูกขยายจน pixmap ใหญ่
+
+_thumb_executor: ThreadPoolExecutor | None = None
+_thumb_pid: int | None = None
+_thumb_lock = Lock()
+_thumb_pending: set[tuple[str, str]] = set()
+THUMB_STATS = {"generated": 0, "lazy": 0, "queued": 0, "errors": 0}
+# ระหว่างรอรูปย่อ PDF (สร้างเบื้องหลัง) — ไม่ cache เพื่อให้เปิดหน้าครั้งหน้าได้รูปจริง
+THUMB_PENDING_SVG = (
+    f'<svg xmlns="http://www.w3.org/2000/svg" width="{THUMB_PX}" height="{THUMB_PX}" viewBox="0 0 24 24">'
+    '<rect width="24" height="24" fill="#f1f5f9"/>'
+    '<path d="M7 3h7l5 5v13H7z" fill="none" stroke="#94a3b8" stroke-width="1.5"/></svg>'
+)
+
+def _thumb_path(atype: str, name: str) -> str:
+    # เก็บชื่อเดิมทั้งนามสกุล (a.png / a.jpg ไม่ชนกัน)
+    return str((THUMB_DIR / atype / f"{name}.{THUMB_EXT}").resolve())
+
+class PreviewError(Exception):
+    pass
+
+def _pdf_first_page_worker(path: str, max_px: int, conn) -> None:
+    """(โปรเซสลูก) rasterize หน้าแรกให้ด้านยาวไม่เกิน max_px แล้วส่ง PNG กลับทาง pipe"""
+    try:
+        with fitz.open(path) as doc:
+            if doc.needs_pass:
+                raise PreviewError("encrypted pdf")
+            if doc.page_count < 1 or doc.page_count > PDF_PREVIEW_MAX_PAGES:
+                raise PreviewError(f"page count {doc.page_count} out of range")
+            page = doc.load_page(0)
+            rect = page.rect
+            if rect.width <= 0 or rect.height <= 0:
+                raise PreviewError("empty page")
+            zoom = min(max_px / max(rect.width, rect.height), PDF_PREVIEW_MAX_ZOOM)
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            conn.send(("ok", pix.tobytes("png")))
+    except Exception as e:
+        conn.send(("error", str(e)))
+    finally:
+        conn.close()
+
+def render_pdf_first_page(path: str, max_px: int) -> Image.Image:
+    """
+    หน้าแรกของ PDF เป็น PIL Image พร้อม guard
+    - ไฟล์ใหญ่เกิน PDF_PREVIEW_MAX_MB / จำนวนหน้าเกิน PDF_PREVIEW_MAX_PAGES / มีรหัสผ่าน -> PreviewError
+    - ความละเอียดจำกัดด้วย max_px (และ zoom ไม่เกิน PDF_PREVIEW_MAX_ZOOM)
+    - เกิน PDF_PREVIEW_TIMEOUT_S วินาที -> kill โปรเซสลูกแล้ว PreviewError
+    - โปรเซสลูกเริ่มด้วย MP_CONTEXT (forkserver/spawn) เหมือน batch pool
+    """
+    if fitz is None:
+        raise PreviewError("pymupdf not installed")
+    if os.path.getsize(path) > PDF_PREVIEW_MAX_MB * 1024 * 1024:
+        raise PreviewError("pdf too large for preview")
+    # ไม่ fork ตรง ๆ จาก thread ของ request/worker (โปรเซสนี้มี thread อื่นถือ lock อยู่ได้)
+    recv, send = MP_CONTEXT.Pipe(duplex=False)
+    proc = MP_CONTEXT.Process(target=_pdf_first_page_worker, args=(path, max_px, send), daemon=True)
+    proc.start()
+    send.close()
+    try:
+        if not recv.poll(PDF_PREVIEW_TIMEOUT_S):
+            raise PreviewError("pdf preview timed out")
+        status, payload = recv.recv()
+    except EOFError:
+        raise PreviewError("pdf preview worker died")
+    finally:
+        recv.close()
+        if proc.is_alive():
+            proc.kill()
+        proc.join()
+    if status != "ok":
+        raise PreviewError(payload)
+    return Image.open(BytesIO(payload))
+
+def _open_thumb_source(atype: str, src: str) -> Image.Image:
+    if atype == "pdf":
+        return render_pdf_first_page(src, THUMB_PX * 2)
+    img = Image.open(src)
+    img.draft("RGB", (THUMB_PX * 2, THUMB_PX * 2))
+    return img
+
+def make_thumbnail(atype: str, name: str) -> str:
+    """
+    สร้างรูปย่อสี่เหลี่ยม THUMB_PX (crop แบบ cover) แล้วเขียนแบบ atomic
+    - JPEG ใช้ draft() ให้ decoder ย่อระหว่าง decode (ไม่ต้องขยายทั้งภาพเต็ม)
+    - คงความโปร่งใสของโลโก้ไว้ (RGBA)
+    - PDF ใช้หน้าแรก crop ชิดด้านบน (หัวเอกสาร)
+    - สร้างไม่ได้ (เช่น PDF ติด guard) จะทิ้งไฟล์ .failed ไว้ กันการลองซ้ำทุกครั้งที่เปิดหน้า
+    """
+    src = os.path.join(_catalog_folder(atype), name)
+    dst = _thumb_path(atype, name)
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    try:
+        with _open_thumb_source(atype, src) as img:
+            img = img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+            thumb = ImageOps.fit(img, (THUMB_PX, THUMB_PX), Image.LANCZOS,
+                                 centering=(0.5, 0.0) if atype == "pdf" else (0.5, 0.5))
+    except Exception:
+        Path(f"{dst}.failed").touch()
+        raise
+    tmp = f"{dst}.{os.getpid()}.tmp"
+    thumb.save(tmp, THUMB_FORMAT, **({"quality": 80, "method": 4} if THUMB_FORMAT == "WEBP" else {"optimize": True}))
+    os.replace(tmp, dst)
+    return dst
+
+def _thumb_job(atype: str, name: str) -> None:
+    try:
+        make_thumbnail(atype, name)
+        THUMB_STATS["generated"] += 1
+    except Exception:
+        THUMB_STATS["errors"] += 1
+    finally:
+        with _thumb_lock:
+            _thumb_pending.discard((atype, name))
+
+def queue_thumbnail(atype: str, name: str) -> None:
+    """สร้างรูปย่อบน worker thread เบื้องหลัง (request อัปโหลดไม่ต้องรอ) — ไฟล์ที่รออยู่แล้วไม่เข้าคิวซ้ำ"""
+    global _thumb_executor, _thumb_pid
+    if atype not in THUMB_TYPES:
+        return
+    with _thumb_lock:
+        if _thumb_executor is None or _thumb_pid != os.getpid():
+            _thumb_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="thumbs")
+            _thumb_pid = os.getpid()
+            _thumb_pending.clear()
+        if (atype, name) in _thumb_pending:
+            return
+        _thumb_pending.add((atype, name))
+        _thumb_executor.submit(_thumb_job, atype, name)
+
+def remove_thumbnail(atype: str, name: str) -> None:
+    for path in (_thumb_path(atype, name), f"{_thumb_path(atype, name)}.failed"):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def thumb_url(atype: str, name: str, mtime: float) -> str | None:
+    """URL รูปย่อ (?v=mtime ทำให้ cache ระยะยาวได้ — ไฟล์เปลี่ยน URL ก็เปลี่ยน)"""
+    if atype not in THUMB_TYPES:
+        return None
+    return url_for("asset_thumb", atype=atype, name=name, v=int(mtime))
+
+@app.get("/thumbs/<atype>/<name>")
+@admin_required
+def asset_thumb(atype, name):
+    """
+    เสิร์ฟรูปย่อพร้อม Cache-Control ระยะยาว
+    - ยังไม่มี/เก่ากว่าต้นฉบับ (ไฟล์ที่อัปโหลดก่อนมีระบบนี้) -> สร้างทันทีครั้งเดียว
+      ยกเว้น PDF (เรนเดอร์อาจนานถึง PDF_PREVIEW_TIMEOUT_S): เข้าคิวเบื้องหลังแล้วตอบรูปชั่วคราว 202
+    """
+    if atype not in THUMB_TYPES:
         abort(404)
-    long_url = item.get("url") if isinstance(item, dict) else item
-    return redirect(long_url, code=302)
+    name = os.path.basename(name)
+    src = safe_join(_catalog_folder(atype), name)
+    if not src or not os.path.isfile(src):
+        abort(404)
+    path = _thumb_path(atype, name)
+    if not os.path.isfile(path) or os.path.getmtime(path) < os.path.getmtime(src):
+        failed = f"{path}.failed"
+        if os.path.isfile(failed) and os.path.getmtime(failed) >= os.path.getmtime(src):
+            abort(404)
+        if atype == "pdf":
+            queue_thumbnail(atype, name)
+            THUMB_STATS["queued"] += 1
+            resp = app.response_class(THUMB_PENDING_SVG, status=202, mimetype="image/svg+xml")
+            resp.headers["Cache-Control"] = "no-store"
+            resp.headers["Retry-After"] = "5"
+            return resp
+        try:
+            make_thumbnail(atype, name)
+            THUMB_STATS["lazy"] += 1
+        except Exception:
+            THUMB_STATS["errors"] += 1
+            abort(404)
+    resp = send_file(path, mimetype=f"image/{THUMB_EXT}", max_age=THUMB_MAX_AGE, conditional=True)
+    resp.cache_control.public = False  # หน้าแอดมินเท่านั้น — ให้เบราว์เซอร์ cache ได้ แต่ไม่ใช่ proxy
+    resp.cache_control.private = True
+    resp.cache_control.immutable = True
+    return resp
+
+# ------------------------------------------------------------------------------
+# Asset catalog — ตาราง assets แทนการ listdir/stat ทุกครั้งที่เปิดหน้าแอดมิน
+# ------------------------------------------------------------------------------
+
+ASSET_RECONCILE_S = int(os.getenv("ASSET_RECONCILE_S", "900"))
+ASSET_SORT_COLUMNS = {"mtime", "name", "size"}
+CATALOG_TYPES = ("logo",) + tuple(ASSET_FOLDERS)
+
+def _catalog_folder(atype: str) -> str:
+    return UPLOAD_FOLDER if atype == "logo" else ASSET_FOLDERS[atype]
+
+def _catalog_rel(atype: str, name: str) -> str:
+    """path ใต้ static/ ของไฟล์ในแคตตาล็อก"""
+    return f"logo/{name}" if atype == "logo" else f"files/{atype}/{name}"
+
+def _catalog_key_for_url(url: str) -> tuple[str, str] | None:
+    """URL ของไฟล์ static -> (atype, name) ถ้าเป็นไฟล์ที่อยู่ในแคตตาล็อกได้"""
+    prefix = f"{app.static_url_path}/"
+    path = urlsplit(url).path
+    if not path.startswith(prefix):
+        return None
+    parts = path[len(prefix):].split("/")
+    if len(parts) == 2 and parts[0] == "logo":
+        return "logo", parts[1]
+    if len(parts) == 3 and parts[0] == "files" and parts[1] in ASSET_FOLDERS:
+        return parts[1], parts[2]
+    return None
+
+def catalog_upsert(atype: str, name: str, sha256: str | None = None, short_code: str | None = None) -> None:
+    """เพิ่ม/อัปเดตแถวของไฟล์ที่เพิ่งเขียนลงดิสก์ (size/mtime อ่านจากไฟล์จริง)"""
+    st = os.stat(os.path.join(_catalog_folder(atype), name))
+    with get_db() as db:
+        db.execute(
+            """
+            INSERT INTO assets (atype, name, size, mtime, sha256, short_code) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(atype, name) DO UPDATE SET
+                size = excluded.size, mtime = excluded.mtime,
+                sha256 = COALESCE(excluded.sha256, sha256),
+                short_code = COALESCE(excluded.short_code, short_code)
+            """,
+            (atype, name, st.st_size, st.st_mtime, sha256, short_code),
+        )
+
+def catalog_remove(atype: str, name: str) -> None:
+    with get_db() as db:
+        db.execute("DELETE FROM assets WHERE atype = ? AND name = ?", (atype, name))
+
+def catalog_set_short(url: str, code: str) -> None:
+    key = _catalog_key_for_url(url)
+    if key:
+        with get_db() as db:
+            db.execute("UPDATE assets SET short_code = ? WHERE atype = ? AND name = ?", (code, *key))
+
+def _asset_filters(atype: str | None, q: str | None, mtime_from: float | None,
+                   mtime_to: float | None) -> tuple[list[str], list]:
+    where, params = [], []
+    if atype:
+        where.append("atype = ?")
+        params.append(atype)
+    if q:
+        where.append("name LIKE ? ESCAPE '\\'")
+        params.append("%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+    if mtime_from is not None:
+        where.append("mtime >= ?")
+        params.append(mtime_from)
+    if mtime_to is not None:
+        where.append("mtime < ?")
+        params.append(mtime_to)
+    return where, params
+
+def query_assets(atype: str | None = None, q: str | None = None, sort: str = "mtime",
+                 order: str = "desc", limit: int | None = None, offset: int = 0,
+                 after: tuple | None = None, mtime_from: float | None = None,
+                 mtime_to: float | None = None) -> list[sqlite3.Row]:
+    """
+    ค้นแคตตาล็อก: กรองตามชนิด/ชื่อ (substring)/ช่วง mtime, เรียงตาม mtime/name/size
+    - แบ่งหน้าแบบ keyset ด้วย after=(ค่าคอลัมน์เรียง, atype, name) ของแถวสุดท้ายหน้าก่อน
+      หรือแบบ limit/offset
+    (คอลัมน์เรียงอยู่ใน whitelist — ค่าอื่นถอยไปใช้ mtime)
+    refs = จำนวนการอัปโหลดที่ใช้ไฟล์นี้ร่วมกัน (จาก asset_blobs; ไฟล์ที่ไม่ได้ dedup = NULL)
+    """
+    sort = sort if sort in ASSET_SORT_COLUMNS else "mtime"
+    direction = "ASC" if (order or "").lower() == "asc" else "DESC"
+    where, params = _asset_filters(atype, q, mtime_from, mtime_to)
+    if after is not None:
+        where.append(f"({sort}, atype, name) {'>' if direction == 'ASC' else '<'} (?, ?, ?)")
+        params += list(after)
+    sql = ("SELECT assets.*, (SELECT b.refs FROM asset_blobs b WHERE b.atype = assets.atype "
+           "AND b.name = assets.name) AS refs FROM assets")
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {sort} {direction}, atype {direction}, name {direction}"
+    if limit is not None:
+        sql += " LIMIT ? OFFSET ?"
+        params += [limit, offset]
+    with get_db() as db:
+        return db.execute(sql, params).fetchall()
+
+def count_assets(atype: str | None = None, q: str | None = None,
+                 mtime_from: float | None = None, mtime_to: float | None = None) -> int:
+    """จำนวนแถวที่ตรงตัวกรอง — กรองแค่ชนิด (หรือไม่กรอง) อ่านจาก asset_stats ได้ทันที"""
+    if not q and mtime_from is None and mtime_to is None:
+        totals = asset_totals()
+        return totals[atype] if atype else totals["all"]
+    where, params = _asset_filters(atype, q, mtime_from, mtime_to)
+    with get_db() as db:
+        return db.execute("SELECT COUNT(*) FROM assets WHERE " + " AND ".join(where), params).fetchone()[0]
+
+def asset_totals() -> dict:
+    """จำนวนไฟล์ต่อชนิด + ขนาดรวม (อ่านจาก asset_stats ที่ trigger คำนวณไว้แล้ว)"""
+    totals = {t: 0 for t in CATALOG_TYPES}
+    totals.update(all=0, size_bytes=0)
+    with get_db() as db:
+        for r in db.execute("SELECT atype, files, bytes FROM asset_stats"):
+            totals[r["atype"]] = r["files"]
+            totals["all"] += r["files"]
+            totals["size_bytes"] += r["bytes"]
+    return totals
+
+def reconcile_assets() -> dict:
+    """
+    เทียบแคตตาล็อกกับไฟล์บนดิสก์
+    - ไฟล์ใหม่/ขนาดหรือ mtime เปลี่ยน -> hash ใหม่แล้ว upsert
+    - แถวที่ไฟล์หายไปแล้ว -> ลบ
+    - เติม short_code จากตาราง shortlinks (จับคู่ด้วย path ของ URL)
+    hash ไฟล์นอก transaction เพื่อไม่ถือ write lock นาน
+    อ่านแคตตาล็อกก่อนสแกนดิสก์ — ไฟล์ที่อัปโหลดเสร็จระหว่างสแกนจะไม่ถูกนับเป็น "หายจากดิสก์"
+    """
+    with get_db() as db:
+        known = {(r["atype"], r["name"]): r for r in db.execute("SELECT * FROM assets")}
+
+    disk: dict[tuple[str, str], tuple[int, float]] = {}
+    for atype in CATALOG_TYPES:
+        with os.scandir(_catalog_folder(atype)) as it:
+            for e in it:
+                if e.is_file() and not e.name.startswith("."):
+                    st = e.stat()
+                    disk[(atype, e.name)] = (st.st_size, st.st_mtime)
+
+    with get_db() as db:
+        codes = {}
+        for r in db.execute("SELECT code, url FROM shortlinks"):
+            key = _catalog_key_for_url(r["url"])
+            if key:
+                codes[key] = r["code"]
+
+    upserts = []
+    for key, (size, mtime) in disk.items():
+        row, code = known.get(key), codes.get(key)
+        unchanged = row is not None and row["size"] == size and row["mtime"] == mtime
+        if unchanged and row["sha256"] and (row["short_code"] or None) == code:
+            continue
+        try:
+            sha = row["sha256"] if unchanged and row["sha256"] else _sha256_file(os.path.join(_catalog_folder(key[0]), key[1]))
+        except OSError:
+            continue  # ถูกลบระหว่างสแกน
+        upserts.append((key[0], key[1], size, mtime, sha, code))
+    removed = [k for k in known
+               if k not in disk and not os.path.exists(os.path.join(_catalog_folder(k[0]), k[1]))]
+
+    with get_db() as db:
+        db.execute("BEGIN IMMEDIATE")
+        db.executemany(
+            """
+            INSERT INTO assets (atype, name, size, mtime, sha256, short_code) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(atype, name) DO UPDATE SET
+                size = excluded.size, mtime = excluded.mtime, sha256 = excluded.sha256, short_code = excluded.short_code
+            """,
+            upserts,
+        )
+        db.executemany("DELETE FROM assets WHERE atype = ? AND name = ?", removed)
+        db.execute(
+            "INSERT INTO app_meta (key, value) VALUES ('assets_reconciled_at', ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (str(time.time()),),
+        )
+    return {"files": len(disk), "upserted": len(upserts), "removed": len(removed)}
+
+class AssetReconciler(BackgroundWorker):
+    """
+    background thread ที่เรียก reconcile_assets ทุก interval วินาที (หรือทันทีเมื่อ kick())
+    เริ่มแบบ lazy ตอนมีการใช้งานหน้าแอดมิน และเริ่มใหม่หลัง fork
+    """
+    thread_name = "asset-reconcile"
+
+    def __init__(self, interval: float):
+        super().__init__(interval)
+        self.runs = 0
+        self.last: dict | None = None
+        self.last_at: float | None = None
+
+    def start(self) -> None:
+        self.ensure_started()
+
+    def kick(self) -> None:
+        self.ensure_started()
+        self.wake()
+
+    def tick(self) -> None:
+        self.last = reconcile_assets()
+        self.last_at = time.time()
+        self.runs += 1
+
+    def stats(self) -> dict:
+        return {"runs": self.runs, "errors": self.errors, "last": self.last,
+                "last_at": self.last_at, "interval": self.interval}
+
+ASSET_RECONCILER = AssetReconciler(ASSET_RECONCILE_S)
+
+def _ensure_catalog() -> None:
+    """ครั้งแรกที่ยังไม่เคย reconcile ให้สแกนแบบ sync (ไม่งั้นหน้าแอดมินว่าง) แล้วเปิด thread เบื้องหลัง"""
+    with get_db() as db:
+        done = db.execute("SELECT 1 FROM app_meta WHERE key = 'assets_reconciled_at'").fetchone()
+    if not done:
+        reconcile_assets()
+    ASSET_RECONCILER.start()
+
+@app.cli.command("assets-reconcile")
+def assets_reconcile_command():
+    """สแกนไฟล์บนดิสก์แล้วปรับตาราง assets:  flask --app app assets-reconcile"""
+    print(reconcile_assets())
 
 # ------------------------------------------------------------------------------
 # Admin pages & APIs
@@ -737,76 +3272,117 @@ def _admin_nav_urls():
     }
 
 
-def _list_assets():
-    """รวบรวมรายการไฟล์ (logo + pdf/mp3/image)"""
-    rows = []
-
-    # logo
-    for name in sorted(os.listdir(UPLOAD_FOLDER)):
-        p = os.path.join(UPLOAD_FOLDER, name)
-        if not os.path.isfile(p):
-            continue
-        st = os.stat(p)
-        rows.append({
-            "kind": "logo",
-            "atype": None,
-            "name": name,
-            "size": st.st_size,
-            "mtime": st.st_mtime,
-            "mtime_iso": datetime.fromtimestamp(st.st_mtime).isoformat(sep=" ", timespec="seconds"),
-            "url": url_for("static", filename=f"logo/{name}", _external=True),
-            "short_url": None,
-            "thumb": url_for("static", filename=f"logo/{name}"),
-        })
-
-    # assets
-    for atype, folder in ASSET_FOLDERS.items():
-        for name in sorted(os.listdir(folder)):
-            p = os.path.join(folder, name)
-            if not os.path.isfile(p):
-                continue
-            st = os.stat(p)
-            long_url = url_for("static", filename=f"files/{atype}/{name}", _external=True)
-            rows.append({
-                "kind": "asset",
-                "atype": atype,
-                "name": name,
-                "size": st.st_size,
-                "mtime": st.st_mtime,
-                "mtime_iso": datetime.fromtimestamp(st.st_mtime).isoformat(sep=" ", timespec="seconds"),
-                "url": long_url,
-                "short_url": None,
-                "thumb": url_for("static", filename=f"files/{atype}/{name}") if atype == "image" else None,
-            })
-
-    # เติม short_url
-    db = _load_short_db()
-    url2short = {}
-    for code, item in db.items():
-        u = item.get("url") if isinstance(item, dict) else item
-        url2short[u] = url_for("short_redirect", code=code, _external=True)
-    for r in rows:
-        r["short_url"] = url2short.get(r["url"])
-
-    # ใหม่สุดอยู่บน
-    rows.sort(key=lambda r: r["mtime"], reverse=True)
-    return rows
+def _catalog_row(r) -> dict:
+    """แถวจากตาราง assets -> dict ที่ admin.html ใช้ (url/short_url/thumb สร้างตาม request)"""
+    is_logo = r["atype"] == "logo"
+    rel = _catalog_rel(r["atype"], r["name"])
+    return {
+        "kind": "logo" if is_logo else "asset",
+        "atype": None if is_logo else r["atype"],
+        "name": r["name"],
+        "size": r["size"],
+        "mtime": r["mtime"],
+        "mtime_iso": datetime.fromtimestamp(r["mtime"]).isoformat(sep=" ", timespec="seconds"),
+        "sha256": r["sha256"],
+        "refs": r["refs"] or 1,
+        "url": url_for("static", filename=rel, _external=True),
+        "short_url": url_for("short_redirect", code=r["short_code"], _external=True) if r["short_code"] else None,
+        "thumb": thumb_url(r["atype"], r["name"], r["mtime"]),
+    }
 
 @app.get("/admin")
 @admin_required
 def admin_index():
-    rows = _list_assets()
-    total_size = sum(r["size"] for r in rows)
+    """หน้าไฟล์: เรนเดอร์แค่โครง + ยอดรวม รายการโหลดผ่าน /admin/api/assets ทีละหน้า"""
+    _ensure_catalog()
+    t = asset_totals()
     totals = {
-        "all": len(rows),
-        "logo": sum(1 for r in rows if r["kind"] == "logo"),
-        "pdf": sum(1 for r in rows if r["atype"] == "pdf"),
-        "mp3": sum(1 for r in rows if r["atype"] == "mp3"),
-        "image": sum(1 for r in rows if r["atype"] == "image"),
-        "size": _human_bytes(total_size),
-        "size_bytes": total_size,
+        "all": t["all"],
+        "logo": t["logo"],
+        "pdf": t["pdf"],
+        "mp3": t["mp3"],
+        "image": t["image"],
+        "size": _human_bytes(t["size_bytes"]),
+        "size_bytes": t["size_bytes"],
     }
-    return render_template("admin.html", rows=rows, totals=totals, **_admin_nav_urls())
+    return render_template("admin.html", totals=totals, **_admin_nav_urls())
+
+ADMIN_ASSETS_MAX_LIMIT = 200
+
+def _encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> list | None:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) and len(values) == 5 else None
+
+def _day_start_ts(value: str | None, days: int = 0) -> float | None:
+    """YYYY-MM-DD (เวลาไทย) -> epoch ของต้นวัน (+days)"""
+    if not value:
+        return None
+    try:
+        d = date.fromisoformat(value) + timedelta(days=days)
+    except ValueError:
+        return None
+    return datetime(d.year, d.month, d.day, tzinfo=BKK_TZ).timestamp()
+
+@app.get("/admin/api/assets")
+@admin_api_required
+def admin_api_assets():
+    """
+    รายการไฟล์แบบแบ่งหน้า (JSON)
+    - ?type=logo|pdf|mp3|image  ?q=ชื่อ  ?from=YYYY-MM-DD&to=YYYY-MM-DD (วันที่แก้ไข, เวลาไทย, รวมวัน to)
+    - ?sort=mtime|name|size&order=asc|desc  ?limit= (สูงสุด 200)
+    - ?cursor= ค่าจาก next_cursor ของหน้าก่อน (ตัวกรอง/การเรียงต้องเหมือนเดิม)
+    totals มาจาก asset_stats (ไม่ขึ้นกับขนาดแคตตาล็อก) / matched ตามตัวกรองปัจจุบัน
+    """
+    _ensure_catalog()
+    atype = (request.args.get("type") or "").lower() or None
+    if atype and atype not in CATALOG_TYPES:
+        return jsonify(success=False, error="invalid type"), 400
+    q = (request.args.get("q") or "").strip() or None
+    sort = request.args.get("sort", "mtime")
+    if sort not in ASSET_SORT_COLUMNS:
+        return jsonify(success=False, error="invalid sort"), 400
+    order = "asc" if request.args.get("order") == "asc" else "desc"
+    limit = min(max(request.args.get("limit", 50, type=int), 1), ADMIN_ASSETS_MAX_LIMIT)
+    mtime_from = _day_start_ts(request.args.get("from"))
+    mtime_to = _day_start_ts(request.args.get("to"), days=1)
+
+    after = None
+    if request.args.get("cursor"):
+        cur = _decode_cursor(request.args["cursor"])
+        if cur is None or cur[0] != sort or cur[1] != order:
+            return jsonify(success=False, error="invalid cursor"), 400
+        after = tuple(cur[2:])
+
+    rows = query_assets(atype, q, sort, order, limit + 1, after=after,
+                        mtime_from=mtime_from, mtime_to=mtime_to)
+    more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if more:
+        last = rows[-1]
+        next_cursor = _encode_cursor([sort, order, last[sort], last["atype"], last["name"]])
+
+    t = asset_totals()
+    return jsonify(
+        success=True,
+        items=[_catalog_row(r) for r in rows],
+        next_cursor=next_cursor,
+        matched=count_assets(atype, q, mtime_from, mtime_to),
+        totals={**t, "size": _human_bytes(t["size_bytes"])},
+    )
+
+@app.post("/admin/assets/reconcile")
+@admin_api_required
+def admin_assets_reconcile():
+    """สั่งสแกนดิสก์เทียบกับแคตตาล็อกใหม่ (ทำเบื้องหลัง)"""
+    ASSET_RECONCILER.kick()
+    return jsonify(success=True, reconciler=ASSET_RECONCILER.stats()), 202
 
 @app.get("/admin/dashboard")
 @admin_required
@@ -846,9 +3422,9 @@ def admin_dashboard():
     # ดึงซีรีส์
     series = build_daily_series(start_dt, end_dt, tz)
 
-    # ยอดรวมไว้แสดงการ์ด
+    # ยอดรวมไว้แสดงการ์ด (uniques = merge sketch ทั้งช่วง ไม่ใช่ผลรวมรายวัน)
     totals = {
-        "uniques":   sum(series["uniques"]),
+        "uniques":   window_uniques(start_dt, end_dt),
         "visits":    sum(series["visits"]),
         "downloads": sum(series["downloads"]),
         "uploads":   sum(series["uploads"]),
@@ -899,11 +3475,155 @@ def admin_delete():
     if not fpath or not os.path.isfile(fpath):
         return jsonify(success=False, error="not found"), 404
 
+    if folder != UPLOAD_FOLDER:
+        # asset ที่อัปโหลดซ้ำหลายครั้งใช้ไฟล์/ลิงก์สั้นเดียวกัน: ลด refs ทีละหนึ่ง
+        # ลบไฟล์จริง + แถวแคตตาล็อกเมื่อ refs เหลือ 0 เท่านั้น (removed บอกผู้เรียกว่าไฟล์หายจริงหรือยัง)
+        with get_db() as db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute(
+                "SELECT sha256, refs FROM asset_blobs WHERE atype = ? AND name = ?", (atype, fname)
+            ).fetchone()
+            if row and row["refs"] > 1:
+                db.execute("UPDATE asset_blobs SET refs = refs - 1 WHERE atype = ? AND sha256 = ?",
+                           (atype, row["sha256"]))
+                return jsonify(success=True, removed=False, refs=row["refs"] - 1)
+            if row:
+                db.execute("DELETE FROM asset_blobs WHERE atype = ? AND sha256 = ?", (atype, row["sha256"]))
+            try:
+                os.remove(fpath)
+            except Exception as e:
+                db.rollback()
+                return jsonify(success=False, error=f"delete failed: {e}"), 500
+            catalog_remove(atype, fname)
+        remove_thumbnail(atype, fname)
+        return jsonify(success=True, removed=True, refs=0)
+
     try:
         os.remove(fpath)
     except Exception as e:
         return jsonify(success=False, error=f"delete failed: {e}"), 500
 
+    invalidate_logo_cache(fpath)
+    catalog_remove("logo", fname)
+    remove_thumbnail("logo", fname)
+
+    return jsonify(success=True)
+
+@app.get("/admin/cache_stats")
+@admin_api_required
+def admin_cache_stats():
+    """สถิติ cache ภายในโปรเซส (hit/miss/eviction)"""
+    return jsonify(
+        success=True,
+        render=RENDER_CACHE.stats(),
+        matrix=MATRIX_CACHE.stats(),
+        gradient=GRADIENT_CACHE.stats(),
+        logo=LOGO_CACHE.stats(),
+        short=SHORT_CACHE.positive.stats(),
+        short_negative=SHORT_CACHE.negative.stats(),
+    )
+
+def _click_window(days: int) -> tuple[str, str]:
+    today = datetime.now(BKK_TZ).date()
+    return (today - timedelta(days=days - 1)).isoformat(), (today + timedelta(days=1)).isoformat()
+
+@app.get("/admin/short/top")
+@admin_api_required
+def admin_short_top():
+    """ลิงก์สั้นที่ถูกสแกนมากสุดในช่วง ?days=N (ค่าเริ่มต้น 30) จำนวน ?limit= (สูงสุด 200)"""
+    days = min(max(request.args.get("days", 30, type=int), 1), 366)
+    limit = min(max(request.args.get("limit", 20, type=int), 1), 200)
+    start, end = _click_window(days)
+    with get_db() as db:
+        top = db.execute(
+            """
+            SELECT c.code, s.url, SUM(c.clicks) AS clicks
+            FROM short_clicks_daily c LEFT JOIN shortlinks s ON s.code = c.code
+            WHERE c.day >= ? AND c.day < ?
+            GROUP BY c.code ORDER BY clicks DESC LIMIT ?
+            """,
+            (start, end, limit),
+        ).fetchall()
+        sketches = {r["code"]: HyperLogLog() for r in top}
+        if sketches:
+            marks = ",".join("?" * len(sketches))
+            for sk in db.execute(
+                f"SELECT code, sketch FROM short_clicks_daily WHERE code IN ({marks}) AND day >= ? AND day < ?",
+                (*sketches, start, end),
+            ):
+                sketches[sk["code"]].merge(HyperLogLog.from_bytes(sk["sketch"]))
+    items = [{"code": r["code"], "url": r["url"], "clicks": r["clicks"], "uniques": sketches[r["code"]].count()}
+             for r in top]
+    return jsonify(success=True, days=days, items=items)
+
+@app.get("/admin/short/<code>/clicks")
+@admin_api_required
+def admin_short_clicks(code: str):
+    """ซีรีส์รายวันของโค้ดเดียว (?days=N) + ยอดรวมตลอดอายุ"""
+    days = min(max(request.args.get("days", 30, type=int), 1), 366)
+    start, end = _click_window(days)
+    with get_db() as db:
+        rows = {r["day"]: r for r in db.execute(
+            "SELECT day, clicks, uniques, sketch FROM short_clicks_daily WHERE code = ? AND day >= ? AND day < ?",
+            (code, start, end),
+        )}
+        total = db.execute(
+            "SELECT COALESCE(SUM(clicks), 0) FROM short_clicks_daily WHERE code = ?", (code,)
+        ).fetchone()[0]
+    labels, clicks, uniques = [], [], []
+    hll = HyperLogLog()
+    d = date.fromisoformat(start)
+    while d.isoformat() < end:
+        r = rows.get(d.isoformat())
+        labels.append(d.isoformat())
+        clicks.append(r["clicks"] if r else 0)
+        uniques.append(r["uniques"] if r else 0)
+        if r:
+            hll.merge(HyperLogLog.from_bytes(r["sketch"]))
+        d += timedelta(days=1)
+    return jsonify(success=True, code=code, url=lookup_short(code), total_clicks=total,
+                   window={"days": days, "clicks": sum(clicks), "uniques": hll.count()},
+                   series={"labels": labels, "clicks": clicks, "uniques": uniques})
+
+@app.get("/admin/runtime_stats")
+@admin_api_required
+def admin_runtime_stats():
+    """สถิติส่วนทำงานเบื้องหลังของโปรเซสนี้ (analytics writer, DB pool)"""
+    return jsonify(
+        success=True,
+        pid=os.getpid(),
+        analytics_writer=ANALYTICS_WRITER.stats(),
+        short_clicks=SHORT_CLICKS.stats(),
+        asset_reconciler=ASSET_RECONCILER.stats(),
+        thumbnails=dict(THUMB_STATS, format=THUMB_FORMAT, size=THUMB_PX, types=list(THUMB_TYPES)),
+        db_pool=DB_POOL.stats(),
+        stage_timings=STAGE_TIMES.snapshot(),
+    )
+
+@app.get("/admin/metrics")
+@admin_api_required
+def admin_metrics():
+    """
+    histogram เวลาต่อขั้นตอน/ต่อ endpoint ในรูปแบบ Prometheus text (ของโปรเซสนี้)
+    scrape ด้วย header X-Admin-Key (อ่านอย่างเดียว — histogram สะสมตลอดอายุโปรเซสตามแบบ Prometheus)
+    """
+    lines = STAGE_TIMES.prometheus() + REQUEST_TIMES.prometheus()
+    lines += [
+        "# HELP qr_process_start_time_seconds Start time of this worker since unix epoch.",
+        "# TYPE qr_process_start_time_seconds gauge",
+        f"qr_process_start_time_seconds {PROCESS_STARTED_AT:.3f}",
+    ]
+    resp = app.response_class("\n".join(lines) + "\n", mimetype="text/plain")
+    resp.headers["Content-Type"] = "text/plain; version=0.0.4; charset=utf-8"
+    resp.cache_control.no_store = True
+    return resp
+
+@app.post("/admin/metrics/reset")
+@admin_api_required
+def admin_metrics_reset():
+    """ล้าง histogram ของโปรเซสนี้ (เช่น ก่อนวัดผลรอบใหม่) — scraper จะเห็นเป็น counter reset"""
+    STAGE_TIMES.clear()
+    REQUEST_TIMES.clear()
     return jsonify(success=True)
 
 @app.post("/admin/shorten")
@@ -918,17 +3638,10 @@ def admin_shorten():
     if not long_url:
         return jsonify(success=False, error="missing url"), 400
 
-    short = get_or_create_short(long_url)
-
-    # ตรวจว่าเพิ่งสร้างหรือมีอยู่แล้ว
-    db = _load_short_db()
-    code = None
-    for c, item in db.items():
-        u = item.get("url") if isinstance(item, dict) else item
-        if u == long_url:
-            code = c
-            break
-    already = code is not None
+    code, created = get_or_create_code(long_url)
+    short = url_for("short_redirect", code=code, _external=True)
+    already = not created
+    catalog_set_short(long_url, code)
 
     return jsonify(success=True, short_url=short, already=already), (200 if already else 201)
 
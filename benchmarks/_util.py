@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+ของใช้ร่วมของ benchmark suite (suite / redirect / dashboard / compare)
+- latency():   จับเวลาหลายรอบ คืน ms เป็น p50/p95/p99/min/mean
+- peak_rss_mb(): หน่วยความจำสูงสุดที่เพิ่มขึ้นระหว่างเรียกฟังก์ชัน (reset VmHWM ผ่าน /proc/self/clear_refs)
+- in_fresh_process(): รันฟังก์ชันในโปรเซสใหม่ (spawn) — ใช้วัด peak ที่ heap ยังไม่ถูกรอบก่อน ๆ ขยายไว้
+- result()/dump(): รูปแบบผลลัพธ์ JSON ที่ compare.py อ่านได้
+"""
+
+from __future__ import annotations
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+SCHEMA = 1
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _pct(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    i = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[i]
+
+
+def summarize(ms: list[float]) -> dict:
+    s = sorted(ms)
+    return {
+        "n": len(s),
+        "ms_p50": round(statistics.median(s), 4) if s else 0.0,
+        "ms_p95": round(_pct(s, 0.95), 4),
+        "ms_p99": round(_pct(s, 0.99), 4),
+        "ms_min": round(s[0], 4) if s else 0.0,
+        "ms_mean": round(statistics.fmean(s), 4) if s else 0.0,
+    }
+
+
+def latency(fn, repeat: int, warmup: int = 1) -> dict:
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return summarize(times)
+
+
+def _status_kb(field: str) -> int | None:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_mb(fn) -> float | None:
+    """
+    RSS สูงสุดที่เพิ่มจากก่อนเรียก fn (MB) — None ถ้าไม่ใช่ Linux หรือ reset VmHWM ไม่ได้
+    (ใช้แทน tracemalloc เพราะมองไม่เห็น buffer ของ PIL)
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")  # 5 = reset peak RSS (VmHWM) ของโปรเซสนี้
+    except OSError:
+        return None
+    base = _status_kb("VmRSS")
+    fn()
+    peak = _status_kb("VmHWM")
+    if base is None or peak is None:
+        return None
+    return round(max(0, peak - base) / 1024, 2)
+
+
+def in_fresh_process(fn, *args):
+    """
+    เรียก fn(*args) ในโปรเซสลูกใหม่ (spawn) แล้วคืนค่าที่ fn คืน
+    fn ต้องเป็นฟังก์ชันระดับโมดูล (pickle ได้) — โปรเซสเดิมที่วนวัด latency มาแล้ว
+    มี heap ว่างค้างอยู่ให้ใช้ซ้ำ ทำให้ VmHWM แทบไม่ขยับ (peak ออกมาเป็น 0)
+    """
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(1) as pool:
+        return pool.apply(fn, args)
+
+
+def result(bench: str, case: dict, **metrics) -> dict:
+    return {"bench": bench, "case": case, "metrics": metrics}
+
+
+def case_key(r: dict) -> str:
+    return r["bench"] + " " + json.dumps(r["case"], sort_keys=True, separators=(",", ":"))
+
+
+def _git_rev() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_meta(args: dict) -> dict:
+    import numpy
+    import PIL
+    import sqlite3
+    return {
+        "schema": SCHEMA,
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_rev": _git_rev(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": numpy.__version__,
+        "pillow": PIL.__version__,
+        "sqlite": sqlite3.sqlite_version,
+        "args": args,
+    }
+
+
+def dump(doc: dict, path: str) -> None:
+    text = json.dumps(doc, indent=1, ensure_ascii=False)
+    if path == "-":
+        sys.stdout.write(text + "\n")
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text + "\n")
+
+
+def log(msg: str) -> None:
+    print(msg, file=sys.stderr, flush=True)
+
+
+def require_scratch_db(qrapp) -> None:
+    """benchmark ที่ใส่ข้อมูลสังเคราะห์ลง DB ต้องใช้ไฟล์ใน temp เท่านั้น (กันเขียนทับ data/app.db)"""
+    db = os.path.realpath(str(qrapp.DB_PATH))
+    tmp = os.path.realpath(tempfile.gettempdir())
+    if not db.startswith(tmp + os.sep):
+        raise SystemExit(f"refusing to load synthetic data into {db}; point APP_DB_PATH under {tmp}")
+
+
+def parse_counts(text: str) -> list[int]:
+    """'1e5,1e6' -> [100000, 1000000]"""
+    return [int(float(x)) for x in text.split(",") if x.strip()]
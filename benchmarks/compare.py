@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+เทียบผล JSON สองรอบของ benchmark suite (หรือ redirect/dashboard ที่รันด้วย --json)
+
+รัน:  python -m benchmarks.compare base.json new.json [--threshold 10] [--metric ms_p50] [--fail]
+- จับคู่ผลด้วย (bench, case) แล้วแสดงค่าเดิม/ใหม่/อัตราส่วนของ metric ที่เลือก
+- ops_s ยิ่งมากยิ่งดี ที่เหลือ (ms, MB, bytes) ยิ่งน้อยยิ่งดี
+- --fail: exit code 1 ถ้ามีกรณีแย่ลงเกิน threshold % (ใช้ใน CI)
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import _util  # noqa: E402
+
+HIGHER_IS_BETTER = {"ops_s"}
+
+
+def _load(path: str) -> dict[str, dict]:
+    with open(path, encoding="utf-8") as f:
+        doc = json.load(f)
+    return {_util.case_key(r): r for r in doc["results"]}
+
+
+def compare(base: dict[str, dict], new: dict[str, dict], metrics: list[str], threshold: float) -> list[dict]:
+    rows = []
+    for key in sorted(base.keys() & new.keys()):
+        for metric in metrics:
+            old_v = base[key]["metrics"].get(metric)
+            new_v = new[key]["metrics"].get(metric)
+            if not isinstance(old_v, (int, float)) or not isinstance(new_v, (int, float)) or not old_v:
+                continue
+            change = (new_v - old_v) / old_v * 100
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            rows.append({"case": key, "metric": metric, "base": old_v, "new": new_v,
+                         "change_pct": round(change, 1), "regression": worse > threshold})
+    return rows
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("base")
+    ap.add_argument("new")
+    ap.add_argument("--metric", action="append", default=None,
+                    help="metric ที่เทียบ (ระบุซ้ำได้; ค่าเริ่มต้น ms_p50, ops_s, peak_mb, bytes)")
+    ap.add_argument("--threshold", type=float, default=10.0, help="% ที่ถือว่าแย่ลง")
+    ap.add_argument("--fail", action="store_true")
+    ap.add_argument("--json", action="store_true", help="พิมพ์ผลเป็น JSON")
+    args = ap.parse_args(argv)
+
+    base, new = _load(args.base), _load(args.new)
+    rows = compare(base, new, args.metric or ["ms_p50", "ops_s", "peak_mb", "bytes"], args.threshold)
+    regressions = [r for r in rows if r["regression"]]
+
+    if args.json:
+        print(json.dumps({"rows": rows, "regressions": len(regressions),
+                          "only_base": sorted(base.keys() - new.keys()),
+                          "only_new": sorted(new.keys() - base.keys())}, indent=1))
+    else:
+        for r in rows:
+            flag = "  <-- regression" if r["regression"] else ""
+            print(f"{r['case']:<90} {r['metric']:<8} {r['base']:>12} -> {r['new']:>12} "
+                  f"({r['change_pct']:+.1f}%){flag}")
+        print(f"{len(rows)} comparisons, {len(regressions)} regressions (> {args.threshold}%)")
+    if args.fail and regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: เวลาคิวรีของแดชบอร์ดแอดมินบนตาราง analytics สังเคราะห์ขนาดหลายล้านแถว
+
+รัน:  python -m benchmarks.dashboard [--rows 2e6] [--days 730] [--repeat 20] [--json out.json]
+- ใส่ event สังเคราะห์ (visit/download/upload, ip จาก pool ที่ hash แล้ว) ลงตาราง analytics ใน DB ชั่วคราว
+  แล้ว backfill_analytics_daily() — ถ้าขนาดเดิมตรงกับรอบก่อนจะใช้ข้อมูลเดิม (--rebuild เพื่อสร้างใหม่)
+- series/uniques: build_daily_series / window_uniques ต่อช่วง 7/30/90/365 วัน
+- raw_group_by: GROUP BY บนตารางดิบช่วง 30 วัน (ไว้เทียบว่าถ้าไม่มี rollup จะช้าแค่ไหน)
+- page: GET /admin/dashboard?days=30 ทั้งหน้า (รวม template)
+"""
+
+from __future__ import annotations
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("APP_DB_PATH", os.path.join(tempfile.gettempdir(), "qr_bench.db"))
+
+import numpy as np  # noqa: E402
+
+import app as qrapp  # noqa: E402
+from benchmarks import _util  # noqa: E402
+
+INSERT_CHUNK = 100_000
+IP_POOL = 200_000
+EVENTS = np.array(["visit", "download", "upload"])
+EVENT_P = (0.85, 0.12, 0.03)
+UAS = ("Mozilla/5.0 (Windows NT 10.0)", "Mozilla/5.0 (iPhone)", "Mozilla/5.0 (Linux; Android 14)")
+WINDOWS = (7, 30, 90, 365)
+META_KEY = "bench_analytics"
+
+
+def populate(rows: int, days: int, seed: int = 1, rebuild: bool = False) -> dict:
+    """สร้างข้อมูลดิบ + rollup (ข้ามได้ถ้าขนาดเท่ารอบก่อน) คืนเวลาที่ใช้ (วินาที)"""
+    _util.require_scratch_db(qrapp)
+    tag = f"{rows}:{days}:{seed}"
+    with qrapp.get_db() as db:
+        row = db.execute("SELECT value FROM app_meta WHERE key = ?", (META_KEY,)).fetchone()
+    if row and row["value"] == tag and not rebuild:
+        return {"insert_s": 0.0, "backfill_s": 0.0}
+
+    rng = np.random.default_rng(seed)
+    ips = [qrapp._hash_ip(f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}") for i in range(IP_POOL)]
+    end = datetime.now(timezone.utc).replace(microsecond=0)
+    start = np.datetime64(end.replace(tzinfo=None) - timedelta(days=days), "s")
+
+    t0 = time.perf_counter()
+    with qrapp.get_db() as db:
+        db.execute("BEGIN IMMEDIATE")
+        db.execute("DELETE FROM analytics")
+        db.execute("DELETE FROM analytics_daily")
+        offsets = np.sort(rng.integers(0, days * 86400, size=rows))  # id เรียงตามเวลาเหมือนข้อมูลจริง
+        for lo in range(0, rows, INSERT_CHUNK):
+            hi = min(rows, lo + INSERT_CHUNK)
+            ts = np.datetime_as_string(start + offsets[lo:hi], unit="s")
+            ev = EVENTS[rng.choice(3, size=hi - lo, p=EVENT_P)]
+            ip_idx = rng.zipf(1.3, size=hi - lo) % IP_POOL  # ผู้ใช้ประจำกลับมาบ่อย
+            db.executemany(
+                "INSERT INTO analytics (ts, event, item_id, ip, user_agent) VALUES (?, ?, NULL, ?, ?)",
+                (
+                    (t.replace("T", " "), e, ips[i] if e == "visit" else None, UAS[i % 3] if e == "visit" else None)
+                    for t, e, i in zip(ts.tolist(), ev.tolist(), ip_idx.tolist())
+                ),
+            )
+            _util.log(f"  analytics {hi:,}/{rows:,}")
+    insert_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    qrapp.backfill_analytics_daily()
+    backfill_s = time.perf_counter() - t0
+    with qrapp.get_db() as db:
+        db.execute("INSERT OR REPLACE INTO app_meta (key, value) VALUES (?, ?)", (META_KEY, tag))
+    return {"insert_s": round(insert_s, 2), "backfill_s": round(backfill_s, 2)}
+
+
+def _raw_group_by(start_dt: datetime, end_dt: datetime) -> list:
+    fmt = "%Y-%m-%d %H:%M:%S"
+    with qrapp.get_db() as db:
+        return db.execute(
+            """
+            SELECT date(ts, '+7 hours') AS d,
+                   SUM(event = 'visit') AS visits,
+                   COUNT(DISTINCT CASE WHEN event = 'visit' THEN ip END) AS uniques,
+                   SUM(event = 'download') AS downloads,
+                   SUM(event = 'upload') AS uploads
+            FROM analytics WHERE ts >= ? AND ts < ?
+            GROUP BY d
+            """,
+            (start_dt.astimezone(timezone.utc).strftime(fmt), end_dt.astimezone(timezone.utc).strftime(fmt)),
+        ).fetchall()
+
+
+def run(rows: int, days: int, repeat: int, seed: int = 1, rebuild: bool = False) -> list[dict]:
+    _util.log(f"dashboard: {rows:,} rows over {days} days")
+    build = populate(rows, days, seed, rebuild)
+    db_mb = round(os.path.getsize(qrapp.DB_PATH) / 1024 / 1024, 1)
+    base = {"rows": rows, "days": days}
+    results = [_util.result("dashboard.build", base, db_mb=db_mb, **build)]
+
+    tz = qrapp.BKK_TZ
+    today = datetime.now(tz).replace(hour=0, minute=0, second=0, microsecond=0)
+    for window in WINDOWS:
+        start_dt, end_dt = today - timedelta(days=window - 1), today + timedelta(days=1)
+        case = {**base, "window": window}
+        results.append(_util.result("dashboard.series", case, **_util.latency(
+            lambda: qrapp.build_daily_series(start_dt, end_dt, tz), repeat)))
+        results.append(_util.result("dashboard.uniques", case, **_util.latency(
+            lambda: qrapp.window_uniques(start_dt, end_dt), repeat)))
+
+    start_dt, end_dt = today - timedelta(days=29), today + timedelta(days=1)
+    results.append(_util.result("dashboard.raw_group_by", {**base, "window": 30}, **_util.latency(
+        lambda: _raw_group_by(start_dt, end_dt), max(1, repeat // 4))))
+    results.append(_util.result("dashboard.months", base, **_util.latency(qrapp.get_available_months, repeat)))
+
+    client = qrapp.app.test_client()
+    with client.session_transaction() as s:
+        s["is_admin"] = True
+
+    def page() -> None:
+        resp = client.get("/admin/dashboard?days=30")
+        if resp.status_code != 200:
+            raise RuntimeError(f"/admin/dashboard -> {resp.status_code}")
+
+    results.append(_util.result("dashboard.page", {**base, "window": 30}, **_util.latency(page, repeat)))
+    return results
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--rows", default="2e6", help="จำนวน event ดิบ (เช่น 2e6, 1e7)")
+    ap.add_argument("--days", type=int, default=730)
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--rebuild", action="store_true", help="สร้างข้อมูลสังเคราะห์ใหม่แม้ขนาดเท่าเดิม")
+    ap.add_argument("--json", default=None, help="เขียนผลแบบ JSON (- = stdout)")
+    args = ap.parse_args(argv)
+
+    results = run(_util.parse_counts(args.rows)[0], args.days, args.repeat, args.seed, args.rebuild)
+    if args.json:
+        _util.dump({"meta": _util.run_meta(vars(args)), "results": results}, args.json)
+        return
+    print(f"{'bench':<24} {'window':>6} | {'p50 ms':>9} {'p95 ms':>9}")
+    for r in results:
+        m = r["metrics"]
+        if "ms_p50" not in m:
+            print(f"{r['bench']:<24} {'':>6} | insert {m['insert_s']} s, backfill {m['backfill_s']} s, "
+                  f"db {m['db_mb']} MB")
+            continue
+        print(f"{r['bench']:<24} {r['case'].get('window', ''):>6} | {m['ms_p50']:>9.3f} {m['ms_p95']:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
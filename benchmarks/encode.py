@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: ขนาดไฟล์และเวลา encode ต่อโหมดภาพ/preset (PNG palette/grayscale, WebP)
+
+รัน:  python -m benchmarks.encode [--repeat 5]
+- rgba:    ภาพเดิมแบบ RGBA เต็ม + PNG ค่าเริ่มต้นของ Pillow (ก่อนเปลี่ยน)
+- auto:    โหมดที่ generate_qr_code_png เลือกเอง (P 1-bit สำหรับสองสี, L สำหรับไล่สีเทา)
+- preset:  fast / default / small ของ PNG_PRESETS และ WEBP_PRESETS
+ค่า ms เป็นมัธยฐานของการ encode อย่างเดียว (ไม่รวมเรนเดอร์)
+"""
+
+from __future__ import annotations
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("APP_DB_PATH", os.path.join(tempfile.gettempdir(), "qr_bench.db"))
+
+from io import BytesIO  # noqa: E402
+
+import app as qrapp  # noqa: E402
+
+DATA = "https://example.com/some/long/path?utm_source=print&utm_campaign=benchmark"
+SIZES = (512, 1024, 2048)
+CASES = {
+    "solid": dict(fill_color="#1e88e5", back_color="#ffffff"),
+    "transparent": dict(fill_color="#000000", transparent=True),
+    "gray-linear": dict(fill_color="#000000", back_color="#ffffff", fill_style="linear", fill_color2="#777777"),
+    "linear": dict(fill_color="#1e88e5", back_color="#ffffff", fill_style="linear", fill_color2="#e53935"),
+}
+
+
+def _legacy_png(img) -> bytes:
+    buf = BytesIO()
+    img.convert("RGBA").save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def timed(fn, repeat: int) -> tuple[float, int]:
+    out = fn()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times), len(out)
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args(argv)
+
+    encoders = {"png rgba (legacy)": None}
+    encoders.update({f"png {p}": p for p in qrapp.PNG_PRESETS})
+    if qrapp.WEBP_ENABLED:
+        encoders.update({f"webp {p}": p for p in qrapp.WEBP_PRESETS})
+
+    print(f"{'case':<12} {'size':>5} {'mode':>4} | {'encoder':<18} {'ms':>8} {'KB':>8}")
+    for label, kw in CASES.items():
+        for size in SIZES:
+            img = qrapp.generate_qr_code_png(DATA, None, size_px=size, **kw)
+            for name, preset in encoders.items():
+                if preset is None:
+                    fn = lambda: _legacy_png(img)  # noqa: E731
+                elif name.startswith("webp"):
+                    fn = lambda p=preset: qrapp._encode_webp(img, p)  # noqa: E731
+                else:
+                    fn = lambda p=preset: qrapp._encode_png(img, p)  # noqa: E731
+                ms, nbytes = timed(fn, args.repeat)
+                print(f"{label:<12} {size:>5} {img.mode:>4} | {name:<18} {ms:>8.2f} {nbytes / 1024:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
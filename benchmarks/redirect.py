@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: ความเร็ว redirect ลิงก์สั้น (/s/<code>) เทียบกับจำนวนลิงก์ในตาราง shortlinks
+
+รัน:  python -m benchmarks.redirect [--links 1e5,1e6,1e7] [--requests 20000] [--json out.json]
+- ใส่ลิงก์สังเคราะห์ลง DB ชั่วคราว (ต่อเติมจากรอบก่อนได้ — 1e7 ใช้เวลาสร้างหลายนาที/ดิสก์ ~1.5 GB)
+- lookup_cold: lookup_short() หลังล้าง cache (อ่าน SQLite ตรงทุกครั้ง) — ops/s และ µs ต่อครั้ง
+- redirect_zipf: GET /s/<code> ผ่าน Flask test client โดยโค้ดกระจายแบบ Zipf (ลิงก์ดังถูกสแกนบ่อย)
+  รวม cache ในหน่วยความจำ + ClickCounter ตามจริง
+- redirect_miss: โค้ดที่ไม่มีอยู่ (404 + negative cache)
+"""
+
+from __future__ import annotations
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("APP_DB_PATH", os.path.join(tempfile.gettempdir(), "qr_bench.db"))
+
+import numpy as np  # noqa: E402
+
+import app as qrapp  # noqa: E402
+from benchmarks import _util  # noqa: E402
+
+ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+INSERT_CHUNK = 200_000
+ZIPF_S = 1.1
+BENCH_URL = "https://example.com/bench/"
+BENCH_URL_END = "https://example.com/bench0"  # ขอบบนของช่วง prefix (ใช้ index ของ url ได้)
+
+
+def bench_code(i: int) -> str:
+    """เลขลำดับ -> โค้ด base62 ยาว 6 ตัว (เท่า SHORT_CODE_LEN) — กำหนดได้ซ้ำทุกครั้ง"""
+    out = []
+    for _ in range(qrapp.SHORT_CODE_LEN):
+        i, r = divmod(i, 62)
+        out.append(ALPHABET[r])
+    return "".join(reversed(out))
+
+
+def populate(n: int) -> float:
+    """เติมตาราง shortlinks ให้มี n แถว (ถ้ามีพอแล้วไม่ทำอะไร) คืนเวลาที่ใช้ (วินาที)"""
+    _util.require_scratch_db(qrapp)
+    with qrapp.get_db() as db:
+        # นับเฉพาะลิงก์สังเคราะห์ (DB อาจมีลิงก์จริงที่ migrate มาจาก shortlinks.json)
+        have = db.execute(
+            "SELECT COUNT(*) FROM shortlinks WHERE url >= ? AND url < ?", (BENCH_URL, BENCH_URL_END)
+        ).fetchone()[0]
+    if have >= n:
+        return 0.0
+    t0 = time.perf_counter()
+    now = int(time.time())
+    with qrapp.get_db() as db:
+        db.execute("BEGIN IMMEDIATE")
+        # trigger นับ version ทีละแถว — ปิดไว้ระหว่าง bulk insert แล้วสร้างคืนด้วย ensure_schema()
+        for t in ("ins", "upd", "del"):
+            db.execute(f"DROP TRIGGER IF EXISTS trg_shortlinks_{t}")
+        for start in range(have, n, INSERT_CHUNK):
+            stop = min(n, start + INSERT_CHUNK)
+            db.executemany(
+                "INSERT OR IGNORE INTO shortlinks (code, url, ts) VALUES (?, ?, ?)",
+                ((bench_code(i), f"{BENCH_URL}{i}", now) for i in range(start, stop)),
+            )
+            _util.log(f"  shortlinks {stop:,}/{n:,}")
+        db.execute(
+            "UPDATE app_meta SET value = CAST(value AS INTEGER) + 1 "
+            "WHERE key IN ('shortlinks_version', 'shortlinks_epoch')"
+        )
+    qrapp.ensure_schema()
+    return time.perf_counter() - t0
+
+
+def _reset_short_cache() -> None:
+    qrapp.SHORT_CACHE.positive.clear()
+    qrapp.SHORT_CACHE.negative.clear()
+
+
+def _zipf_codes(n: int, count: int, rng: np.random.Generator) -> list[str]:
+    ranks = np.empty(0, dtype=np.int64)
+    while len(ranks) < count:  # ตัดหางที่เกิน n ทิ้งแล้วสุ่มเติม
+        more = rng.zipf(ZIPF_S, size=count)
+        ranks = np.concatenate([ranks, more[more <= n] - 1])
+    ranks = ranks[:count]
+    perm_seed = 2654435761  # กระจายอันดับความนิยมไปทั่วช่วงโค้ด (ไม่ให้ลิงก์ดังกองอยู่ต้นตาราง)
+    return [bench_code(int(r) * perm_seed % n) for r in ranks]
+
+
+def _throughput(fn, items) -> dict:
+    times = []
+    t_start = time.perf_counter()
+    for it in items:
+        t0 = time.perf_counter()
+        fn(it)
+        times.append((time.perf_counter() - t0) * 1000)
+    wall = time.perf_counter() - t_start
+    stats = _util.summarize(times)
+    stats["ops_s"] = round(len(times) / wall, 1) if wall else 0.0
+    return stats
+
+
+def run(links: list[int], requests: int, seed: int = 1) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    client = qrapp.app.test_client()
+    results = []
+    for n in sorted(links):
+        _util.log(f"redirect: {n:,} links")
+        build_s = populate(n)
+        db_mb = round(os.path.getsize(qrapp.DB_PATH) / 1024 / 1024, 1)
+        case = {"links": n}
+
+        _reset_short_cache()
+        sample = [bench_code(int(i)) for i in rng.integers(0, n, size=min(requests, n))]
+        stats = _throughput(qrapp.lookup_short, sample)
+        results.append(_util.result("redirect.lookup_cold", case, db_mb=db_mb,
+                                    build_s=round(build_s, 2), **stats))
+
+        def get(code: str) -> None:
+            resp = client.get(f"/s/{code}")
+            if resp.status_code != 302:
+                raise RuntimeError(f"/s/{code} -> {resp.status_code}")
+
+        _reset_short_cache()
+        codes = _zipf_codes(n, requests, rng)
+        stats = _throughput(get, codes)
+        stats["distinct"] = len(set(codes))
+        results.append(_util.result("redirect.zipf", case, **stats))
+
+        missing = [f"~{i}" for i in rng.integers(0, max(1, requests // 10), size=requests // 4)]
+        stats = _throughput(lambda c: client.get(f"/s/{c}"), missing)
+        results.append(_util.result("redirect.miss", case, **stats))
+    qrapp.SHORT_CLICKS.flush()
+    return results
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--links", default="1e5,1e6", help="จำนวนลิงก์ คั่นด้วย , (เช่น 1e5,1e6,1e7)")
+    ap.add_argument("--requests", type=int, default=20000)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", default=None, help="เขียนผลแบบ JSON (- = stdout)")
+    args = ap.parse_args(argv)
+
+    results = run(_util.parse_counts(args.links), args.requests, args.seed)
+    if args.json:
+        _util.dump({"meta": _util.run_meta(vars(args)), "results": results}, args.json)
+        return
+    print(f"{'bench':<22} {'links':>10} | {'ops/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for r in results:
+        m = r["metrics"]
+        print(f"{r['bench']:<22} {r['case']['links']:>10,} | {m['ops_s']:>9.0f} "
+              f"{m['ms_p50']:>8.3f} {m['ms_p99']:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: PNG rasterizer (NumPy ตรงสู่ขนาดเป้าหมาย) เทียบกับเส้นทางเดิม
+(qr.make_image -> invert ด้วย point -> paste ชั้นสี -> resize NEAREST)
+
+รัน:  python -m benchmarks.render [--repeat 5]
+- latency: ค่ามัธยฐาน (ms) ต่อการเรนเดอร์ 1 ภาพ (ไม่รวม PNG encode)
+- peak:    หน่วยความจำสูงสุดที่เพิ่มขึ้น (MB) วัดจาก VmHWM ในโปรเซสลูกแยกต่อกรณี
+           (tracemalloc มองไม่เห็น buffer ของ PIL จึงไม่ใช้; ต้องการ Linux /proc)
+"""
+
+from __future__ import annotations
+import argparse
+import math
+import multiprocessing as mp
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("APP_DB_PATH", os.path.join(tempfile.gettempdir(), "qr_bench.db"))
+
+import numpy as np  # noqa: E402
+from PIL import Image, ImageColor  # noqa: E402
+from qrcode import QRCode  # noqa: E402
+
+import app as qrapp  # noqa: E402
+
+SIZES = (256, 512, 1024, 2048, 4096)
+STYLES = ("solid", "linear", "radial")
+DATA = "https://example.com/some/long/path?utm_source=print&utm_campaign=benchmark"
+
+
+def _legacy_gradient(size, c1, c2, radial):
+    w, h = size
+    if radial:
+        cx, cy = (w - 1) / 2.0, (h - 1) / 2.0
+        yy, xx = np.ogrid[0:h, 0:w]
+        t = np.sqrt((xx - cx) ** 2 + (yy - cy) ** 2)
+        t = (t / t.max()).astype(np.float32)
+    else:
+        x = np.linspace(0.0, 1.0, w, dtype=np.float32)
+        y = np.linspace(0.0, 1.0, h, dtype=np.float32)
+        t = (x + y[:, None]) * 0.5
+    c1 = np.array(c1, dtype=np.float32)
+    c2 = np.array(c2, dtype=np.float32)
+    rgb = (c1 + (c2 - c1) * t[..., None]).clip(0, 255).astype(np.uint8)
+    a = np.full((h, w, 1), 255, dtype=np.uint8)
+    return Image.fromarray(np.concatenate([rgb, a], axis=2), "RGBA")
+
+
+def legacy_png(data, fill_color="#000", back_color="#fff", size_px=None, ecc="H",
+               fill_style="solid", fill_color2="#000000"):
+    """สำเนาเส้นทางเรนเดอร์ก่อนเปลี่ยน (ไม่รวมโลโก้) ไว้เทียบผล"""
+    qr = QRCode(version=5, error_correction=qrapp.parse_ecc(ecc), box_size=10, border=4)
+    qr.add_data(data)
+    qr.make(fit=True)
+    if size_px:
+        qr.box_size = max(1, math.ceil(size_px / (qr.modules_count + qr.border * 2)))
+    mask = qr.make_image(fill_color="#000", back_color="#fff").convert("L").point(lambda p: 255 - p)
+    w, h = mask.size
+    base = Image.new("RGBA", (w, h), (*ImageColor.getrgb(back_color), 255))
+    c1 = ImageColor.getrgb(fill_color)
+    if fill_style in ("linear", "radial"):
+        c2 = ImageColor.getrgb(fill_color2)
+        color_img = _legacy_gradient((w, h), c1, c2, fill_style == "radial")
+    else:
+        color_img = Image.new("RGBA", (w, h), (*c1, 255))
+    base.paste(color_img, (0, 0), mask)
+    if size_px and base.size != (size_px, size_px):
+        base = base.resize((size_px, size_px), Image.NEAREST)
+    return base
+
+
+def current_png(data, **kw):
+    return qrapp.generate_qr_code_png(data, None, **kw)
+
+
+def _vm_hwm_kb() -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    return 0
+
+
+def _peak_child(name: str, kw: dict, q) -> None:
+    fn = globals()[name]
+    fn(DATA, **{**kw, "size_px": 64})  # โหลดโมดูล/cache ก่อนวัด baseline
+    base = _vm_hwm_kb()
+    fn(DATA, **kw)
+    q.put((_vm_hwm_kb() - base) / 1024)
+
+
+def peak_mb(name: str, kw: dict) -> float:
+    ctx = mp.get_context("spawn")
+    q = ctx.Queue()
+    p = ctx.Process(target=_peak_child, args=(name, kw, q))
+    p.start()
+    value = q.get()
+    p.join()
+    return value
+
+
+def measure(name: str, repeat: int, **kw) -> tuple[float, float]:
+    fn = globals()[name]
+    fn(DATA, **kw)  # warm-up (matrix cache)
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(DATA, **kw)
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times), peak_mb(name, kw)
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args(argv)
+
+    print(f"{'style':<7} {'size':>5} | {'legacy ms':>9} {'peak MB':>8} | {'numpy ms':>9} {'peak MB':>8}")
+    for style in STYLES:
+        for size in SIZES:
+            kw = dict(fill_color="#1e88e5", back_color="#ffffff", size_px=size,
+                      ecc="H", fill_style=style, fill_color2="#e53935")
+            lt, lp = measure("legacy_png", args.repeat, **kw)
+            ct, cp = measure("current_png", args.repeat, **kw)
+            print(f"{style:<7} {size:>5} | {lt:>9.2f} {lp:>8.1f} | {ct:>9.2f} {cp:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite: รวมทุกชุดวัด (เรนเดอร์ / redirect / แดชบอร์ด) แล้วเขียนผลเป็น JSON ไว้เทียบข้ามรอบ
+
+รัน:  python -m benchmarks.suite --out results.json [--only render,redirect,dashboard] [--quick]
+      python -m benchmarks.compare base.json results.json
+- render: generate_qr_code_png / generate_qr_code_svg ทุกชุด size_px × ecc × fill_style × logo
+  latency (ms p50/p95 แบบ cache อุ่นแล้ว), cold_ms (ล้าง matrix/gradient/logo cache ก่อน),
+  peak_mb (RSS สูงสุดที่เพิ่มขึ้นระหว่างเรนเดอร์ครั้งแรก วัดในโปรเซสลูกแยกต่อกรณี),
+  bytes ของไฟล์ผลลัพธ์ (PNG ใช้ preset ตอนดาวน์โหลด)
+- redirect / dashboard: ดู benchmarks/redirect.py และ benchmarks/dashboard.py
+ทำงาน offline ทั้งหมด (ข้อมูลสังเคราะห์ลง DB ใน temp — ไม่แตะ data/app.db)
+"""
+
+from __future__ import annotations
+import argparse
+import itertools
+import os
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("APP_DB_PATH", os.path.join(tempfile.gettempdir(), "qr_bench.db"))
+
+from PIL import Image, ImageDraw  # noqa: E402
+
+import app as qrapp  # noqa: E402
+from benchmarks import _util, dashboard, redirect  # noqa: E402
+
+DATA = "https://example.com/some/long/path?utm_source=print&utm_campaign=benchmark"
+SIZES = (256, 1024, 2048)
+ECCS = ("L", "M", "Q", "H")
+STYLES = ("solid", "linear", "radial")
+FORMATS = ("png", "svg")
+QUICK = {"sizes": (512,), "eccs": ("M", "H"), "links": "1e4,1e5", "rows": "2e5", "repeat": 3}
+
+
+def _bench_logo() -> str:
+    """โลโก้สังเคราะห์ (RGBA มีขอบโปร่งใส ให้ผ่านขั้น trim ด้วย) เก็บใน temp"""
+    path = os.path.join(tempfile.gettempdir(), "qr_bench_logo.png")
+    if not os.path.exists(path):
+        img = Image.new("RGBA", (600, 400), (0, 0, 0, 0))
+        d = ImageDraw.Draw(img)
+        d.ellipse((40, 20, 560, 380), fill=(229, 57, 53, 255))
+        d.rectangle((200, 150, 400, 250), fill=(255, 255, 255, 255))
+        img.save(path)
+    return path
+
+
+def _clear_render_caches() -> None:
+    for cache in (qrapp.MATRIX_CACHE, qrapp.GRADIENT_CACHE, qrapp.LOGO_CACHE):
+        cache.clear()
+
+
+def _render(fmt: str, kw: dict):
+    render = qrapp.generate_qr_code_png if fmt == "png" else qrapp.generate_qr_code_svg
+    return render(DATA, **kw)
+
+
+def _render_peak(fmt: str, kw: dict) -> float | None:
+    """
+    (รันในโปรเซสลูก) อุ่นโมดูล/โค้ดด้วยภาพเล็ก ล้าง cache แล้ววัด peak ของการเรนเดอร์จริง 1 ครั้ง
+    ใช้ค่ามากกว่าระหว่าง VmHWM (เห็น buffer ของ PIL) กับ tracemalloc (เห็น str/numpy ที่เล็กกว่าหน้า
+    หน่วยความจำซึ่ง malloc ใช้ซ้ำจากรอบอุ่นเครื่องจน RSS ไม่ขยับ)
+    """
+    _render(fmt, {**kw, "size_px": 64})
+    _clear_render_caches()
+    tracemalloc.start()
+    rss = _util.peak_rss_mb(lambda: _render(fmt, kw))
+    traced = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 2)
+    tracemalloc.stop()
+    return traced if rss is None else max(rss, traced)
+
+
+def run_render(sizes, eccs, repeat: int) -> list[dict]:
+    logo_path = _bench_logo()
+    results = []
+    for fmt, size, ecc, style, logo in itertools.product(FORMATS, sizes, eccs, STYLES, (False, True)):
+        kw = dict(logo_path=logo_path if logo else None, fill_color="#1e88e5", back_color="#ffffff",
+                  size_px=size, ecc=ecc, fill_style=style, fill_color2="#e53935")
+        fn = lambda: _render(fmt, kw)  # noqa: E731
+
+        _clear_render_caches()
+        cold = _util.latency(fn, 1, warmup=0)["ms_p50"]
+        stats = _util.latency(fn, repeat)
+        peak = _util.in_fresh_process(_render_peak, fmt, kw)
+        out = fn()
+        if fmt == "png":
+            encode = _util.latency(lambda: qrapp._encode_png(out, qrapp.DOWNLOAD_ENCODE_PRESET), repeat)
+            nbytes = len(qrapp._encode_png(out, qrapp.DOWNLOAD_ENCODE_PRESET))
+            extra = {"encode_ms_p50": encode["ms_p50"], "mode": out.mode}
+        else:
+            nbytes = len(out)
+            extra = {}
+        case = {"format": fmt, "size_px": size, "ecc": ecc, "fill_style": style, "logo": logo}
+        results.append(_util.result("render", case, cold_ms=round(cold, 4), peak_mb=peak,
+                                    bytes=nbytes, **stats, **extra))
+        _util.log(f"render {fmt} {size} {ecc} {style:<6} logo={int(logo)}: "
+                  f"{stats['ms_p50']:.2f} ms, peak {peak} MB")
+    return results
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--out", default="-", help="ไฟล์ผล JSON (- = stdout)")
+    ap.add_argument("--only", default="render,redirect,dashboard")
+    ap.add_argument("--quick", action="store_true", help="ชุดเล็ก (ไว้ลองรัน/CI)")
+    ap.add_argument("--repeat", type=int, default=None)
+    ap.add_argument("--sizes", default=None, help="เช่น 256,1024,2048")
+    ap.add_argument("--links", default=None, help="จำนวนลิงก์สั้น เช่น 1e5,1e6,1e7")
+    ap.add_argument("--requests", type=int, default=20000)
+    ap.add_argument("--rows", default=None, help="จำนวนแถว analytics เช่น 2e6")
+    ap.add_argument("--days", type=int, default=730)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args(argv)
+
+    preset = QUICK if args.quick else {"sizes": SIZES, "eccs": ECCS, "links": "1e5,1e6", "rows": "2e6", "repeat": 10}
+    repeat = args.repeat or preset["repeat"]
+    sizes = _util.parse_counts(args.sizes) if args.sizes else preset["sizes"]
+    only = {x.strip() for x in args.only.split(",")}
+
+    results = []
+    if "render" in only:
+        results += run_render(sizes, preset["eccs"], repeat)
+    if "redirect" in only:
+        results += redirect.run(_util.parse_counts(args.links or preset["links"]), args.requests, args.seed)
+    if "dashboard" in only:
+        rows = _util.parse_counts(args.rows or preset["rows"])[0]
+        results += dashboard.run(rows, args.days, repeat * 2, args.seed)
+
+    _util.dump({"meta": _util.run_meta(vars(args)), "results": results}, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: SVG writer (merge โมดูลเป็นสี่เหลี่ยม + stream) เทียบกับเส้นทางเดิม
+(qrcode SvgPathImage — path ย่อยหนึ่งชิ้นต่อโมดูล ผ่าน ElementTree)
+
+รัน:  python -m benchmarks.svg [--repeat 20]
+- latency: ค่ามัธยฐาน (ms) ต่อการสร้าง 1 ไฟล์ (matrix อยู่ใน cache แล้ว — วัดเฉพาะการเขียน SVG)
+- size:    ขนาดไฟล์ (KB) ก่อน/หลัง และแบบ gzip (ที่ส่งผ่าน HTTP/ZIP จริง)
+"""
+
+from __future__ import annotations
+import argparse
+import gzip
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("APP_DB_PATH", os.path.join(tempfile.gettempdir(), "qr_bench.db"))
+
+from qrcode import QRCode  # noqa: E402
+from qrcode.image.svg import SvgPathImage  # noqa: E402
+
+import app as qrapp  # noqa: E402
+
+# ความยาวข้อมูลต่างกัน -> version ต่างกัน (จำนวนโมดูลต่อด้าน)
+PAYLOADS = {
+    "url": "https://example.com/some/long/path?utm_source=print&utm_campaign=benchmark",
+    "vcard": "BEGIN:VCARD\nVERSION:3.0\nN:Doe;John\nTEL:+66800000000\nEMAIL:john@example.com\n"
+             "ORG:Example Co\nADR:;;1 Example Rd;Bangkok;;10110;TH\nEND:VCARD",
+    "text-1k": "x" * 1000,
+}
+ECCS = ("L", "H")
+
+
+def legacy_svg(data, ecc="H", **_):
+    """สำเนาเส้นทางเดิม (ไม่มี cache ผลลัพธ์) ไว้เทียบ"""
+    m = qrapp.qr_matrix(data, ecc)
+    qr = QRCode(version=m.version, box_size=10, border=qrapp.QR_BORDER)
+    qr.modules = m.modules().tolist()
+    qr.modules_count = m.count
+    qr.data_cache = []
+    return qr.make_image(image_factory=SvgPathImage, fill_color="#1e88e5", back_color="#ffffff").to_string()
+
+
+def current_svg(data, ecc="H", fill_style="solid"):
+    return qrapp.generate_qr_code_svg(data, None, "#1e88e5", "#ffffff", ecc=ecc,
+                                      fill_style=fill_style, fill_color2="#e53935")
+
+
+def measure(fn, data, repeat: int, **kw) -> tuple[float, bytes]:
+    out = fn(data, **kw)  # warm-up (matrix cache)
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(data, **kw)
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times), out
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args(argv)
+
+    print(f"{'payload':<8} {'ecc':>3} {'mods':>4} | {'legacy ms':>9} {'KB':>7} {'gz KB':>6} "
+          f"| {'writer ms':>9} {'KB':>7} {'gz KB':>6} | {'linear ms':>9}")
+    for label, data in PAYLOADS.items():
+        for ecc in ECCS:
+            lt, lb = measure(legacy_svg, data, args.repeat, ecc=ecc)
+            ct, cb = measure(current_svg, data, args.repeat, ecc=ecc)
+            gt, _ = measure(current_svg, data, args.repeat, ecc=ecc, fill_style="linear")
+            mods = qrapp.qr_matrix(data, ecc).count
+            print(f"{label:<8} {ecc:>3} {mods:>4} | {lt:>9.2f} {len(lb) / 1024:>7.1f} "
+                  f"{len(gzip.compress(lb)) / 1024:>6.1f} | {ct:>9.2f} {len(cb) / 1024:>7.1f} "
+                  f"{len(gzip.compress(cb)) / 1024:>6.1f} | {gt:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
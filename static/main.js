@@ -137,6 +137,76 @@ function handleAssetFileChange(type) {
   enableAssetBtn(type, !tooBig);
 }
 
+// ไฟล์ใหญ่กว่านี้อัปโหลดแบบแบ่งชิ้น (ต่อจากจุดเดิมได้ถ้าเน็ตหลุด)
+const CHUNKED_UPLOAD_MIN = 4 * 1024 * 1024;
+const UPLOAD_RETRIES = 5;
+
+async function uploadAssetChunked(type, f) {
+  const key = `upload:${type}:${f.name}:${f.size}:${f.lastModified}`;
+  let state = null;
+  const saved = localStorage.getItem(key);
+  if (saved) {
+    // มี session ค้างจากครั้งก่อน -> ถาม offset แล้วอัปต่อ
+    const r = await fetch(`/upload_asset/sessions/${encodeURIComponent(saved)}`);
+    if (r.ok) state = await r.json();
+  }
+  if (!state) {
+    const r = await fetch(`/upload_asset/${encodeURIComponent(type)}/sessions`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ filename: f.name, size: f.size, mimetype: f.type }),
+    });
+    state = await r.json().catch(() => ({}));
+    if (!r.ok) throw new Error(state?.error || "อัปโหลดไม่สำเร็จ");
+    localStorage.setItem(key, state.upload_id);
+  }
+
+  const chunk = Math.max(state.chunk_size || 0, 1024 * 1024);
+  let offset = state.offset;
+  let retries = 0;
+  while (true) {
+    let resp, data;
+    try {
+      resp = await fetch(
+        `/upload_asset/sessions/${encodeURIComponent(state.upload_id)}?offset=${offset}`,
+        { method: "PUT", body: f.slice(offset, offset + chunk) }
+      );
+      data = await resp.json().catch(() => ({}));
+    } catch (err) {
+      if (++retries > UPLOAD_RETRIES) throw err;
+      await new Promise((r) => setTimeout(r, 1000 * retries));
+      continue;
+    }
+    if (resp.status === 409 && typeof data.offset === "number") {
+      offset = data.offset;
+      continue;
+    }
+    if (!resp.ok) {
+      localStorage.removeItem(key);
+      throw new Error(data?.error || "อัปโหลดไม่สำเร็จ");
+    }
+    retries = 0;
+    if (data.url) {
+      localStorage.removeItem(key);
+      return data;
+    }
+    offset = data.offset;
+    setAssetPill(type, `กำลังอัปโหลด ${f.name} — ${Math.floor((offset / f.size) * 100)}%`);
+  }
+}
+
+async function uploadAssetSimple(type, f) {
+  const fd = new FormData();
+  fd.append("file", f);
+  const resp = await fetch(`/upload_asset/${encodeURIComponent(type)}`, {
+    method: "POST",
+    body: fd,
+  });
+  const data = await resp.json().catch(() => ({}));
+  if (!resp.ok) throw new Error(data?.error || "อัปโหลดไม่สำเร็จ");
+  return data;
+}
+
 function uploadAsset(type) {
   const cfg = ASSET_CFG[type];
   const input = document.getElementById(cfg.inputId);
@@ -146,22 +216,16 @@ function uploadAsset(type) {
   }
   const f = input.files[0];
 
-  const fd = new FormData();
-  fd.append("file", f);
-
   const btn = document.getElementById(cfg.btnId);
   if (btn) {
     btn.disabled = true;
     btn.textContent = "กำลังอัปโหลด...";
   }
 
-  fetch(`/upload_asset/${encodeURIComponent(type)}`, {
-    method: "POST",
-    body: fd,
-  })
-    .then(async (resp) => {
-      const data = await resp.json().catch(() => ({}));
-      if (!resp.ok) throw new Error(data?.error || "อัปโหลดไม่สำเร็จ");
+  const upload =
+    f.size > CHUNKED_UPLOAD_MIN ? uploadAssetChunked(type, f) : uploadAssetSimple(type, f);
+  upload
+    .then((data) => {
       // ตั้ง URL ให้ input ของประเภทนั้น ๆ
       const urlInput = document.getElementById(cfg.urlInputId);
       const finalUrl = data.short_url || data.url;
@@ -291,6 +355,7 @@ function getRecommendedLogoEdge() {
 
 /* ===== Global (for preview & drop) ===== */
 let previewAbortController = null;
+let previewEtag = null; // ETag ของภาพพรีวิวล่าสุด (ส่งกลับเป็น If-None-Match)
 
 /* ===== Upload (shared) ===== */
 function uploadLogoWithFile(file) {
@@ -373,10 +438,8 @@ function analyzeAndPreviewLocalLogo(file) {
   reader.readAsDataURL(file);
 }
 
-/* ===== Preview (debounce + abort) ===== */
-function updatePreview() {
-  updateDataPreviewOnly();
-
+/* ===== Preview: เรนเดอร์ฝั่งเซิร์ฟเวอร์ (สำรอง เมื่อวาดเองไม่ได้) ===== */
+function updatePreviewServer() {
   const form = document.getElementById("qrForm");
   const formData = new FormData(form);
 
@@ -411,13 +474,23 @@ function updatePreview() {
   fetch("/preview_qr", {
     method: "POST",
     body: formData,
+    headers: {
+      Accept: "image/webp,image/png;q=0.9", // เซิร์ฟเวอร์เลือก WebP ให้เมื่อคุ้มกว่า
+      ...(previewEtag ? { "If-None-Match": previewEtag } : {}),
+    },
     signal: previewAbortController.signal,
   })
-    .then((resp) => (resp.ok ? resp.blob() : null))
+    .then((resp) => {
+      // 304 = ภาพเดิม ไม่ต้องเปลี่ยน src
+      if (resp.status === 304 || !resp.ok) return null;
+      previewEtag = resp.headers.get("ETag");
+      return resp.blob();
+    })
     .then((blob) => {
       if (!blob) return;
-      const url = URL.createObjectURL(blob);
-      document.getElementById("qrPreview").src = url;
+      const img = document.getElementById("qrPreview");
+      if (img.src.startsWith("blob:")) URL.revokeObjectURL(img.src);
+      img.src = URL.createObjectURL(blob);
 
       const qrBG = document.getElementById("qrPreviewBG");
       if (transparentChecked) qrBG.classList.add("qr-preview-bg");
@@ -427,6 +500,180 @@ function updatePreview() {
       if (err?.name !== "AbortError") console.error(err);
     });
 }
+/* ===== Preview: วาดเองบน canvas จาก matrix =====
+   - ขอ matrix (/api/qr/matrix) เฉพาะตอน data/ecc เปลี่ยน; สี/ไล่สี/ขนาด/โลโก้ วาดใหม่ในเครื่อง
+   - วาดแบบเดียวกับ generate_qr_code_png: ขอบโมดูล floor(i*size/n), ไล่สีแนวทแยง/วงกลม,
+     โลโก้ 1/4 ของด้าน (ตัดขอบโปร่งใส + padding 13%) บนพื้นขาว */
+const MATRIX_GET_MAX_URL = 2000; // ยาวกว่านี้ส่งเป็น POST (กัน URL ยาวเกิน)
+const LOGO_PAD_RATIO = 0.13;
+const matrixCache = new Map(); // `${ecc}|${data}` -> Promise<{count, border, bits}>
+const logoImageCache = new Map(); // ชื่อโลโก้ -> Promise<canvas ที่ตัดขอบโปร่งใสแล้ว>
+let previewSeq = 0;
+
+function fetchQrMatrix(data, ecc) {
+  const key = `${ecc}|${data}`;
+  if (matrixCache.has(key)) return matrixCache.get(key);
+
+  const qs = new URLSearchParams({ data, ecc }).toString();
+  const req =
+    qs.length + 16 <= MATRIX_GET_MAX_URL
+      ? fetch(`/api/qr/matrix?${qs}`) // GET -> browser cache ตาม ETag/max-age
+      : fetch("/api/qr/matrix", { method: "POST", body: new URLSearchParams({ data, ecc }) });
+  const p = req
+    .then((resp) => resp.json().then((j) => ({ ok: resp.ok, j })))
+    .then(({ ok, j }) => {
+      if (!ok || !j.success) throw new Error(j.error || "matrix error");
+      const raw = atob(j.bits);
+      const bits = new Uint8Array(raw.length);
+      for (let i = 0; i < raw.length; i++) bits[i] = raw.charCodeAt(i);
+      return { count: j.count, border: j.border, bits };
+    });
+  p.catch(() => matrixCache.delete(key)); // ไม่ cache ความล้มเหลว
+  matrixCache.set(key, p);
+  if (matrixCache.size > 32) matrixCache.delete(matrixCache.keys().next().value);
+  return p;
+}
+
+function loadTrimmedLogo(name) {
+  if (logoImageCache.has(name)) return logoImageCache.get(name);
+  const p = new Promise((resolve, reject) => {
+    const img = new Image();
+    img.onload = () => {
+      const c = document.createElement("canvas");
+      c.width = img.naturalWidth;
+      c.height = img.naturalHeight;
+      const ctx = c.getContext("2d");
+      ctx.drawImage(img, 0, 0);
+      // ตัดขอบโปร่งใส (เหมือน trim_transparent ฝั่งเซิร์ฟเวอร์)
+      const { data, width, height } = ctx.getImageData(0, 0, c.width, c.height);
+      let x0 = width, y0 = height, x1 = -1, y1 = -1;
+      for (let y = 0; y < height; y++) {
+        for (let x = 0; x < width; x++) {
+          if (data[(y * width + x) * 4 + 3]) {
+            if (x < x0) x0 = x;
+            if (x > x1) x1 = x;
+            if (y < y0) y0 = y;
+            if (y > y1) y1 = y;
+          }
+        }
+      }
+      if (x1 < 0) return resolve(c);
+      const t = document.createElement("canvas");
+      t.width = x1 - x0 + 1;
+      t.height = y1 - y0 + 1;
+      t.getContext("2d").drawImage(c, x0, y0, t.width, t.height, 0, 0, t.width, t.height);
+      resolve(t);
+    };
+    img.onerror = () => reject(new Error("logo load failed"));
+    img.src = `/static/logo/${encodeURIComponent(name)}`;
+  });
+  p.catch(() => logoImageCache.delete(name));
+  logoImageCache.set(name, p);
+  return p;
+}
+
+function drawQrCanvas(m, opts, logo) {
+  const n = m.count + 2 * m.border;
+  const size = Math.max(opts.size, n); // อย่างน้อย 1 px ต่อโมดูล (เหมือนฝั่งเซิร์ฟเวอร์)
+  const edge = (i) => Math.floor((i * size) / n);
+  const canvas = document.createElement("canvas");
+  canvas.width = canvas.height = size;
+  const ctx = canvas.getContext("2d");
+
+  if (!opts.transparent) {
+    ctx.fillStyle = opts.back;
+    ctx.fillRect(0, 0, size, size);
+  }
+
+  if (opts.style === "linear") {
+    const g = ctx.createLinearGradient(0, 0, size - 1, size - 1);
+    g.addColorStop(0, opts.fill);
+    g.addColorStop(1, opts.fill2);
+    ctx.fillStyle = g;
+  } else if (opts.style === "radial") {
+    const c = (size - 1) / 2;
+    const g = ctx.createRadialGradient(c, c, 0, c, c, Math.SQRT2 * c);
+    g.addColorStop(0, opts.fill);
+    g.addColorStop(1, opts.fill2);
+    ctx.fillStyle = g;
+  } else {
+    ctx.fillStyle = opts.fill;
+  }
+
+  // โมดูลเข้มที่ติดกันในแถวรวมเป็นสี่เหลี่ยมเดียว แล้ว fill ครั้งเดียว
+  ctx.beginPath();
+  for (let y = 0; y < m.count; y++) {
+    const top = edge(y + m.border);
+    const h = edge(y + m.border + 1) - top;
+    let x = 0;
+    while (x < m.count) {
+      const i = y * m.count + x;
+      if (!((m.bits[i >> 3] >> (7 - (i & 7))) & 1)) {
+        x++;
+        continue;
+      }
+      const start = x;
+      for (x++; x < m.count; x++) {
+        const j = y * m.count + x;
+        if (!((m.bits[j >> 3] >> (7 - (j & 7))) & 1)) break;
+      }
+      const left = edge(start + m.border);
+      ctx.rect(left, top, edge(x + m.border) - left, h);
+    }
+  }
+  ctx.fill();
+
+  if (logo) {
+    const box = Math.floor(size / 4);
+    const pos = Math.floor((size - box) / 2);
+    if (!opts.transparent) {
+      ctx.fillStyle = "#ffffff";
+      ctx.fillRect(pos, pos, box + 1, box + 1);
+    }
+    const max = box - 2 * Math.floor(box * LOGO_PAD_RATIO);
+    const w = logo.width >= logo.height ? max : Math.floor((max * logo.width) / logo.height);
+    const h = logo.width >= logo.height ? Math.floor((max * logo.height) / logo.width) : max;
+    ctx.imageSmoothingQuality = "high";
+    ctx.drawImage(logo, pos + Math.floor((box - w) / 2), pos + Math.floor((box - h) / 2), w, h);
+  }
+  return canvas;
+}
+
+function updatePreview() {
+  updateDataPreviewOnly();
+
+  const form = document.getElementById("qrForm");
+  const data = document.getElementById("data").value || "";
+  const ecc = document.getElementById("ecc")?.value || "H";
+  const logoName = form.querySelector("input[name='logo']").value || "";
+  const opts = {
+    size: parseInt(document.getElementById("size_px")?.value, 10) || 512,
+    transparent: form.querySelector("#transparent").checked,
+    style: document.getElementById("fill_style")?.value || "solid",
+    fill: form.querySelector("[name='fill_color']")?.value || "#000000",
+    fill2: document.getElementById("fill_color2")?.value || "#000000",
+    back: form.querySelector("[name='back_color']")?.value || "#ffffff",
+  };
+  const seq = ++previewSeq;
+
+  Promise.all([fetchQrMatrix(data, ecc), logoName ? loadTrimmedLogo(logoName) : null])
+    .then(([m, logo]) => {
+      if (seq !== previewSeq) return; // มีการเปลี่ยนค่าใหม่กว่าแล้ว
+      const canvas = drawQrCanvas(m, opts, logo);
+      canvas.toBlob((blob) => {
+        if (!blob || seq !== previewSeq) return;
+        const img = document.getElementById("qrPreview");
+        if (img.src.startsWith("blob:")) URL.revokeObjectURL(img.src);
+        img.src = URL.createObjectURL(blob);
+        document.getElementById("qrPreviewBG").classList.toggle("qr-preview-bg", opts.transparent);
+      }, "image/png");
+    })
+    .catch((err) => {
+      if (seq !== previewSeq) return;
+      console.warn("local preview failed, falling back to server:", err);
+      updatePreviewServer();
+    });
+}
 const debouncedUpdatePreview = debounce(updatePreview, PREVIEW_DEBOUNCE_MS);
 
 /* ===== Misc UI ===== */
@@ -0,0 +1,46 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# แยกฐานข้อมูล/ไฟล์ของชุดทดสอบออกจาก data/ และ static/ ของ repo
+# ต้องตั้งก่อน import app (app อ่าน ENV และสร้างโฟลเดอร์ตอน import)
+ROOT = Path(__file__).resolve().parent.parent
+_TMP = Path(tempfile.mkdtemp(prefix="qr-tests-"))
+os.environ["APP_DB_PATH"] = str(_TMP / "data" / "app.db")
+os.environ["ADMIN_KEY"] = "test-key"
+os.environ.setdefault("BATCH_WORKERS", "2")
+os.chdir(_TMP)  # path "static/..." ใน app เป็น relative
+sys.path.insert(0, str(ROOT))
+
+import app as qrapp  # noqa: E402
+
+@pytest.fixture
+def asset_dirs(tmp_path, monkeypatch):
+    """โฟลเดอร์ asset/logo แยกต่อเทสต์ (แคตตาล็อกจะเห็นเฉพาะไฟล์ของเทสต์นั้น)"""
+    dirs = {}
+    for atype in qrapp.ASSET_FOLDERS:
+        d = tmp_path / "files" / atype
+        d.mkdir(parents=True)
+        monkeypatch.setitem(qrapp.ASSET_FOLDERS, atype, str(d))
+        dirs[atype] = d
+    logo = tmp_path / "logo"
+    logo.mkdir()
+    monkeypatch.setattr(qrapp, "UPLOAD_FOLDER", str(logo))
+    dirs["logo"] = logo
+    return dirs
+
+
+@pytest.fixture
+def client(asset_dirs):
+    qrapp.RENDER_CACHE.clear()
+    return qrapp.app.test_client()
+
+
+@pytest.fixture
+def admin_client(client):
+    with client.session_transaction() as sess:
+        sess["is_admin"] = True
+    return client
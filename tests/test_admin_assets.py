@@ -0,0 +1,99 @@
+import os
+
+import app
+
+
+def _make_files(folder, n, prefix="pg"):
+    names = []
+    for i in range(n):
+        p = folder / f"{prefix}{i:02d}.mp3"
+        p.write_bytes(os.urandom(100 + i))
+        os.utime(p, (1_700_000_000 + i, 1_700_000_000 + i))
+        names.append(p.name)
+    return names
+
+
+def _pages(client, **params):
+    seen, cursor = [], None
+    while True:
+        q = dict(params, **({"cursor": cursor} if cursor else {}))
+        j = client.get("/admin/api/assets", query_string=q).get_json()
+        assert j["success"] is True
+        seen.append([it["name"] for it in j["items"]])
+        cursor = j["next_cursor"]
+        if not cursor:
+            return seen, j
+
+
+def test_assets_api_requires_admin(client):
+    assert client.get("/admin/api/assets").status_code == 401
+
+
+def test_keyset_pagination_covers_every_row_once(admin_client, asset_dirs):
+    names = _make_files(asset_dirs["mp3"], 7)
+    app.reconcile_assets()
+
+    pages, last = _pages(admin_client, type="mp3", limit=3, sort="mtime", order="desc")
+    assert [len(p) for p in pages] == [3, 3, 1]
+    flat = [n for p in pages for n in p]
+    assert flat == sorted(names, reverse=True)
+    assert last["matched"] == 7
+
+    pages, _ = _pages(admin_client, type="mp3", limit=2, sort="size", order="asc")
+    assert [n for p in pages for n in p] == names
+
+
+def test_pagination_filters_and_cursor_validation(admin_client, asset_dirs):
+    _make_files(asset_dirs["mp3"], 3, prefix="alpha")
+    _make_files(asset_dirs["mp3"], 2, prefix="beta")
+    app.reconcile_assets()
+
+    j = admin_client.get("/admin/api/assets", query_string={"q": "beta", "limit": 1}).get_json()
+    assert j["matched"] == 2
+    assert j["items"][0]["name"].startswith("beta")
+
+    # cursor ของการเรียงอื่นใช้ไม่ได้
+    bad = admin_client.get("/admin/api/assets",
+                           query_string={"sort": "name", "cursor": j["next_cursor"]})
+    assert bad.status_code == 400
+    assert admin_client.get("/admin/api/assets?sort=bogus").status_code == 400
+    assert admin_client.get("/admin/api/assets?cursor=garbage").status_code == 400
+
+
+def test_reconcile_tracks_added_and_removed_files(asset_dirs):
+    (name,) = _make_files(asset_dirs["mp3"], 1, prefix="rc")
+    app.reconcile_assets()
+    rows = {r["name"] for r in app.query_assets("mp3")}
+    assert name in rows
+
+    (asset_dirs["mp3"] / name).unlink()
+    app.reconcile_assets()
+    assert name not in {r["name"] for r in app.query_assets("mp3")}
+
+
+def test_reconcile_keeps_file_created_during_scan(asset_dirs, monkeypatch):
+    """ไฟล์ที่อัปโหลดเสร็จระหว่างสแกน (ไม่อยู่ในผลสแกนแต่มีในแคตตาล็อก/ดิสก์) ต้องไม่ถูกลบออก"""
+    (name,) = _make_files(asset_dirs["mp3"], 1, prefix="race")
+    app.catalog_upsert("mp3", name)
+    real_scandir = os.scandir
+
+    def scandir_missing(path):
+        it = real_scandir(path)
+        if os.path.samefile(path, asset_dirs["mp3"]):
+            entries = [e for e in it if e.name != name]
+            it.close()
+            return _Entries(entries)
+        return it
+
+    monkeypatch.setattr(app.os, "scandir", scandir_missing)
+    result = app.reconcile_assets()
+    assert result["removed"] == 0
+    assert name in {r["name"] for r in app.query_assets("mp3")}
+
+
+class _Entries(list):
+    def __enter__(self):
+        return iter(self)
+
+    def __exit__(self, *exc):
+        return False
@@ -0,0 +1,64 @@
+import io
+import json
+import zipfile
+
+import app
+
+CSV = (
+    "data,filename,format,fill_color\n"
+    "https://a.example,first,png,\n"
+    "https://b.example,first,svg,#ff0000\n"
+    ",empty,png,\n"
+    "https://c.example,bad,png,red;x\n"
+    "https://d.example,,svg,\n"
+)
+
+
+def _zip(resp):
+    assert resp.status_code == 200, resp.data[:200]
+    return zipfile.ZipFile(io.BytesIO(resp.data))
+
+
+def test_batch_requires_admin(client):
+    assert client.post("/api/qr/batch", data=CSV, content_type="text/csv").status_code == 401
+
+
+def test_batch_zip_and_manifest(admin_client):
+    resp = admin_client.post("/api/qr/batch?size_px=64", data=CSV, content_type="text/csv")
+    zf = _zip(resp)
+    assert resp.headers["X-Batch-Total"] == "5"
+    manifest = json.loads(zf.read("manifest.json"))
+    assert manifest["batch_id"] == resp.headers["X-Batch-Id"]
+    assert manifest["total"] == 5
+    assert manifest["failed"] == 2
+
+    items = manifest["items"]
+    assert [m["index"] for m in items] == [0, 1, 2, 3, 4]
+    assert [m["filename"] for m in items] == ["first.png", "first.svg", "empty.png", "bad.png", "qr_00005.svg"]
+    assert [m["ok"] for m in items] == [True, True, False, False, True]
+    assert items[2]["error"] == "missing data"
+    assert items[3]["error"].startswith("invalid color")
+
+    names = set(zf.namelist())
+    assert names == {"first.png", "first.svg", "qr_00005.svg", "manifest.json"}
+    assert zf.read("first.png").startswith(b"\x89PNG")
+    assert b'fill="#ff0000"' in zf.read("first.svg")
+
+    progress = admin_client.get(f"/api/qr/batch/{manifest['batch_id']}").get_json()
+    assert progress["status"] == "done"
+    assert progress["done"] == 5 and progress["failed"] == 2
+
+
+def test_batch_jsonl_dedups_filenames(admin_client):
+    body = "\n".join(json.dumps({"data": f"row{i}", "filename": "same"}) for i in range(3))
+    body += "\nnot json\n"
+    zf = _zip(admin_client.post("/api/qr/batch?input=jsonl&format=svg&size_px=32", data=body))
+    items = json.loads(zf.read("manifest.json"))["items"]
+    assert [m["filename"] for m in items[:3]] == ["same.svg", "same_2.svg", "same_3.svg"]
+    assert items[3]["ok"] is False and items[3]["error"].startswith("line 4")
+
+
+def test_batch_rejects_empty_and_oversized(admin_client, monkeypatch):
+    assert admin_client.post("/api/qr/batch", data="", content_type="text/csv").status_code == 400
+    monkeypatch.setattr(app, "BATCH_MAX_ITEMS", 1)
+    assert admin_client.post("/api/qr/batch", data=CSV, content_type="text/csv").status_code == 400
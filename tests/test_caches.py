@@ -0,0 +1,84 @@
+import time
+
+import pytest
+
+from app import BoundedLRUCache, HyperLogLog
+
+
+def test_lru_evicts_least_recently_used_by_bytes():
+    cache = BoundedLRUCache(max_bytes=10)
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    assert cache.get("a") == b"aaaa"  # a ถูกใช้ล่าสุด -> b เก่าสุด
+    cache.put("c", b"cccc")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"aaaa"
+    assert cache.get("c") == b"cccc"
+    st = cache.stats()
+    assert st["bytes"] == 8
+    assert st["evictions"] == 1
+
+
+def test_lru_replace_keeps_byte_count():
+    cache = BoundedLRUCache(max_bytes=10)
+    cache.put("a", b"aaaa")
+    cache.put("a", b"aa")
+    assert cache.stats()["bytes"] == 2
+    assert cache.stats()["entries"] == 1
+
+
+def test_lru_skips_oversize_values():
+    cache = BoundedLRUCache(max_bytes=4)
+    cache.put("small", b"ab")
+    cache.put("big", b"abcdef")
+    assert cache.get("big") is None
+    assert cache.get("small") == b"ab"  # ของเดิมไม่ถูกไล่ออกเพราะของที่ใส่ไม่ได้
+    assert cache.evictions == 0
+
+
+def test_lru_ttl_expiry():
+    cache = BoundedLRUCache(max_bytes=100, ttl=0.05)
+    cache.put("a", b"x")
+    assert cache.get("a") == b"x"
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    assert cache.expirations == 1
+    assert cache.stats()["bytes"] == 0
+
+
+def test_lru_discard_by_predicate():
+    cache = BoundedLRUCache(max_bytes=100)
+    for k in ("logo:a", "logo:b", "qr:c"):
+        cache.put(k, b"x")
+    assert cache.discard(lambda k: k.startswith("logo:")) == 2
+    assert cache.stats()["entries"] == 1
+
+
+def _hll(values):
+    h = HyperLogLog()
+    for v in values:
+        h.add(v)
+    return h
+
+
+@pytest.mark.parametrize("n", [50, 20_000])
+def test_hll_count_is_close(n):
+    est = _hll(f"v{i}" for i in range(n)).count()
+    assert abs(est - n) <= max(2, n * 0.05)
+
+
+def test_hll_merge_counts_union_once():
+    a = _hll(f"v{i}" for i in range(0, 6000))
+    b = _hll(f"v{i}" for i in range(3000, 9000))
+    a.merge(b)
+    assert abs(a.count() - 9000) <= 9000 * 0.05
+
+
+@pytest.mark.parametrize("n,kind", [(10, b"S"), (20_000, b"Z")])
+def test_hll_bytes_roundtrip(n, kind):
+    h = _hll(f"v{i}" for i in range(n))
+    blob = h.to_bytes()
+    assert blob[:1] == kind
+    back = HyperLogLog.from_bytes(blob)
+    assert (back.registers == h.registers).all()
+    assert HyperLogLog.from_bytes(None).count() == 0
@@ -0,0 +1,83 @@
+import secrets
+import time
+
+import pytest
+
+import app
+
+
+def _insert_job(status, created_at, heartbeat_at=None, started_at=None, owner_boot="dead-boot"):
+    job_id = secrets.token_urlsafe(12)
+    with app.get_db() as db:
+        db.execute(
+            """INSERT INTO jobs (id, kind, status, owner_pid, owner_boot, heartbeat_at, started_at,
+                                 mimetype, filename, total, done, created_at)
+               VALUES (?, 'render', ?, 1, ?, ?, ?, 'image/png', 'x.png', 1, 0, ?)""",
+            (job_id, status, owner_boot, heartbeat_at, started_at, created_at),
+        )
+    return job_id
+
+
+def test_recover_fails_jobs_with_expired_lease():
+    now = time.time()
+    stale = app.JOB_LEASE_S + 5
+    queued = _insert_job("queued", now - stale)
+    running = _insert_job("running", now - stale, heartbeat_at=now - stale, started_at=now - stale)
+    alive = _insert_job("running", now - stale, heartbeat_at=now, started_at=now - 1)
+
+    app._recover_jobs()
+
+    for job_id in (queued, running):
+        row = app._job_get(job_id)
+        assert row["status"] == "failed"
+        assert row["error"] == "interrupted"
+        assert row["finished_at"] is not None
+    assert app._job_get(alive)["status"] == "running"
+
+
+def test_recover_times_out_long_running_job():
+    now = time.time()
+    started = now - app.JOB_TIMEOUT_S - app.JOB_LEASE_S - 5
+    job_id = _insert_job("running", started, heartbeat_at=now, started_at=started)
+    app._recover_jobs()
+    row = app._job_get(job_id)
+    assert row["status"] == "failed"
+    assert row["error"] == "timed out"
+
+
+def test_heartbeat_extends_only_own_jobs():
+    old = time.time() - app.JOB_LEASE_S - 5
+    mine = _insert_job("queued", old, heartbeat_at=old, owner_boot=app._job_boot_id())
+    other = _insert_job("queued", old, heartbeat_at=old)
+    app._job_heartbeat()
+    app._recover_jobs()
+    assert app._job_get(mine)["status"] == "queued"
+    assert app._job_get(other)["status"] == "failed"
+    app._job_update(mine, status="failed")
+
+
+def test_queue_full_is_backpressure(monkeypatch):
+    monkeypatch.setattr(app, "JOB_QUEUE_MAX", 0)
+    assert app.submit_job("render", {}, "x.png", "image/png") is None
+
+
+def test_render_job_requires_admin(client):
+    resp = client.post("/api/jobs/render", json={"data": "hello"})
+    assert resp.status_code == 401
+
+
+def test_render_job_runs_to_artifact(admin_client):
+    resp = admin_client.post("/api/jobs/render", json={"data": "hello", "format": "svg", "size_px": 64})
+    assert resp.status_code == 202
+    status_url = resp.get_json()["status_url"]
+
+    job = admin_client.get(f"{status_url}?wait=30").get_json()
+    assert job["status"] == "done", job
+    art = admin_client.get(job["artifact_url"])
+    assert art.status_code == 200
+    assert art.data.rstrip().endswith(b"</svg>")
+
+
+@pytest.mark.parametrize("payload", [{"data": ""}, {"data": "x", "fill_color": "red;"}])
+def test_render_job_rejects_bad_params(admin_client, payload):
+    assert admin_client.post("/api/jobs/render", json=payload).status_code == 400
@@ -0,0 +1,104 @@
+import re
+
+import pytest
+
+import app
+
+TOO_LONG = "x" * 8000  # เกินความจุของ QR version 40 ทุกระดับ ECC
+
+
+def _form(**extra):
+    return {"data": "https://example.com", "size_px": "256", **extra}
+
+
+def test_preview_etag_and_304(client):
+    first = client.post("/preview_qr", data=_form())
+    assert first.status_code == 200
+    assert first.mimetype == "image/png"
+    etag = first.headers["ETag"].strip('"')
+
+    again = client.post("/preview_qr", data=_form(), headers={"If-None-Match": f'"{etag}"'})
+    assert again.status_code == 304
+    assert again.data == b""
+
+    other = client.post("/preview_qr", data=_form(fill_color="#123456"),
+                        headers={"If-None-Match": f'"{etag}"'})
+    assert other.status_code == 200
+
+
+def test_render_cache_serves_same_bytes(client):
+    a = client.post("/preview_qr", data=_form()).data
+    hits = app.RENDER_CACHE.hits
+    b = client.post("/preview_qr", data=_form()).data
+    assert a == b
+    assert app.RENDER_CACHE.hits == hits + 1
+
+
+def test_render_key_ignores_unused_params():
+    k1 = app.qr_render_key("png", "d", None, "#000", "#fff", True, size_px=64, fill_color2="#111")
+    k2 = app.qr_render_key("png", "d", None, "#000", "#abc", True, size_px=64, fill_color2="#222")
+    assert k1 == k2
+    k3 = app.qr_render_key("png", "d", None, "#000", "#fff", True, size_px=64,
+                           fill_style="linear", fill_color2="#222")
+    assert k3 != k1
+
+
+@pytest.mark.parametrize("out_format", ["png", "svg"])
+def test_download_etag_and_304(client, out_format):
+    first = client.post("/", data=_form(out_format=out_format))
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    again = client.post("/", data=_form(out_format=out_format), headers={"If-None-Match": etag})
+    assert again.status_code == 304
+
+
+@pytest.mark.parametrize("url,form", [
+    ("/preview_qr", {}),
+    ("/", {"out_format": "png"}),
+    ("/", {"out_format": "svg"}),
+])
+def test_data_too_long_is_400(client, url, form):
+    resp = client.post(url, data=_form(data=TOO_LONG, **form))
+    assert resp.status_code == 400
+    assert b"too long" in resp.data
+
+
+def test_matrix_too_long_is_400(client):
+    resp = client.post("/api/qr/matrix", data={"data": TOO_LONG})
+    assert resp.status_code == 400
+    assert resp.get_json()["success"] is False
+
+
+@pytest.mark.parametrize("url", ["/preview_qr", "/"])
+def test_invalid_color_is_400(client, url):
+    resp = client.post(url, data=_form(fill_color="red;stroke:url(x)"))
+    assert resp.status_code == 400
+    assert b"Invalid color" in resp.data
+
+
+@pytest.mark.parametrize("size_px", [0, -5, 3, 600])
+def test_svg_size_has_lower_bound(size_px):
+    svg = app.generate_qr_code_svg("hello", size_px=size_px).decode()
+    n = int(re.search(r'viewBox="0 0 (\d+) \1"', svg).group(1))
+    width = int(re.search(r'width="(-?\d+)"', svg).group(1))
+    assert width >= n
+    if size_px > n:
+        assert width == size_px
+    assert svg.rstrip().endswith("</svg>")
+
+
+def test_svg_with_logo_is_complete(client, asset_dirs):
+    from PIL import Image
+
+    Image.new("RGBA", (40, 20), (255, 0, 0, 255)).save(asset_dirs["logo"] / "brand.png")
+    resp = client.post("/", data=_form(out_format="svg", size_px="3", logo="brand.png"))
+    assert resp.status_code == 200
+    body = resp.data.decode()
+    assert "data:image/png;base64," in body
+    assert body.rstrip().endswith("</svg>")
+
+
+def test_svg_broken_logo_is_400(client, asset_dirs):
+    (asset_dirs["logo"] / "broken.png").write_bytes(b"not an image")
+    resp = client.post("/", data=_form(out_format="svg", logo="broken.png"))
+    assert resp.status_code == 400
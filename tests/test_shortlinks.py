@@ -0,0 +1,25 @@
+import app
+
+
+def test_redirect_is_not_cached_by_default(client):
+    code, _ = app.get_or_create_code("https://example.com/landing")
+    resp = client.get(f"/s/{code}")
+    assert resp.status_code == 302
+    assert resp.headers["Location"] == "https://example.com/landing"
+    cc = resp.cache_control
+    assert cc.private and cc.no_cache
+    assert cc.max_age is None
+
+
+def test_redirect_max_age_opt_in(client, monkeypatch):
+    monkeypatch.setattr(app, "SHORT_REDIRECT_MAX_AGE", 60)
+    code, _ = app.get_or_create_code("https://example.com/cached")
+    cc = client.get(f"/s/{code}").cache_control
+    assert cc.public and cc.max_age == 60
+
+
+def test_same_url_same_code_and_unknown_is_404(client):
+    a, created = app.get_or_create_code("https://example.com/same")
+    b, created_again = app.get_or_create_code("https://example.com/same")
+    assert a == b and created and not created_again
+    assert client.get("/s/doesnotexist").status_code == 404
@@ -0,0 +1,151 @@
+import hashlib
+import os
+import threading
+from io import BytesIO
+
+import app
+
+PDF = b"%PDF-1.4\n" + os.urandom(2048)
+
+
+def _upload(client, body=PDF, name="doc.pdf"):
+    return client.post("/upload_asset/pdf", data={"file": (BytesIO(body), name)},
+                       content_type="multipart/form-data")
+
+
+def _leftovers(folder):
+    return sorted(p.name for p in folder.iterdir() if p.name.startswith("."))
+
+
+def test_multipart_and_raw_upload(client, asset_dirs):
+    r = _upload(client)
+    assert r.status_code == 200
+    j = r.get_json()
+    assert j["sha256"] == hashlib.sha256(PDF).hexdigest()
+    assert (asset_dirs["pdf"] / j["filename"]).read_bytes() == PDF
+
+    raw = client.post("/upload_asset/pdf?filename=raw.pdf", data=b"%PDF raw",
+                      content_type="application/octet-stream")
+    assert raw.status_code == 200
+    assert raw.get_json()["size"] == 8
+    assert _leftovers(asset_dirs["pdf"]) == []
+
+
+def test_upload_rejects_bad_extension_and_size(client, asset_dirs, monkeypatch):
+    assert _upload(client, name="doc.exe").status_code == 400
+    monkeypatch.setitem(app.ASSET_MAX_MB, "pdf", 0)
+    r = _upload(client)
+    assert r.status_code == 413
+    assert list(asset_dirs["pdf"].iterdir()) == []
+
+
+def test_duplicate_upload_returns_existing_link(client, asset_dirs):
+    first = _upload(client, name="a.pdf").get_json()
+    second = _upload(client, name="b.pdf").get_json()
+    assert second["deduplicated"] is True
+    assert second["filename"] == first["filename"]
+    assert second["url"] == first["url"]
+    assert second["short_url"] == first["short_url"]
+    assert len(list(asset_dirs["pdf"].iterdir())) == 1
+
+
+def test_delete_is_refcounted(admin_client, asset_dirs):
+    name = _upload(admin_client).get_json()["filename"]
+    _upload(admin_client)
+    _upload(admin_client)
+    path = asset_dirs["pdf"] / name
+
+    for left in (2, 1):
+        r = admin_client.post("/admin/delete", json={"atype": "pdf", "name": name}).get_json()
+        assert r == {"success": True, "removed": False, "refs": left}
+        assert path.exists()
+
+    r = admin_client.post("/admin/delete", json={"atype": "pdf", "name": name}).get_json()
+    assert r == {"success": True, "removed": True, "refs": 0}
+    assert not path.exists()
+    with app.get_db() as db:
+        assert db.execute("SELECT 1 FROM assets WHERE atype = 'pdf' AND name = ?", (name,)).fetchone() is None
+
+    # อัปโหลดเนื้อหาเดิมหลังลบแล้ว = ไฟล์ใหม่ ไม่ใช่ dedup กับของที่หายไปแล้ว
+    again = _upload(admin_client).get_json()
+    assert again["deduplicated"] is False
+    assert (asset_dirs["pdf"] / again["filename"]).exists()
+
+
+def _session(client, size, filename="big.pdf"):
+    r = client.post("/upload_asset/pdf/sessions", json={"filename": filename, "size": size})
+    assert r.status_code == 201
+    return r.get_json()["upload_id"]
+
+
+def test_resumable_upload_state_machine(client, asset_dirs):
+    body = PDF
+    uid = _session(client, len(body))
+    url = f"/upload_asset/sessions/{uid}"
+
+    assert client.get(url).get_json()["offset"] == 0
+    r = client.put(f"{url}?offset=0", data=body[:1000])
+    assert r.status_code == 200 and r.get_json()["offset"] == 1000
+
+    # ส่งซ้ำที่ offset เก่า -> 409 พร้อม offset ปัจจุบัน
+    r = client.put(f"{url}?offset=0", data=body[:1000])
+    assert r.status_code == 409 and r.get_json()["offset"] == 1000
+
+    # ชิ้นล้นขนาดที่ประกาศ -> 413 และ offset ไม่ขยับ
+    r = client.put(f"{url}?offset=1000", data=body[1000:] + b"extra")
+    assert r.status_code == 413
+    assert client.get(url).get_json()["offset"] == 1000
+
+    r = client.put(url, data=body[1000:], headers={"X-Upload-Offset": "1000"})
+    assert r.status_code == 200
+    done = r.get_json()
+    assert done["sha256"] == hashlib.sha256(body).hexdigest()
+    assert (asset_dirs["pdf"] / done["filename"]).read_bytes() == body
+
+    assert client.get(url).status_code == 404
+    assert client.put(f"{url}?offset={len(body)}", data=b"x").status_code == 404
+    assert _leftovers(asset_dirs["pdf"]) == []
+
+
+def test_resumable_session_validation_and_cancel(client, asset_dirs):
+    bad = client.post("/upload_asset/pdf/sessions", json={"filename": "x.mp3", "size": 10})
+    assert bad.status_code == 400
+    assert client.post("/upload_asset/pdf/sessions", json={"filename": "x.pdf"}).status_code == 400
+    huge = client.post("/upload_asset/pdf/sessions",
+                       json={"filename": "x.pdf", "size": app._asset_limit("pdf") + 1})
+    assert huge.status_code == 413
+
+    uid = _session(client, 100)
+    assert _leftovers(asset_dirs["pdf"]) == [f".session-{uid}.part"]
+    assert client.delete(f"/upload_asset/sessions/{uid}").get_json()["success"] is True
+    assert _leftovers(asset_dirs["pdf"]) == []
+    assert client.get(f"/upload_asset/sessions/{uid}").status_code == 404
+
+
+def test_concurrent_chunks_at_same_offset(client, asset_dirs):
+    body = PDF
+    uid = _session(client, len(body))
+    url = f"/upload_asset/sessions/{uid}?offset=0"
+    half = len(body) // 2
+    chunks = [body[:half], b"\0" * half]
+    barrier = threading.Barrier(2)
+    results = []
+
+    def put(data):
+        c = app.app.test_client()
+        barrier.wait()
+        results.append(c.put(url, data=data).status_code)
+
+    threads = [threading.Thread(target=put, args=(c,)) for c in chunks]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(results) == [200, 409]
+    state = client.get(f"/upload_asset/sessions/{uid}").get_json()
+    assert state["offset"] == half
+    # .part มีข้อมูลของผู้ชนะทั้งชิ้น ไม่ปนกัน
+    part = (asset_dirs["pdf"] / f".session-{uid}.part").read_bytes()
+    assert part in chunks
+    client.delete(f"/upload_asset/sessions/{uid}")